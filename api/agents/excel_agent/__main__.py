@@ -1,6 +1,7 @@
-from common.server import A2AServer
+from common.server import A2AServer, AdmissionController, SQLTaskStore, create_task_store
 from common.types import AgentCard, AgentCapabilities, AgentSkill, MissingAPIKeyError
 from common.utils.push_notification_auth import PushNotificationSenderAuth
+from common.utils.blob_store import BlobStore
 from excel_agent.task_manager import ExcelAgentTaskManager
 from excel_agent.agent import ExcelAgent
 import click
@@ -13,59 +14,193 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def build_server(
+    host, port, task_store_url=None, private_jwk=None, processes=None, max_pending_jobs=None,
+    cache_max_mb=1024, file_ttl_hours=24, max_output_mb=0, max_files=0, database_exports=False,
+    create_tables=True, max_chunked_jobs=None,
+) -> A2AServer:
+    """Builds the Excel agent server."""
+    capabilities = AgentCapabilities(streaming=True, pushNotifications=True)
+
+    skill = AgentSkill(
+        id="sql_to_excel",
+        name="SQL to Excel Conversion",
+        description="Converts SQL query results to formatted Excel files, or to CSV, Parquet or Arrow files",
+        tags=["excel", "sql", "data-export", "spreadsheet", "csv", "parquet", "arrow"],
+        examples=[
+            "Export these SQL results to Excel",
+            "Create a spreadsheet with this data",
+            "Format this query result as an Excel file",
+            "Export this query result as Parquet"
+        ]
+    )
+
+    agent_card = AgentCard(
+        name="Excel Export Agent",
+        description="Converts SQL query results to formatted Excel files with various styling options, or to CSV, Parquet and Arrow files",
+        url=f"http://{host}:{port}/",
+        version="1.0.0",
+        defaultInputModes=["text", "data"],
+        defaultOutputModes=ExcelAgent.SUPPORTED_CONTENT_TYPES,
+        capabilities=capabilities,
+        skills=[skill],
+    )
+
+    notification_sender_auth = PushNotificationSenderAuth()
+    if private_jwk:
+        notification_sender_auth.load_jwk(private_jwk)
+    else:
+        notification_sender_auth.generate_jwk()
+
+    # Create outputs directory if it doesn't exist
+    output_dir = os.path.join(os.getcwd(), "outputs", "excel")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Generated files are downloaded from the server instead of being embedded,
+    # and deleted once they expire or the directory is over quota. The store is
+    # the only one deleting files, so the cache size is part of its quota.
+    quota_mb = min((mb for mb in (max_output_mb, cache_max_mb) if mb), default=0)
+    blob_store = BlobStore(
+        output_dir,
+        max_bytes=quota_mb * 1024 * 1024 or None,
+        max_files=max_files or None,
+        ttl_seconds=file_ttl_hours * 3600 or None,
+    )
+
+    server = A2AServer(
+        agent_card=agent_card,
+        task_manager=ExcelAgentTaskManager(
+            agent=ExcelAgent(
+                output_dir,
+                cache_exports=bool(cache_max_mb),
+                database_exports=database_exports,
+            ),
+            notification_sender_auth=notification_sender_auth,
+            task_store=create_task_store(task_store_url, create_tables),
+            blob_store=blob_store,
+            file_base_url=agent_card.url.rstrip("/") + A2AServer.FILES_PATH,
+            max_workers=processes,
+            max_pending_jobs=max_pending_jobs,
+            max_chunked_jobs=max_chunked_jobs,
+        ),
+        host=host,
+        port=port,
+        admission_controller=AdmissionController.from_env(),
+        blob_store=blob_store,
+    )
+
+    server.add_readiness_check("output_dir", lambda: os.access(output_dir, os.W_OK))
+    if database_exports:
+        # Imported here, the database is only needed for database exports
+        from core.database import db
+        server.add_readiness_check("database", db.ping)
+
+    server.app.add_route(
+        "/.well-known/jwks.json", notification_sender_auth.handle_jwks_endpoint, methods=["GET"]
+    )
+    return server
+
+
+def create_app():
+    """App factory used by each worker process in multi-worker mode."""
+    server = build_server(
+        os.environ["A2A_HOST"],
+        int(os.environ["A2A_PORT"]),
+        task_store_url=os.environ.get("A2A_TASK_STORE_URL"),
+        private_jwk=os.environ.get("A2A_PUSH_NOTIFICATION_JWK"),
+        # Created by the main process before starting the workers
+        create_tables=False,
+        processes=int(os.environ.get("EXCEL_AGENT_PROCESSES", 0)) or None,
+        max_pending_jobs=int(os.environ.get("EXCEL_AGENT_MAX_PENDING_JOBS", 0)) or None,
+        max_chunked_jobs=int(os.environ.get("EXCEL_AGENT_MAX_CHUNKED_JOBS", 0)) or None,
+        cache_max_mb=int(os.environ.get("EXCEL_AGENT_CACHE_MAX_MB", 1024)),
+        file_ttl_hours=float(os.environ.get("EXCEL_AGENT_FILE_TTL_HOURS", 24)),
+        max_output_mb=int(os.environ.get("EXCEL_AGENT_MAX_OUTPUT_MB", 0)),
+        max_files=int(os.environ.get("EXCEL_AGENT_MAX_FILES", 0)),
+        database_exports=os.environ.get("EXCEL_AGENT_DATABASE_EXPORTS", "").lower() in ("1", "true"),
+    )
+    return server.app
+
+
 @click.command()
 @click.option("--host", default="localhost")
 @click.option("--port", default=10001)
-def main(host, port):
+@click.option("--workers", default=1, help="Number of worker processes")
+@click.option("--task-store-url", envvar="A2A_TASK_STORE_URL", default=None,
+              help="SQLAlchemy URL of the task store shared by workers")
+@click.option("--keep-alive", default=5, help="HTTP keep-alive timeout in seconds")
+@click.option("--backlog", default=2048, help="Maximum number of pending connections")
+@click.option("--limit-concurrency", default=None, type=int,
+              help="Maximum number of concurrent connections per worker")
+@click.option("--loop", type=click.Choice(["auto", "asyncio", "uvloop"]), default="auto")
+@click.option("--http", type=click.Choice(["auto", "h11", "httptools"]), default="auto")
+@click.option("--processes", envvar="EXCEL_AGENT_PROCESSES", default=None, type=int,
+              help="Processes generating files per worker (default: number of CPUs)")
+@click.option("--max-pending-jobs", envvar="EXCEL_AGENT_MAX_PENDING_JOBS", default=None, type=int,
+              help="Files being generated or waiting per worker before new tasks are rejected")
+@click.option("--max-chunked-jobs", envvar="EXCEL_AGENT_MAX_CHUNKED_JOBS", default=None, type=int,
+              help="Chunked exports per worker, each in a process of its own (default: --processes)")
+@click.option("--cache-max-mb", envvar="EXCEL_AGENT_CACHE_MAX_MB", default=1024,
+              help="Size of the generated files kept for reuse, 0 disables the cache")
+@click.option("--file-ttl-hours", envvar="EXCEL_AGENT_FILE_TTL_HOURS", default=24.0,
+              help="Hours a generated file is kept after its last use, 0 keeps files")
+@click.option("--max-output-mb", envvar="EXCEL_AGENT_MAX_OUTPUT_MB", default=0,
+              help="Size of all generated files before the oldest are deleted, 0 for no limit")
+@click.option("--max-files", envvar="EXCEL_AGENT_MAX_FILES", default=0,
+              help="Number of generated files before the oldest are deleted, 0 for no limit")
+@click.option("--database-exports", envvar="EXCEL_AGENT_DATABASE_EXPORTS", is_flag=True,
+              help="Accept result handles and read their rows from the configured databases")
+def main(host, port, workers, task_store_url, keep_alive, backlog, limit_concurrency, loop, http,
+         processes, max_pending_jobs, max_chunked_jobs, cache_max_mb, file_ttl_hours, max_output_mb,
+         max_files, database_exports):
     """Starts the Excel agent server."""
+    options = dict(
+        timeout_keep_alive=keep_alive,
+        backlog=backlog,
+        limit_concurrency=limit_concurrency,
+        loop=loop,
+        http=http,
+    )
     try:
-        capabilities = AgentCapabilities(streaming=False, pushNotifications=True)
-        
-        skill = AgentSkill(
-            id="sql_to_excel",
-            name="SQL to Excel Conversion",
-            description="Converts SQL query results to formatted Excel files",
-            tags=["excel", "sql", "data-export", "spreadsheet"],
-            examples=[
-                "Export these SQL results to Excel",
-                "Create a spreadsheet with this data",
-                "Format this query result as an Excel file"
-            ]
-        )
-        
-        agent_card = AgentCard(
-            name="Excel Export Agent",
-            description="Converts SQL query results to formatted Excel files with various styling options",
-            url=f"http://{host}:{port}/",
-            version="1.0.0",
-            defaultInputModes=["text", "data"],
-            defaultOutputModes=ExcelAgent.SUPPORTED_CONTENT_TYPES,
-            capabilities=capabilities,
-            skills=[skill],
-        )
-
-        notification_sender_auth = PushNotificationSenderAuth()
-        notification_sender_auth.generate_jwk()
-        
-        # Create outputs directory if it doesn't exist
-        os.makedirs(os.path.join(os.getcwd(), "outputs", "excel"), exist_ok=True)
-        
-        server = A2AServer(
-            agent_card=agent_card,
-            task_manager=ExcelAgentTaskManager(
-                agent=ExcelAgent(),
-                notification_sender_auth=notification_sender_auth
-            ),
-            host=host,
-            port=port,
-        )
-
-        server.app.route(
-            "/.well-known/jwks.json", notification_sender_auth.handle_jwks_endpoint, methods=["GET"]
-        )
+        if workers > 1:
+            if not task_store_url:
+                logger.warning("No --task-store-url given, tasks are not shared between workers")
+            # Worker processes build the server through create_app() from these,
+            # the main process only starts them.
+            os.environ["A2A_HOST"] = host
+            os.environ["A2A_PORT"] = str(port)
+            os.environ["A2A_PUSH_NOTIFICATION_JWK"] = PushNotificationSenderAuth().generate_jwk()
+            if task_store_url:
+                os.environ["A2A_TASK_STORE_URL"] = task_store_url
+                # Creates the tables once, before the workers open the store
+                SQLTaskStore(task_store_url).engine.dispose()
+            if processes:
+                os.environ["EXCEL_AGENT_PROCESSES"] = str(processes)
+            if max_pending_jobs:
+                os.environ["EXCEL_AGENT_MAX_PENDING_JOBS"] = str(max_pending_jobs)
+            if max_chunked_jobs:
+                os.environ["EXCEL_AGENT_MAX_CHUNKED_JOBS"] = str(max_chunked_jobs)
+            os.environ["EXCEL_AGENT_CACHE_MAX_MB"] = str(cache_max_mb)
+            os.environ["EXCEL_AGENT_FILE_TTL_HOURS"] = str(file_ttl_hours)
+            os.environ["EXCEL_AGENT_MAX_OUTPUT_MB"] = str(max_output_mb)
+            os.environ["EXCEL_AGENT_MAX_FILES"] = str(max_files)
+            os.environ["EXCEL_AGENT_DATABASE_EXPORTS"] = "true" if database_exports else ""
 
-        logger.info(f"Starting Excel Agent server on {host}:{port}")
-        server.start()
+            logger.info(f"Starting Excel Agent server on {host}:{port} with {workers} workers")
+            A2AServer.start_workers(
+                f"{__spec__.name}:create_app", workers, host, port, **options
+            )
+        else:
+            server = build_server(
+                host, port, task_store_url,
+                processes=processes, max_pending_jobs=max_pending_jobs,
+                max_chunked_jobs=max_chunked_jobs, cache_max_mb=cache_max_mb,
+                file_ttl_hours=file_ttl_hours, max_output_mb=max_output_mb, max_files=max_files,
+                database_exports=database_exports,
+            )
+            logger.info(f"Starting Excel Agent server on {host}:{port}")
+            server.start(**options)
     except Exception as e:
         logger.error(f"An error occurred during server startup: {e}")
         exit(1)
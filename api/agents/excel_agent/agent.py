@@ -1,13 +1,27 @@
-from typing import Any, Dict, List, Optional, Literal, AsyncIterable
-from pydantic import BaseModel
-import pandas as pd
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Literal, AsyncIterable
+from pydantic import BaseModel, Field
 import os
+import queue
 import uuid
 from pathlib import Path
 from datetime import datetime
 
-from core.models import ExcelRequestMessage, QueryResponse, SQLResultMessage
+from core.models import ExcelRequestMessage, QueryResponse, ResultHandle, SQLResultMessage
 from core.config import settings
+from excel_agent.cache import ExportCache
+from excel_agent.writers import (
+    MAX_SHEET_ROWS,
+    OUTPUT_FORMATS,
+    ZIP_MIME_TYPE,
+    ResultWriter,
+    create_writer,
+)
+
+# Called with the rows written so far and the total rows, if known
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+class ChunksCancelledError(Exception):
+    """Raised when a chunked request is cancelled before its last chunk"""
 
 class ExcelFormat(BaseModel):
     """Excel formatting options"""
@@ -20,18 +34,74 @@ class ExcelFormat(BaseModel):
     include_query: bool = True
     include_metadata: bool = True
     style_template: Literal["default", "professional", "minimal", "colorful"] = "default"
+    engine: Literal["xlsxwriter", "openpyxl"] = "xlsxwriter"
+    output_format: Literal["xlsx", "csv", "csv.gz", "parquet", "arrow"] = "xlsx"
+    # Data rows per sheet before the next sheet is started (xlsx only)
+    max_rows_per_sheet: int = Field(MAX_SHEET_ROWS, ge=1, le=MAX_SHEET_ROWS)
+    # Data rows per file before the next file is started, all files are then zipped together
+    max_rows_per_file: Optional[int] = Field(None, ge=1)
     
 class ExcelAgent:
     """Agent for converting SQL results to Excel files"""
     
-    SUPPORTED_CONTENT_TYPES = ["text", "text/plain", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"]
+    SUPPORTED_CONTENT_TYPES = ["text", "text/plain"] + [
+        mime_type for _, mime_type in OUTPUT_FORMATS.values()
+    ] + [ZIP_MIME_TYPE]
+    
+    # Rows handed to the writer at a time
+    BATCH_SIZE = 10000
     
-    def __init__(self, output_dir: str = None):
+    # Seconds to wait for the next chunk of a chunked request before giving up
+    CHUNK_TIMEOUT = 300
+    
+    # Put on the chunk queue instead of rows to cancel a chunked request
+    CHUNKS_CANCELLED = "cancelled"
+    
+    def __init__(
+        self,
+        output_dir: str = None,
+        cache_exports: bool = True,
+        database_exports: bool = False
+    ):
+        """
+        Args:
+            output_dir: Directory the files are generated in.
+            cache_exports: Name files after a hash of the SQL query, the result
+                and the format options, and reuse them when the same export is
+                requested again. Files are only deleted by the blob store serving
+                the output directory.
+            database_exports: Accept requests with a result handle instead of
+                result rows, whose SQL query is run on a configured database.
+        """
         self.output_dir = output_dir or os.path.join(os.getcwd(), "outputs", "excel")
         os.makedirs(self.output_dir, exist_ok=True)
+        self.cache = ExportCache(self.output_dir) if cache_exports else None
+        self.database_exports = database_exports
     
-    def process_request(self, request: ExcelRequestMessage) -> Dict[str, Any]:
-        """Process an Excel request and return the path to the generated Excel file"""
+    @staticmethod
+    def negotiate_output_format(accepted_output_modes: Optional[List[str]]) -> str:
+        """Return the first output format the client accepts, in the client's
+        order of preference, or xlsx if it accepts none in particular"""
+        formats_by_mime_type = {
+            mime_type: output_format for output_format, (_, mime_type) in OUTPUT_FORMATS.items()
+        }
+        for mode in accepted_output_modes or []:
+            if mode in formats_by_mime_type:
+                return formats_by_mime_type[mode]
+        return "xlsx"
+    
+    def process_request(
+        self, request: ExcelRequestMessage, progress: Optional[ProgressCallback] = None,
+        chunks=None
+    ) -> Dict[str, Any]:
+        """Process an Excel request and return the path to the generated Excel file
+        
+        `progress` is called with the number of rows written and the total
+        number of rows after each batch. The total is unknown for requests
+        with a result handle, whose rows are streamed from the database, and
+        for chunked requests, whose rows are taken from the `chunks` queue as
+        they arrive until None is put on it.
+        """
         # Extract data from request
         query = request.query
         sql_query = request.sql_query
@@ -41,14 +111,50 @@ class ExcelAgent:
         # Create format settings
         excel_format = ExcelFormat(**format_options)
         
-        # Generate Excel file
-        excel_path = self._generate_excel(
+        extension = OUTPUT_FORMATS[excel_format.output_format][0]
+        if chunks is not None:
+            batches = self._iter_chunks(chunks)
+            total_rows = None
+        elif request.result_handle is not None:
+            batches = self._stream_batches(request.result_handle)
+            total_rows = None
+        else:
+            batches = self._iter_batches(result_data)
+            total_rows = len(result_data)
+        generate = lambda file_path: self._generate_excel(
             query=query,
             sql_query=sql_query,
-            data=result_data,
-            format_options=excel_format
+            batches=batches,
+            format_options=excel_format,
+            file_path=file_path,
+            progress=progress,
+            total_rows=total_rows
         )
         
+        cached = False
+        if self.cache is None or chunks is not None or request.result_handle is not None:
+            # Generate Excel file, streamed results are read only once and not cached
+            writer = generate(
+                os.path.join(self.output_dir, f"query_result_{uuid.uuid4().hex[:8]}{extension}")
+            )
+            excel_path = writer.file_path
+            row_count = writer.row_count
+        else:
+            # Reuse the file of an identical export, otherwise generate and cache it
+            key = self.cache.make_key(sql_query, self._iter_batches(result_data), excel_format)
+            excel_path = self.cache.lookup(key, [extension, ".zip"])
+            cached = excel_path is not None
+            row_count = len(result_data)
+            if cached:
+                if progress is not None:
+                    progress(len(result_data), len(result_data))
+            else:
+                with self.cache.staging_dir() as staging_dir:
+                    writer = generate(
+                        os.path.join(staging_dir, self.cache.file_name(key, extension))
+                    )
+                    excel_path = self.cache.add(writer.file_path)
+        
         # Return result
         return {
             "is_task_complete": True,
@@ -56,141 +162,82 @@ class ExcelAgent:
             "content": {
                 "file_path": excel_path,
                 "file_name": os.path.basename(excel_path),
+                "mime_type": (
+                    ZIP_MIME_TYPE if excel_path.endswith(".zip")
+                    else OUTPUT_FORMATS[excel_format.output_format][1]
+                ),
                 "timestamp": datetime.now().isoformat(),
+                "row_count": row_count,
+                "cached": cached,
                 "format": excel_format.model_dump()
             }
         }
     
-    def _generate_excel(self, query: str, sql_query: str, data: List[Dict[str, Any]], 
-                        format_options: ExcelFormat) -> str:
-        """Generate an Excel file from SQL results"""
-        # Convert data to DataFrame
-        df = pd.DataFrame(data)
-        if df.empty:
-            # Handle empty result
-            df = pd.DataFrame({"No results": ["No data returned from query"]})
-        
-        # Generate unique filename
-        filename = f"query_result_{uuid.uuid4().hex[:8]}.xlsx"
-        file_path = os.path.join(self.output_dir, filename)
-        
-        # Create Excel writer
-        with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-            # Write data to Excel
-            df.to_excel(
-                writer, 
-                sheet_name=format_options.sheet_name,
-                index=False,
-                freeze_panes=(1, 0) if format_options.freeze_panes else None
-            )
-            
-            # Apply formatting
-            self._apply_formatting(writer, df, format_options)
-            
-            # Add metadata sheet if requested
-            if format_options.include_metadata:
-                self._add_metadata_sheet(writer, query, sql_query, data)
-        
-        return file_path
+    def _iter_batches(self, data: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """Split result rows into batches for the writer"""
+        for start in range(0, len(data), self.BATCH_SIZE):
+            yield data[start:start + self.BATCH_SIZE]
     
-    def _apply_formatting(self, writer: pd.ExcelWriter, df: pd.DataFrame, format_options: ExcelFormat):
-        """Apply formatting to the Excel worksheet"""
-        worksheet = writer.sheets[format_options.sheet_name]
-        
-        # Auto-filter
-        if format_options.auto_filter and not df.empty:
-            worksheet.auto_filter.ref = worksheet.dimensions
-        
-        # Adjust column widths
-        if format_options.column_width_auto and not df.empty:
-            for i, column in enumerate(df.columns):
-                # Calculate width based on column name and maximum data length
-                max_length = max(
-                    df[column].astype(str).map(len).max(),
-                    len(str(column))
-                )
-                # Add some padding
-                adjusted_width = max_length + 2
-                # Set column width
-                col_letter = worksheet.cell(row=1, column=i+1).column_letter
-                worksheet.column_dimensions[col_letter].width = adjusted_width
+    def _iter_chunks(self, chunks) -> Iterator[List[Dict[str, Any]]]:
+        """Take result rows from a queue until None is put on it"""
+        while True:
+            try:
+                rows = chunks.get(timeout=self.CHUNK_TIMEOUT)
+            except queue.Empty:
+                raise ValueError(f"No result rows received for {self.CHUNK_TIMEOUT} seconds")
+            if rows is None:
+                return
+            if rows == self.CHUNKS_CANCELLED:
+                raise ChunksCancelledError("The request was cancelled before its last chunk")
+            yield rows
+    
+    def _stream_batches(self, result_handle: ResultHandle) -> Iterator[List[Dict[str, Any]]]:
+        """Run the query of a result handle and stream its rows in batches"""
+        if not self.database_exports:
+            raise ValueError("Database exports are not enabled on this agent")
+        # Imported here, the database is only needed for database exports
+        from core.database import get_database
         
-        # Apply style template
-        self._apply_style_template(worksheet, format_options.style_template)
+        database = get_database(result_handle.connection)
+        return database.stream_query(result_handle.sql_query, batch_size=self.BATCH_SIZE)
     
-    def _apply_style_template(self, worksheet, template_name: str):
-        """Apply a predefined style template to the worksheet"""
-        from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+    def _generate_excel(self, query: str, sql_query: str, batches: Iterable[List[Dict[str, Any]]], 
+                        format_options: ExcelFormat, file_path: str,
+                        progress: Optional[ProgressCallback] = None,
+                        total_rows: Optional[int] = None) -> ResultWriter:
+        """Generate an Excel file from batches of SQL result rows
         
-        if template_name == "professional":
-            # Header formatting
-            header_fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
-            header_font = Font(name="Arial", size=11, bold=True, color="FFFFFF")
-            for cell in worksheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                
-        elif template_name == "colorful":
-            # Colorful alternating rows
-            light_fill = PatternFill(start_color="E6F2FF", end_color="E6F2FF", fill_type="solid")
-            header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-            header_font = Font(name="Calibri", size=11, bold=True, color="FFFFFF")
-            
-            # Format header
-            for cell in worksheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-            
-            # Format data rows with alternating colors
-            for row_idx, row in enumerate(worksheet.iter_rows(min_row=2)):
-                if row_idx % 2 == 0:
-                    for cell in row:
-                        cell.fill = light_fill
+        Rows are consumed as they are produced, so `batches` may stream them
+        from any source. Returns the closed writer. Its `file_path` is
+        `file_path`, with a .zip extension instead if the rows were split over
+        several files. If writing fails, the partial files are deleted.
+        """
+        # Add metadata sheet if requested, Parquet keeps it as file metadata
+        metadata_builder = None
+        if format_options.include_metadata:
+            metadata_builder = lambda writer: self._build_metadata(query, sql_query, writer)
         
-        elif template_name == "minimal":
-            # Clean, minimal style
-            thin_border = Border(
-                left=Side(style='thin', color='DDDDDD'),
-                right=Side(style='thin', color='DDDDDD'),
-                top=Side(style='thin', color='DDDDDD'),
-                bottom=Side(style='thin', color='DDDDDD')
-            )
-            
-            header_font = Font(name="Segoe UI", size=11, bold=True)
-            for cell in worksheet[1]:
-                cell.font = header_font
-                cell.border = thin_border
-            
-            # Add light borders to all cells
-            for row in worksheet.iter_rows(min_row=2):
-                for cell in row:
-                    cell.border = thin_border
+        # Stream the rows into the file in batches
+        writer = create_writer(file_path, format_options, metadata_builder)
+        try:
+            for batch in batches:
+                writer.write_batch(batch)
+                if progress is not None:
+                    progress(writer.row_count, total_rows)
+            writer.close()
+        except BaseException:
+            # Leave no partial file behind for the cache or the blob store
+            writer.abort()
+            raise
+        
+        return writer
     
-    def _add_metadata_sheet(self, writer: pd.ExcelWriter, query: str, sql_query: str, data: List[Dict[str, Any]]):
-        """Add a metadata sheet with query information"""
-        metadata = [
+    def _build_metadata(self, query: str, sql_query: str, writer: ResultWriter) -> List[List[Any]]:
+        """Build the rows of the metadata sheet"""
+        return [
             ["Report Generated", datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
             ["Natural Language Query", query],
             ["SQL Query", sql_query],
-            ["Number of Records", len(data)],
-            ["Columns", ", ".join(data[0].keys()) if data else "None"]
+            ["Number of Records", writer.row_count],
+            ["Columns", ", ".join(writer.columns) if writer.columns else "None"]
         ]
-        
-        metadata_df = pd.DataFrame(metadata, columns=["Metadata", "Value"])
-        metadata_df.to_excel(writer, sheet_name="Metadata", index=False)
-        
-        # Format metadata sheet
-        worksheet = writer.sheets["Metadata"]
-        for i, _ in enumerate(metadata):
-            # Make SQL query cell taller to accommodate multi-line text
-            if i == 2:  # SQL Query row
-                worksheet.row_dimensions[i+2].height = 60  # Adjust height
-                
-        # Auto-adjust column width
-        for i, col in enumerate(["A", "B"]):
-            max_length = max(
-                len(str(metadata_df.iloc[j, i])) for j in range(len(metadata_df))
-            )
-            adjusted_width = min(max_length + 2, 100)  # Cap width at 100
-            worksheet.column_dimensions[col].width = adjusted_width 
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""Content-addressed cache of generated export files."""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+from pydantic import BaseModel
+
+
+class ExportCache:
+    """Generated files named after a hash of what they were generated from.
+
+    The name is all there is to look a file up by, so every process sharing
+    the directory finds the files of the others without a shared index. Files
+    are written to a staging directory first and moved in place atomically.
+    A file's modification time records its last use. The cache deletes
+    nothing itself: the directory is shared with the files that are not
+    cached, so one `BlobStore` owns it and deletes the least recently used
+    files of both.
+    """
+
+    STAGING_DIR = ".staging"
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(os.path.join(cache_dir, self.STAGING_DIR), exist_ok=True)
+
+    @staticmethod
+    def make_key(
+        sql_query: str, batches: Iterable[List[Dict[str, Any]]], format_options: BaseModel
+    ) -> str:
+        """Hash of the SQL query, the result rows and the format options."""
+        digest = hashlib.sha256()
+        digest.update(sql_query.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(format_options.model_dump_json().encode("utf-8"))
+        columns = None
+        for batch in batches:
+            if batch and columns is None:
+                # Rows are hashed with sorted keys, the column order is hashed once
+                columns = list(batch[0].keys())
+                digest.update(json.dumps(columns).encode("utf-8"))
+            digest.update(
+                json.dumps(batch, sort_keys=True, default=str, separators=(",", ":")).encode("utf-8")
+            )
+        return digest.hexdigest()[:32]
+
+    def file_name(self, key: str, extension: str) -> str:
+        return f"query_result_{key}{extension}"
+
+    def lookup(self, key: str, extensions: Iterable[str]) -> Optional[str]:
+        """Returns the path of a cached file with one of the extensions, and
+        marks it as used."""
+        for extension in extensions:
+            path = os.path.join(self.cache_dir, self.file_name(key, extension))
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                continue
+            return path
+        return None
+
+    @contextmanager
+    def staging_dir(self) -> Iterator[str]:
+        """A private directory to write files in before they are added."""
+        path = os.path.join(self.cache_dir, self.STAGING_DIR, uuid.uuid4().hex)
+        os.makedirs(path)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def add(self, staged_path: str) -> str:
+        """Moves a staged file into the cache. Returns the path of the cached
+        file."""
+        path = os.path.join(self.cache_dir, os.path.basename(staged_path))
+        os.replace(staged_path, path)
+        return path
@@ -1,11 +1,14 @@
 from typing import AsyncIterable
 from common.types import (
+    CancelTaskRequest,
+    CancelTaskResponse,
     SendTaskRequest,
     TaskSendParams,
     Message,
     TaskStatus,
     Artifact,
     TextPart,
+    DataPart,
     FilePart,
     FileContent,
     TaskState,
@@ -20,29 +23,102 @@ from common.types import (
     TaskIdParams,
     PushNotificationConfig,
     InvalidParamsError,
+    ServerBusyError,
+    JSONRPCError,
 )
 from common.server.task_manager import InMemoryTaskManager
-from excel_agent.agent import ExcelAgent
+from common.server.task_store import TaskStore
+from excel_agent.agent import ChunksCancelledError, ExcelAgent
+from excel_agent.writers import XLSX_MIME_TYPE
 from core.models import ExcelRequestMessage
 from common.utils.push_notification_auth import PushNotificationSenderAuth
+from common.utils.blob_store import BlobStore
 import common.server.utils as utils
 from typing import Union, Dict, Any, List
 import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 import logging
 import traceback
 import base64
 import os
 import json
-import mimetypes
+from pathlib import Path
+from urllib.parse import quote
 
 logger = logging.getLogger(__name__)
 
 
+class QueueProgressReporter:
+    """Progress callback for the agent that runs in a pool process and puts
+    (task_id, rows_written, total_rows) on a managed queue, at most once per
+    `interval` seconds plus once when all rows are written."""
+
+    def __init__(self, progress_queue, task_id: str, interval: float = 1.0):
+        self.progress_queue = progress_queue
+        self.task_id = task_id
+        self.interval = interval
+        self.reported_at = 0.0
+
+    def __call__(self, rows_written: int, total_rows: int | None):
+        now = time.monotonic()
+        if now - self.reported_at < self.interval and rows_written != total_rows:
+            return
+        self.reported_at = now
+        self.progress_queue.put((self.task_id, rows_written, total_rows))
+
+
 class ExcelAgentTaskManager(InMemoryTaskManager):
-    def __init__(self, agent: ExcelAgent, notification_sender_auth: PushNotificationSenderAuth):
-        super().__init__()
+    # Chunks of a chunked task passed to its job but not yet written
+    MAX_QUEUED_CHUNKS = 4
+
+    def __init__(
+        self,
+        agent: ExcelAgent,
+        notification_sender_auth: PushNotificationSenderAuth,
+        task_store: TaskStore | None = None,
+        blob_store: BlobStore | None = None,
+        file_base_url: str | None = None,
+        max_workers: int | None = None,
+        max_pending_jobs: int | None = None,
+        max_chunked_jobs: int | None = None,
+    ):
+        """
+        Args:
+            blob_store: If given, generated files are returned as URIs instead of
+                inline base64: as download URIs below `file_base_url`, or without
+                it as file URIs for clients in the same process or on the same host.
+            max_workers: Processes generating files, defaults to the number of CPUs.
+            max_pending_jobs: Tasks that may be running or waiting for a process
+                before new tasks are rejected, defaults to four per process.
+            max_chunked_jobs: Chunked tasks that may be running before new ones
+                are rejected, defaults to `max_workers`. A chunked task keeps its
+                process while it waits for its next chunk, so these tasks get a
+                pool of their own and do not count as pending jobs.
+        """
+        super().__init__(task_store=task_store)
         self.agent = agent
         self.notification_sender_auth = notification_sender_auth
+        self.blob_store = blob_store
+        self.file_base_url = file_base_url
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending_jobs = max_pending_jobs or 4 * self.max_workers
+        self.pending_jobs = 0
+        self.max_chunked_jobs = max_chunked_jobs or self.max_workers
+        self.chunked_jobs = 0
+        self.jobs: set[asyncio.Task] = set()
+        # Tasks whose files are being generated, progress of others is dropped
+        self.active_task_ids: set[str] = set()
+        self._executor: ProcessPoolExecutor | None = None
+        self._chunked_executor: ProcessPoolExecutor | None = None
+        self._manager = None
+        self._progress_queue = None
+        # Queues the rows of chunked tasks are passed to their job on, and the
+        # index of the chunk each task expects next
+        self.chunk_queues: Dict[str, Any] = {}
+        self.next_chunk_index: Dict[str, int] = {}
 
     def _validate_request(
         self, request: Union[SendTaskRequest, SendTaskStreamingRequest]
@@ -64,49 +140,331 @@ class ExcelAgentTaskManager(InMemoryTaskManager):
         
         return None
 
-    async def on_send_task(self, request: SendTaskRequest) -> SendTaskResponse:
-        """Handles the 'send task' request."""
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # Created on first use, so that worker processes are not forked before
+        # the server has started
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    @property
+    def chunked_executor(self) -> ProcessPoolExecutor:
+        # One process per chunked job, so they never wait for each other
+        if self._chunked_executor is None:
+            self._chunked_executor = ProcessPoolExecutor(max_workers=self.max_chunked_jobs)
+        return self._chunked_executor
+
+    def _get_manager(self):
+        # Managed queues can be passed to pool processes as arguments
+        if self._manager is None:
+            self._manager = multiprocessing.Manager()
+        return self._manager
+
+    def _get_progress_queue(self):
+        """Returns the queue pool processes report progress on, and starts the
+        thread that forwards it to the event loop on first use"""
+        if self._progress_queue is None:
+            self._progress_queue = self._get_manager().Queue()
+            threading.Thread(
+                target=self._forward_progress,
+                args=(self._progress_queue, asyncio.get_running_loop()),
+                daemon=True,
+            ).start()
+        return self._progress_queue
+
+    def _forward_progress(self, progress_queue, loop: asyncio.AbstractEventLoop):
+        while True:
+            try:
+                task_id, rows_written, total_rows = progress_queue.get()
+            except (EOFError, OSError):
+                # The manager process has shut down
+                return
+            asyncio.run_coroutine_threadsafe(
+                self._publish_progress(task_id, rows_written, total_rows), loop
+            )
+
+    async def _publish_progress(self, task_id: str, rows_written: int, total_rows: int | None):
+        """Publish a WORKING status update with the rows written so far
+        
+        Progress is only streamed, it is not stored in the task history.
+        """
+        if task_id not in self.active_task_ids:
+            # The job has finished already and its final event is out
+            return
+        if total_rows:
+            text = f"Written {rows_written} of {total_rows} rows ({rows_written * 100 // total_rows}%)"
+        else:
+            text = f"Written {rows_written} rows"
+        task_status = TaskStatus(
+            state=TaskState.WORKING,
+            message=Message(
+                role="agent",
+                parts=[
+                    TextPart(text=text),
+                    DataPart(data={"rows_written": rows_written, "total_rows": total_rows})
+                ]
+            )
+        )
+        await self.enqueue_events_for_sse(
+            task_id, TaskStatusUpdateEvent(id=task_id, status=task_status, final=False)
+        )
+
+    async def _submit_task(
+        self, request: Union[SendTaskRequest, SendTaskStreamingRequest]
+    ) -> Union[Task, JSONRPCError]:
+        """Validate a task, store it as WORKING and start generating its file
+        
+        A chunked task is sent as several messages with the same task id and
+        `chunk_index` 0, 1, ... in their metadata, the last one with
+        `last_chunk` set. The job starts on the first chunk and writes the rows
+        of each chunk as it arrives. The chunks must reach the same server
+        process, so chunked tasks need a single worker or sticky connections.
+        
+        Returns the stored task, or the error to answer the request with.
+        """
         validation_error = self._validate_request(request)
         if validation_error:
-            return SendTaskResponse(id=request.id, error=validation_error.error)
+            return validation_error.error
+
+        chunk = self._get_chunk_info(request.params)
+        if isinstance(chunk, JSONRPCError):
+            return chunk
+        if chunk is not None and chunk[0] > 0:
+            return await self._add_chunk(request.params, *chunk)
+        
+        if chunk is not None:
+            if self.chunked_jobs >= self.max_chunked_jobs:
+                logger.warning(
+                    f"Rejecting chunked task {request.params.id}: {self.chunked_jobs} chunked jobs running"
+                )
+                return ServerBusyError(data={"chunked_jobs": self.chunked_jobs})
+        elif self.pending_jobs >= self.max_pending_jobs:
+            logger.warning(f"Rejecting task {request.params.id}: {self.pending_jobs} jobs pending")
+            return ServerBusyError(data={"pending_jobs": self.pending_jobs})
         
         if request.params.pushNotification:
             if not await self.set_push_notification_info(request.params.id, request.params.pushNotification):
-                return SendTaskResponse(id=request.id, error=InvalidParamsError(message="Push notification URL is invalid"))
+                return InvalidParamsError(message="Push notification URL is invalid")
+
+        task_send_params: TaskSendParams = request.params
+        excel_request = self._parse_excel_request(task_send_params)
+        if excel_request.result_handle is not None and not self.agent.database_exports:
+            return InvalidParamsError(message="Database exports are not enabled on this agent")
 
-        await self.upsert_task(request.params)
-        task = await self.update_store(
-            request.params.id, TaskStatus(state=TaskState.WORKING), None
+        await self.upsert_task(task_send_params)
+        task_status = TaskStatus(state=TaskState.WORKING)
+        task = await self.update_store(task_send_params.id, task_status, None)
+        await self.send_task_notification(task)
+        await self.enqueue_events_for_sse(
+            task.id, TaskStatusUpdateEvent(id=task.id, status=task_status, final=False)
         )
+
+        chunks = None
+        if chunk is not None:
+            # One more than the limit, so the end of the rows always fits in
+            chunks = self._get_manager().Queue(maxsize=self.MAX_QUEUED_CHUNKS + 1)
+            chunks.put(excel_request.result)
+            if chunk[1]:
+                chunks.put(None)
+            else:
+                self.chunk_queues[task.id] = chunks
+                self.next_chunk_index[task.id] = 1
+            excel_request.result = []
+
+        self._start_job(task_send_params, excel_request, chunks)
+        return task
+
+    def _get_chunk_info(
+        self, task_send_params: TaskSendParams
+    ) -> tuple[int, bool] | JSONRPCError | None:
+        """Returns the chunk index and whether it is the last chunk, None if
+        the task is not chunked, or the error to answer invalid metadata with"""
+        metadata = task_send_params.metadata or {}
+        if "chunk_index" not in metadata:
+            return None
+        chunk_index = metadata["chunk_index"]
+        last_chunk = metadata.get("last_chunk", False)
+        # bool is an int, but True is no chunk index
+        if not isinstance(chunk_index, int) or isinstance(chunk_index, bool) or chunk_index < 0:
+            return InvalidParamsError(
+                message=f"chunk_index must be a non-negative integer, got {chunk_index!r}"
+            )
+        if not isinstance(last_chunk, bool):
+            return InvalidParamsError(message=f"last_chunk must be a boolean, got {last_chunk!r}")
+        return chunk_index, last_chunk
+
+    async def _add_chunk(
+        self, task_send_params: TaskSendParams, chunk_index: int, last_chunk: bool
+    ) -> Union[Task, JSONRPCError]:
+        """Pass the rows of a follow-up chunk to the task's job
+
+        While the job has `MAX_QUEUED_CHUNKS` chunks left to write, the chunk
+        is rejected with a `ServerBusyError` and is to be sent again later, so
+        that the rows are sent no faster than the file is written without
+        holding the request open. Chunks are not added to the task history.
+        """
+        task_id = task_send_params.id
+        chunks = self.chunk_queues.get(task_id)
+        if chunks is None:
+            return InvalidParamsError(message=f"Task {task_id} is not waiting for chunks")
+        queued_chunks = await asyncio.to_thread(chunks.qsize)
+        if queued_chunks >= self.MAX_QUEUED_CHUNKS:
+            return ServerBusyError(
+                message=f"Task {task_id} has {queued_chunks} chunks left to write, retry later",
+                data={"queued_chunks": queued_chunks},
+            )
+        if self.chunk_queues.get(task_id) is not chunks:
+            return InvalidParamsError(message=f"Task {task_id} has ended")
+        if chunk_index != self.next_chunk_index[task_id]:
+            return InvalidParamsError(
+                message=f"Expected chunk {self.next_chunk_index[task_id]} of task {task_id}, got {chunk_index}"
+            )
+        self.next_chunk_index[task_id] += 1
+        if last_chunk:
+            self._close_chunks(task_id)
+
+        rows = self._parse_excel_request(task_send_params).result
+        for item in ([rows, None] if last_chunk else [rows]):
+            await asyncio.to_thread(chunks.put, item)
+        async with self.lock:
+            return await self.task_store.get_task(task_id)
+
+    def _close_chunks(self, task_id: str):
+        self.chunk_queues.pop(task_id, None)
+        self.next_chunk_index.pop(task_id, None)
+
+    async def on_cancel_task(self, request: CancelTaskRequest) -> CancelTaskResponse:
+        """Handles the 'cancel task' request.
+        
+        Only chunked tasks still waiting for chunks can be cancelled, for
+        example by a sender that cannot deliver the rest of the rows. Their
+        job stops without waiting for `CHUNK_TIMEOUT`, and deletes what it
+        has written.
+        """
+        task_id = request.params.id
+        chunks = self.chunk_queues.get(task_id)
+        if chunks is None:
+            return await super().on_cancel_task(request)
+        self._close_chunks(task_id)
+        # Always fits, the queue has room for one more than the chunks it takes
+        await asyncio.to_thread(chunks.put, ExcelAgent.CHUNKS_CANCELLED)
+
+        task_status = TaskStatus(
+            state=TaskState.CANCELED,
+            message=Message(
+                role="agent", parts=[TextPart(text="The task was cancelled before its last chunk")]
+            )
+        )
+        task = await self.update_store(task_id, task_status, None)
         await self.send_task_notification(task)
+        await self.enqueue_events_for_sse(
+            task_id, TaskStatusUpdateEvent(id=task_id, status=task_status, final=True)
+        )
+        return CancelTaskResponse(id=request.id, result=task)
 
-        task_send_params: TaskSendParams = request.params
-        excel_request = self._parse_excel_request(task_send_params)
+    async def on_send_task(self, request: SendTaskRequest) -> SendTaskResponse:
+        """Handles the 'send task' request.
         
+        The file is generated in the process pool. The task is returned in the
+        WORKING state right away and completes in the background, which is
+        reported through push notifications, tasks/get and tasks/resubscribe.
+        """
+        result = await self._submit_task(request)
+        if isinstance(result, JSONRPCError):
+            return SendTaskResponse(id=request.id, error=result)
+        return SendTaskResponse(
+            id=request.id,
+            result=self.append_task_history(result, request.params.historyLength)
+        )
+
+    async def on_send_task_subscribe(
+        self, request: SendTaskStreamingRequest
+    ) -> AsyncIterable[SendTaskStreamingResponse] | JSONRPCResponse:
+        """Handles the 'send task subscribe' request.
+        
+        Streams a WORKING status update when the task starts and then about
+        once a second with the rows written, followed by the artifact and the
+        final status update.
+        """
+        # Subscribe before the job starts, so that no event is missed
+        sse_event_queue = await self.setup_sse_consumer(request.params.id, False)
         try:
-            agent_response = self.agent.process_request(excel_request)
-            return await self._process_agent_response(
-                request, agent_response, excel_request
+            result = await self._submit_task(request)
+        except Exception as e:
+            logger.error(f"Error submitting task {request.params.id}: {e}")
+            result = InternalError(message=f"An error occurred while submitting the task: {e}")
+        if isinstance(result, JSONRPCError):
+            async with self.subscriber_lock:
+                self.task_sse_subscribers[request.params.id].remove(sse_event_queue)
+            return JSONRPCResponse(id=request.id, error=result)
+        return self.dequeue_events_for_sse(request.id, request.params.id, sse_event_queue)
+
+    def _start_job(
+        self, task_send_params: TaskSendParams, excel_request: ExcelRequestMessage, chunks=None
+    ):
+        """Run the agent for a task in the process pool and complete the task
+        when it is done"""
+        if chunks is None:
+            self.pending_jobs += 1
+        else:
+            self.chunked_jobs += 1
+        self.active_task_ids.add(task_send_params.id)
+        job = asyncio.create_task(self._run_job(task_send_params, excel_request, chunks))
+        # Keep a reference until the job is done, the event loop only keeps weak ones
+        self.jobs.add(job)
+        job.add_done_callback(self.jobs.discard)
+
+    async def _run_job(
+        self, task_send_params: TaskSendParams, excel_request: ExcelRequestMessage, chunks=None
+    ):
+        task_id = task_send_params.id
+        try:
+            loop = asyncio.get_running_loop()
+            progress = QueueProgressReporter(self._get_progress_queue(), task_id)
+            agent_response = await loop.run_in_executor(
+                self.executor if chunks is None else self.chunked_executor,
+                self.agent.process_request, excel_request, progress, chunks
             )
+            self.active_task_ids.discard(task_id)
+            await self._process_agent_response(task_send_params, agent_response, excel_request)
+        except ChunksCancelledError:
+            # on_cancel_task has already updated the task
+            logger.info(f"Chunked task {task_id} was cancelled")
+            self.active_task_ids.discard(task_id)
         except Exception as e:
             logger.error(f"Error processing Excel request: {e}")
             logger.error(traceback.format_exc())
-            return SendTaskResponse(
-                id=request.id,
-                error=InternalError(message=f"Failed to generate Excel file: {str(e)}")
+            self.active_task_ids.discard(task_id)
+            self._close_chunks(task_id)
+            task_status = TaskStatus(
+                state=TaskState.FAILED,
+                message=Message(
+                    role="agent",
+                    parts=[TextPart(text=f"Failed to generate Excel file: {str(e)}")]
+                )
             )
+            task = await self.update_store(task_id, task_status, None)
+            await self.send_task_notification(task)
+            await self.enqueue_events_for_sse(
+                task_id, TaskStatusUpdateEvent(id=task_id, status=task_status, final=True)
+            )
+        finally:
+            if chunks is None:
+                self.pending_jobs -= 1
+            else:
+                self.chunked_jobs -= 1
 
     async def _process_agent_response(
-        self, request: SendTaskRequest, agent_response: Dict[str, Any],
+        self, task_send_params: TaskSendParams, agent_response: Dict[str, Any],
         excel_request: ExcelRequestMessage
-    ) -> SendTaskResponse:
+    ) -> Task:
         """Processes the agent's response and updates the task store."""
-        task_send_params: TaskSendParams = request.params
         task_id = task_send_params.id
-        history_length = task_send_params.historyLength
+        row_count = agent_response["content"]["row_count"]
         
         # Create response message
-        message_text = f"Excel file generated successfully from {len(excel_request.result)} records."
+        message_text = f"File generated successfully from {row_count} records."
         message = Message(
             role="agent", 
             parts=[{"type": "text", "text": message_text}]
@@ -116,16 +474,26 @@ class ExcelAgentTaskManager(InMemoryTaskManager):
         file_path = agent_response["content"]["file_path"]
         file_name = agent_response["content"]["file_name"]
         
-        # Create artifact with file part
-        artifact = self._create_file_artifact(file_path, file_name)
+        # Create artifact with file part, in a thread as registering the file
+        # may delete others to stay within the quota
+        artifact = await asyncio.to_thread(
+            self._create_file_artifact,
+            file_path, file_name, row_count, agent_response["content"]["mime_type"]
+        )
         
         # Update task status
         task_status = TaskStatus(state=TaskState.COMPLETED, message=message)
         task = await self.update_store(task_id, task_status, [artifact])
-        task_result = self.append_task_history(task, history_length)
         await self.send_task_notification(task)
         
-        return SendTaskResponse(id=request.id, result=task_result)
+        # Publish the result to resubscribing clients
+        await self.enqueue_events_for_sse(
+            task_id, TaskArtifactUpdateEvent(id=task_id, artifact=artifact)
+        )
+        await self.enqueue_events_for_sse(
+            task_id, TaskStatusUpdateEvent(id=task_id, status=task_status, final=True)
+        )
+        return task
     
     def _parse_excel_request(self, task_send_params: TaskSendParams) -> ExcelRequestMessage:
         """Extract SQL result data from the message parts"""
@@ -133,6 +501,7 @@ class ExcelAgentTaskManager(InMemoryTaskManager):
         query = ""
         sql_query = ""
         result_data = []
+        result_handle = None
         format_options = {}
         
         # Parse message parts
@@ -145,6 +514,7 @@ class ExcelAgentTaskManager(InMemoryTaskManager):
                         query = data.get("query", query)
                         sql_query = data.get("sql_query", sql_query)
                         result_data = data.get("result", result_data)
+                        result_handle = data.get("result_handle", result_handle)
                         format_options = data.get("format_options", format_options)
                 except json.JSONDecodeError:
                     # If not JSON, treat as the query text
@@ -154,63 +524,85 @@ class ExcelAgentTaskManager(InMemoryTaskManager):
                 query = data.get("query", query)
                 sql_query = data.get("sql_query", sql_query)
                 result_data = data.get("result", result_data)
+                result_handle = data.get("result_handle", result_handle)
                 format_options = data.get("format_options", format_options)
         
+        # Pick the output format from the accepted output modes unless it is given
+        if "output_format" not in format_options:
+            format_options = {
+                **format_options,
+                "output_format": ExcelAgent.negotiate_output_format(
+                    task_send_params.acceptedOutputModes
+                ),
+            }
+        
         return ExcelRequestMessage(
             query=query,
             sql_query=sql_query,
             result=result_data,
+            result_handle=result_handle,
             format_options=format_options
         )
     
-    def _create_file_artifact(self, file_path: str, file_name: str) -> Artifact:
-        """Create an artifact containing the Excel file"""
-        # Read the file
-        with open(file_path, "rb") as f:
-            file_bytes = f.read()
-        
-        # Encode to base64
-        encoded_bytes = base64.b64encode(file_bytes).decode("utf-8")
-        
-        # Determine MIME type
-        mime_type = mimetypes.guess_type(file_path)[0] or "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        
-        # Create file content
-        file_content = FileContent(
-            name=file_name,
-            mimeType=mime_type,
-            bytes=encoded_bytes
-        )
-        
+    def _create_file_artifact(
+        self, file_path: str, file_name: str, row_count: int, mime_type: str
+    ) -> Artifact:
+        """Create an artifact containing the exported file"""
+        file_size = os.path.getsize(file_path)
+        file_metadata = {
+            "type": "excel" if mime_type == XLSX_MIME_TYPE else "data",
+            "filename": file_name,
+            "size": file_size
+        }
+
+        if self.blob_store is not None:
+            # Reference the file by URI, it is downloaded from the blob route
+            # or read in place
+            blob_id = self.blob_store.register(file_path)
+            file_content = FileContent(
+                name=file_name,
+                mimeType=mime_type,
+                uri=(
+                    self.file_base_url + quote(blob_id) if self.file_base_url
+                    else Path(file_path).resolve().as_uri()
+                )
+            )
+            file_metadata["blob_id"] = blob_id
+        else:
+            # Embed the file as base64
+            with open(file_path, "rb") as f:
+                encoded_bytes = base64.b64encode(f.read()).decode("utf-8")
+            file_content = FileContent(
+                name=file_name,
+                mimeType=mime_type,
+                bytes=encoded_bytes
+            )
+
         # Create file part
         file_part = FilePart(
             type="file",
             file=file_content,
-            metadata={
-                "type": "excel",
-                "filename": file_name,
-                "size": os.path.getsize(file_path)
-            }
+            metadata=file_metadata
         )
-        
+
         # Text part explaining the file
         text_part = TextPart(
             type="text",
-            text=f"Query results exported to Excel file: {file_name}"
+            text=f"Query results exported to file: {file_name}"
         )
-        
+
         # Create artifact
         return Artifact(
-            name="Excel Export",
-            description="SQL query results exported to Excel format",
+            name="Excel Export" if mime_type == XLSX_MIME_TYPE else "Data Export",
+            description=f"SQL query results exported as {mime_type}",
             parts=[text_part, file_part],
             metadata={
-                "rows": len(file_bytes),
-                "file_size": os.path.getsize(file_path),
+                "rows": row_count,
+                "file_size": file_size,
                 "file_name": file_name
             }
         )
-    
+
     async def send_task_notification(self, task: Task):
         """Send push notification if configured"""
         if not await self.has_push_notification_info(task.id):
@@ -0,0 +1,808 @@
+"""Streaming result writers.
+
+Rows are written batch by batch as they arrive, with their styles applied at
+write time, so neither the data nor the finished file has to be held in
+memory.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import contextlib
+import csv
+import gzip
+import os
+import zipfile
+
+import numpy as np
+
+# Rows used to choose column widths and formats, taken from the start of the data.
+WIDTH_SAMPLE_ROWS = 1000
+MAX_COLUMN_WIDTH = 100
+
+# Data rows that fit on a sheet below the header row
+MAX_SHEET_ROWS = 1048575
+
+XLSX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# File extension and MIME type of each output format
+OUTPUT_FORMATS = {
+    "xlsx": (".xlsx", XLSX_MIME_TYPE),
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+}
+
+ZIP_MIME_TYPE = "application/zip"
+
+EMPTY_RESULT_COLUMN = "No results"
+EMPTY_RESULT_MESSAGE = "No data returned from query"
+
+
+def _cell_value(value: Any) -> Any:
+    """Converts a value to a type both Excel backends can write."""
+    if value is None or isinstance(value, (str, bool, int, float, Decimal)):
+        return value
+    if isinstance(value, (datetime, time)):
+        # Excel has no notion of time zones
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return value
+    return str(value)
+
+
+class ColumnProfile(NamedTuple):
+    width: float
+    # Excel number format of the column, None for the General format
+    num_format: Optional[str]
+
+
+DATE_FORMAT = "yyyy-mm-dd"
+DATETIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+TIME_FORMAT = "hh:mm:ss"
+
+# Excel stores dates as days since 1899-12-30, counting 1900-02-29 which did
+# not exist, so the numbers are only right from 1900-03-01 on
+SERIAL_DATE_EPOCH = date(1899, 12, 30).toordinal()
+FIRST_SERIAL_DATE = date(1900, 3, 1)
+
+# Decimal places shown at most before a column falls back to General
+MAX_DECIMALS = 6
+
+
+def _number_format(decimals: int) -> str:
+    """Shows at least `decimals` places and any more a value has, up to
+    MAX_DECIMALS, so that rows after the sample are not shown rounded to the
+    places of the sample."""
+    return "0." + "0" * decimals + "#" * (MAX_DECIMALS - decimals)
+
+
+def _decimals(numbers: np.ndarray) -> Optional[int]:
+    """Fewest decimal places that show every number, None if more than
+    MAX_DECIMALS are needed."""
+    for decimals in range(MAX_DECIMALS + 1):
+        if np.allclose(np.round(numbers, decimals), numbers, rtol=1e-9, atol=0):
+            return decimals
+    return None
+
+
+def _text_width(values: List[Any]) -> int:
+    # map() runs at C speed, NumPy's str_len needs the same str() calls first
+    return max(map(len, map(str, values)))
+
+
+def _profile_values(values: List[Any]) -> Tuple[int, Optional[str]]:
+    """Width and number format of the non-null values of a column."""
+    if not values:
+        return 0, None
+    # Exact types, bool is a subclass of int and datetime one of date
+    types = set(map(type, values))
+
+    if types == {int}:
+        try:
+            numbers = np.fromiter(values, dtype=np.int64, count=len(values))
+        except OverflowError:
+            return _text_width(values), None
+        return max(len(str(numbers.min())), len(str(numbers.max()))), "0"
+
+    if types <= {int, float, Decimal}:
+        numbers = np.fromiter(values, dtype=np.float64, count=len(values))
+        numbers = numbers[np.isfinite(numbers)]
+        if numbers.size == 0:
+            # NaN and infinity are written as errors such as #NUM!
+            return len("#NUM!"), None
+        decimals = _decimals(numbers)
+        if decimals is None:
+            return _text_width(values), None
+        # Not an integer column, so at least one place is shown even if the
+        # sample holds whole numbers only, and the column has room for all
+        # places a later row may show
+        decimals = max(decimals, 1)
+        width = max(
+            len(f"{numbers.min():.{MAX_DECIMALS}f}"), len(f"{numbers.max():.{MAX_DECIMALS}f}")
+        )
+        return width, _number_format(decimals)
+
+    if types == {date}:
+        return len("2000-01-01"), DATE_FORMAT
+    if types == {time}:
+        return len("00:00:00"), TIME_FORMAT
+    if types <= {date, datetime}:
+        return len("2000-01-01 00:00:00"), DATETIME_FORMAT
+    if types == {bool}:
+        return len("FALSE"), None
+    return _text_width(values), None
+
+
+def profile_columns(columns: List[str], sample: List[List[Any]]) -> List[ColumnProfile]:
+    """Chooses the width and number format of each column from the header and
+    a sample of rows.
+
+    The sample is transposed once and each column is handled as a whole: the
+    value types decide the format, number widths come from the minimum and
+    maximum as NumPy arrays formatted with the column's number format, and
+    only text columns are converted to strings.
+    """
+    column_values = list(zip(*sample)) if sample else [()] * len(columns)
+    profiles = []
+    for column, values in zip(columns, column_values):
+        width, num_format = _profile_values([value for value in values if value is not None])
+        profiles.append(
+            ColumnProfile(min(max(width, len(str(column))) + 2, MAX_COLUMN_WIDTH), num_format)
+        )
+    return profiles
+
+
+# Builds the (name, value) metadata rows of a file from its writer once all
+# rows are written.
+MetadataBuilder = Callable[["ResultWriter"], List[List[Any]]]
+
+
+class ResultWriter(ABC):
+    """Writes query results to a file from row batches.
+
+    Formats that can hold metadata store the rows returned by
+    `metadata_builder` with the file.
+    """
+
+    def __init__(self, file_path: str, format_options, metadata_builder: Optional[MetadataBuilder] = None):
+        # Path of the finished file, which may differ from the requested one
+        self.file_path = file_path
+        self.format_options = format_options
+        self.metadata_builder = metadata_builder
+        self.columns: Optional[List[str]] = None
+        # Data rows received
+        self.row_count = 0
+
+    @abstractmethod
+    def write_batch(self, rows: List[Dict[str, Any]]):
+        """Appends a batch of rows. The first row fixes the columns."""
+
+    @abstractmethod
+    def close(self):
+        """Finishes the file."""
+
+    def abort(self):
+        """Gives up the file after a failed write, releasing what the writer
+        holds open, temporary files included, and deleting what was written."""
+        # The caller raises the error that made it give up, not this one
+        with contextlib.suppress(Exception):
+            self._release()
+        _remove(self.file_path)
+
+    def _release(self):
+        """Closes whatever the writer holds open."""
+
+    def _metadata(self) -> Optional[List[List[Any]]]:
+        if self.metadata_builder is None:
+            return None
+        return self.metadata_builder(self)
+
+
+def _remove(file_path: str):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(file_path)
+
+
+class ExcelWriter(ResultWriter):
+    """Writes data sheets from row batches plus an optional metadata sheet.
+
+    Subclasses write single rows. This class keeps track of the columns and
+    the row count, and holds back the first rows until it has enough of them
+    to size the columns and choose their number formats, because both must be
+    known before rows are written. A new data sheet is started whenever one is
+    full.
+    """
+
+    def __init__(self, file_path: str, format_options, metadata_builder: Optional[MetadataBuilder] = None):
+        super().__init__(file_path, format_options, metadata_builder)
+        self.sheet_names: List[str] = []
+        # Rows written below the header of the current sheet
+        self.rows_written = 0
+        self._widths: Optional[List[float]] = None
+        # Number format of each column, None for General
+        self.number_formats: List[Optional[str]] = []
+        self._pending: List[List[Any]] = []
+        self._started = False
+
+    def write_batch(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        if self.columns is None:
+            self.columns = list(rows[0].keys())
+
+        values = [[_cell_value(row.get(column)) for column in self.columns] for row in rows]
+        self.row_count += len(values)
+        if not self._started:
+            self._pending.extend(values)
+            if len(self._pending) < WIDTH_SAMPLE_ROWS:
+                return
+            self._start()
+            values = []
+        for row in values:
+            self._append(row)
+
+    def _append(self, row: List[Any]):
+        if self.rows_written >= self.format_options.max_rows_per_sheet:
+            self._finish_sheet()
+            self._new_sheet()
+        self.rows_written += 1
+        self._write_row(self.rows_written, row)
+
+    def _new_sheet(self):
+        """Starts the next data sheet, named "<sheet_name> (n)" from the second on."""
+        # Excel limits sheet names to 31 characters
+        name = self.format_options.sheet_name[:31]
+        if self.sheet_names:
+            suffix = f" ({len(self.sheet_names) + 1})"
+            name = name[:31 - len(suffix)] + suffix
+        self.sheet_names.append(name)
+        self.rows_written = 0
+        self._start_sheet(name, self.columns, self._widths)
+
+    def _start(self):
+        if self.columns is None:
+            self.columns = [EMPTY_RESULT_COLUMN]
+            self._pending = [[EMPTY_RESULT_MESSAGE]]
+
+        profiles = profile_columns(self.columns, self._pending[:WIDTH_SAMPLE_ROWS])
+        self.number_formats = [profile.num_format for profile in profiles]
+        if self.format_options.column_width_auto:
+            self._widths = [profile.width for profile in profiles]
+        self._new_sheet()
+        self._started = True
+
+        pending, self._pending = self._pending, []
+        for row in pending:
+            self._append(row)
+
+    def close(self):
+        if not self._started:
+            self._start()
+        self._finish_sheet()
+        metadata = self._metadata()
+        if metadata is not None:
+            self._write_metadata([[_cell_value(value) for value in row] for row in metadata])
+        self._save()
+
+    def _release(self):
+        # openpyxl removes the temporary files of write-only sheets on saving
+        self._save()
+
+    @abstractmethod
+    def _start_sheet(self, sheet_name: str, columns: List[str], widths: Optional[List[float]]):
+        """Creates a data sheet and writes its header row."""
+
+    @abstractmethod
+    def _write_row(self, row_index: int, values: List[Any]):
+        """Writes the data row at 0-based sheet row `row_index`."""
+
+    @abstractmethod
+    def _finish_sheet(self):
+        """Applies sheet-level settings of the current sheet that need its
+        final row count."""
+
+    @abstractmethod
+    def _write_metadata(self, metadata: List[List[Any]]):
+        """Adds the metadata sheet."""
+
+    @abstractmethod
+    def _save(self):
+        """Writes the workbook to disk."""
+
+
+# Style templates in xlsxwriter format properties. "header" styles the header
+# cells, "band" every other data row and "border" all data cells. Data rows
+# are styled by one conditional format over the data range, so styling costs
+# the same for any number of rows.
+STYLE_TEMPLATES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "default": {
+        "header": {"bold": True},
+    },
+    "professional": {
+        "header": {
+            "bold": True, "font_name": "Arial", "font_size": 11, "font_color": "#FFFFFF",
+            "bg_color": "#1F4E78", "align": "center", "valign": "vcenter",
+        },
+    },
+    "colorful": {
+        "header": {
+            "bold": True, "font_name": "Calibri", "font_size": 11, "font_color": "#FFFFFF",
+            "bg_color": "#4472C4",
+        },
+        "band": {"bg_color": "#E6F2FF"},
+    },
+    "minimal": {
+        "header": {
+            "bold": True, "font_name": "Segoe UI", "font_size": 11,
+            "border": 1, "border_color": "#DDDDDD",
+        },
+        "border": {"border": 1, "border_color": "#DDDDDD"},
+    },
+}
+
+# Conditional format formulas of the row styles. The first data row is row 2
+# and is banded.
+BAND_FORMULA = "MOD(ROW(),2)=0"
+BORDER_FORMULA = "TRUE"
+
+
+class XlsxWriterExcelWriter(ExcelWriter):
+    """Writer using xlsxwriter in constant_memory mode, which flushes every row
+    to a temporary file once the next row starts."""
+
+    def __init__(self, file_path: str, format_options, metadata_builder: Optional[MetadataBuilder] = None):
+        import xlsxwriter
+
+        super().__init__(file_path, format_options, metadata_builder)
+        self.workbook = xlsxwriter.Workbook(
+            file_path,
+            {
+                "constant_memory": True,
+                "strings_to_formulas": False,
+                "strings_to_urls": False,
+                "nan_inf_to_errors": True,
+                "remove_timezone": True,
+                "default_date_format": DATETIME_FORMAT,
+            },
+        )
+        # Formats belong to a workbook, so each is added once and shared
+        self.formats = {
+            name: self.workbook.add_format(properties)
+            for name, properties in STYLE_TEMPLATES[format_options.style_template].items()
+        }
+        self.worksheet = None
+        self.cell_formats = None
+        self.date_columns = []
+
+    def _start_sheet(self, sheet_name, columns, widths):
+        if self.cell_formats is None:
+            number_formats = {
+                num_format: self.workbook.add_format({"num_format": num_format})
+                for num_format in set(self.number_formats) if num_format
+            }
+            self.cell_formats = [number_formats.get(num_format) for num_format in self.number_formats]
+            self.date_columns = [
+                i for i, num_format in enumerate(self.number_formats)
+                if num_format in (DATE_FORMAT, TIME_FORMAT)
+            ]
+        self.worksheet = self.workbook.add_worksheet(sheet_name)
+        for i, cell_format in enumerate(self.cell_formats):
+            if widths or cell_format:
+                self.worksheet.set_column(i, i, widths[i] if widths else None, cell_format)
+        if self.format_options.freeze_panes:
+            self.worksheet.freeze_panes(1, 0)
+        self.worksheet.write_row(0, 0, columns, self.formats["header"])
+
+    def _write_row(self, row_index, values):
+        # Unformatted cells take their column's format. Dates and times would
+        # take the workbook's default date format instead, so they are written
+        # as the numbers Excel stores them as.
+        for i in self.date_columns:
+            value = values[i]
+            if type(value) is date and value >= FIRST_SERIAL_DATE:
+                values[i] = value.toordinal() - SERIAL_DATE_EPOCH
+            elif type(value) is time:
+                values[i] = (
+                    value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6
+                ) / 86400
+        self.worksheet.write_row(row_index, 0, values)
+
+    def _finish_sheet(self):
+        last_column = len(self.columns) - 1
+        for name, formula in (("band", BAND_FORMULA), ("border", BORDER_FORMULA)):
+            if name in self.formats and self.rows_written:
+                self.worksheet.conditional_format(
+                    1, 0, self.rows_written, last_column,
+                    {"type": "formula", "criteria": "=" + formula, "format": self.formats[name]},
+                )
+        if self.format_options.auto_filter:
+            self.worksheet.autofilter(0, 0, self.rows_written, last_column)
+
+    def _write_metadata(self, metadata):
+        worksheet = self.workbook.add_worksheet("Metadata")
+        header_format = self.workbook.add_format({"bold": True})
+        wrap_format = self.workbook.add_format({"text_wrap": True, "valign": "top"})
+        for i in range(2):
+            width = max(len(str(row[i])) for row in metadata)
+            worksheet.set_column(i, i, min(width + 2, MAX_COLUMN_WIDTH))
+        worksheet.write_row(0, 0, ["Metadata", "Value"], header_format)
+        for row_index, row in enumerate(metadata, start=1):
+            if row[0] == "SQL Query":
+                # Make SQL query cell taller to accommodate multi-line text
+                worksheet.set_row(row_index, 60)
+                worksheet.write_row(row_index, 0, row, wrap_format)
+            else:
+                worksheet.write_row(row_index, 0, row)
+
+    def _save(self):
+        self.workbook.close()
+
+    def _release(self):
+        # Closing would write out the workbook, only the temporary files
+        # holding the rows of constant_memory sheets need to go
+        for worksheet in self.workbook.worksheets():
+            if worksheet.row_data_fh is not None:
+                worksheet.row_data_fh.close()
+                _remove(worksheet.row_data_filename)
+
+
+@lru_cache(maxsize=None)
+def _openpyxl_styles(template_name: str) -> Dict[str, Any]:
+    """Translates a style template to openpyxl style objects, once per template.
+
+    openpyxl style objects are immutable, so all workbooks share them. The
+    header style is a dict of cell attributes, row styles are differential
+    styles for conditional formatting.
+    """
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+    from openpyxl.styles.differential import DifferentialStyle
+
+    def color(value):
+        return value.lstrip("#")
+
+    def border(properties):
+        side = Side(style="thin", color=color(properties.get("border_color", "#000000")))
+        return Border(left=side, right=side, top=side, bottom=side)
+
+    template = STYLE_TEMPLATES[template_name]
+    header = template["header"]
+    styles: Dict[str, Any] = {
+        "header": {
+            "font": Font(
+                name=header.get("font_name"),
+                size=header.get("font_size"),
+                bold=header.get("bold", False),
+                color=color(header["font_color"]) if "font_color" in header else None,
+            )
+        }
+    }
+    if "bg_color" in header:
+        styles["header"]["fill"] = PatternFill(
+            start_color=color(header["bg_color"]), end_color=color(header["bg_color"]), fill_type="solid"
+        )
+    if "align" in header or "valign" in header:
+        vertical = {"vcenter": "center"}.get(header.get("valign"), header.get("valign"))
+        styles["header"]["alignment"] = Alignment(horizontal=header.get("align"), vertical=vertical)
+    if "border" in header:
+        styles["header"]["border"] = border(header)
+
+    if "band" in template:
+        # Differential fills take the fill color as background color
+        styles["band"] = DifferentialStyle(
+            fill=PatternFill(bgColor=color(template["band"]["bg_color"]), fill_type="solid")
+        )
+    if "border" in template:
+        styles["border"] = DifferentialStyle(border=border(template["border"]))
+    return styles
+
+
+class OpenpyxlExcelWriter(ExcelWriter):
+    """Writer using an openpyxl write-only workbook, which serializes rows as
+    they are appended.
+
+    openpyxl formats dates by their type. Number formats are not applied, as
+    write-only cells only take a format through a styled cell per value.
+    """
+
+    def __init__(self, file_path: str, format_options, metadata_builder: Optional[MetadataBuilder] = None):
+        from openpyxl import Workbook
+
+        super().__init__(file_path, format_options, metadata_builder)
+        self.workbook = Workbook(write_only=True)
+        self.styles = _openpyxl_styles(format_options.style_template)
+        self.worksheet = None
+
+    @staticmethod
+    def _styled_cell(worksheet, value, **styles):
+        from openpyxl.cell import WriteOnlyCell
+
+        cell = WriteOnlyCell(worksheet, value=value)
+        for name, style in styles.items():
+            setattr(cell, name, style)
+        return cell
+
+    def _start_sheet(self, sheet_name, columns, widths):
+        from openpyxl.utils import get_column_letter
+
+        self.worksheet = self.workbook.create_sheet(sheet_name)
+        if widths:
+            for i, width in enumerate(widths):
+                self.worksheet.column_dimensions[get_column_letter(i + 1)].width = width
+        if self.format_options.freeze_panes:
+            self.worksheet.freeze_panes = "A2"
+        header_style = self.styles["header"]
+        self.worksheet.append([self._styled_cell(self.worksheet, column, **header_style) for column in columns])
+
+    def _write_row(self, row_index, values):
+        self.worksheet.append(values)
+
+    def _finish_sheet(self):
+        from openpyxl.formatting.rule import Rule
+        from openpyxl.utils import get_column_letter
+
+        last_column = get_column_letter(len(self.columns))
+        for name, formula in (("band", BAND_FORMULA), ("border", BORDER_FORMULA)):
+            if name in self.styles and self.rows_written:
+                self.worksheet.conditional_formatting.add(
+                    f"A2:{last_column}{self.rows_written + 1}",
+                    Rule(type="expression", formula=[formula], dxf=self.styles[name]),
+                )
+        if self.format_options.auto_filter:
+            self.worksheet.auto_filter.ref = f"A1:{last_column}{self.rows_written + 1}"
+
+    def _write_metadata(self, metadata):
+        from openpyxl.styles import Alignment, Font
+
+        worksheet = self.workbook.create_sheet("Metadata")
+        for i, column in enumerate(["A", "B"]):
+            width = max(len(str(row[i])) for row in metadata)
+            worksheet.column_dimensions[column].width = min(width + 2, MAX_COLUMN_WIDTH)
+        for row_index, row in enumerate(metadata, start=1):
+            if row[0] == "SQL Query":
+                # Make SQL query cell taller to accommodate multi-line text
+                worksheet.row_dimensions[row_index + 1].height = 60
+        bold = Font(bold=True)
+        wrap = Alignment(wrap_text=True, vertical="top")
+        worksheet.append([self._styled_cell(worksheet, value, font=bold) for value in ["Metadata", "Value"]])
+        for row in metadata:
+            if row[0] == "SQL Query":
+                worksheet.append([self._styled_cell(worksheet, value, alignment=wrap) for value in row])
+            else:
+                worksheet.append(row)
+
+    def _save(self):
+        self.workbook.save(self.file_path)
+
+
+class CsvResultWriter(ResultWriter):
+    """Writes CSV, gzip compressed for the "csv.gz" format. Metadata is not
+    written."""
+
+    def __init__(self, file_path: str, format_options, metadata_builder: Optional[MetadataBuilder] = None):
+        super().__init__(file_path, format_options, metadata_builder)
+        if format_options.output_format == "csv.gz":
+            # Level 6 compresses about as well as the default of 9 at a fraction of the time
+            self.file = gzip.open(file_path, "wt", newline="", encoding="utf-8", compresslevel=6)
+        else:
+            self.file = open(file_path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+
+    def write_batch(self, rows):
+        if not rows:
+            return
+        if self.columns is None:
+            self.columns = list(rows[0].keys())
+            if self.format_options.include_headers:
+                self.writer.writerow(self.columns)
+        self.writer.writerows([row.get(column) for column in self.columns] for row in rows)
+        self.row_count += len(rows)
+
+    def close(self):
+        if self.columns is None and self.format_options.include_headers:
+            self.writer.writerow([EMPTY_RESULT_COLUMN])
+        self.file.close()
+
+    def _release(self):
+        self.file.close()
+
+
+class ArrowResultWriter(ResultWriter):
+    """Writes Parquet or Arrow IPC files with pyarrow, one record batch per
+    row batch.
+
+    The schema is inferred from the first batch. Columns that are empty in it
+    are typed as strings, and decimal columns are widened to the largest
+    precision with room for DECIMAL_SCALE places, because the schema cannot
+    change once the file is started. Each later batch is inferred on its own
+    and cast to the schema safely, so a value that does not fit its column,
+    such as 1.5 in an integer column, fails the export with an error naming
+    the column instead of being truncated. Parquet files keep the metadata
+    rows in their key-value metadata, Arrow files do not store metadata.
+    """
+
+    # Decimal places of decimal columns, unless the first batch needs more
+    DECIMAL_SCALE = 18
+    MAX_DECIMAL_PRECISION = 38
+
+    def __init__(self, file_path: str, format_options, metadata_builder: Optional[MetadataBuilder] = None):
+        super().__init__(file_path, format_options, metadata_builder)
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise ValueError(
+                f"The {format_options.output_format} output format requires pyarrow"
+            ) from e
+        self.pa = pyarrow
+        self.writer = None
+        self.schema = None
+        self.string_columns: List[str] = []
+
+    def _open(self, schema):
+        self.schema = schema
+        if self.format_options.output_format == "parquet":
+            import pyarrow.parquet as pq
+
+            self.writer = pq.ParquetWriter(self.file_path, schema, compression="snappy")
+        else:
+            self.writer = self.pa.ipc.new_file(self.file_path, schema)
+
+    def _widen(self, field):
+        pa = self.pa
+        if pa.types.is_null(field.type):
+            return pa.field(field.name, pa.string())
+        if pa.types.is_decimal128(field.type):
+            integer_digits = field.type.precision - field.type.scale
+            scale = max(
+                field.type.scale,
+                min(self.DECIMAL_SCALE, self.MAX_DECIMAL_PRECISION - integer_digits),
+            )
+            return pa.field(field.name, pa.decimal128(self.MAX_DECIMAL_PRECISION, scale))
+        return field
+
+    def _column_array(self, field, values):
+        """Converts a column of a batch to its type in the schema, raising
+        ValueError if a value does not fit"""
+        pa = self.pa
+        try:
+            array = pa.array(values)
+            if array.type != field.type:
+                array = array.cast(field.type, safe=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, OverflowError) as e:
+            raise ValueError(
+                f"Column {field.name!r} has values that do not fit its type {field.type}, "
+                f"inferred from the first rows: {e}"
+            ) from e
+        return array
+
+    def write_batch(self, rows):
+        if not rows:
+            return
+        pa = self.pa
+        if self.writer is None:
+            self.columns = list(rows[0].keys())
+            schema = pa.Table.from_pylist(rows).schema
+            self.string_columns = [field.name for field in schema if pa.types.is_null(field.type)]
+            self._open(pa.schema([self._widen(field) for field in schema]))
+
+        columns = {column: [row.get(column) for row in rows] for column in self.columns}
+        for column in self.string_columns:
+            columns[column] = [None if value is None else str(value) for value in columns[column]]
+        arrays = [
+            self._column_array(field, columns[field.name]) for field in self.schema
+        ]
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.row_count += len(rows)
+
+    def close(self):
+        if self.writer is None:
+            self.columns = [EMPTY_RESULT_COLUMN]
+            self._open(self.pa.schema([self.pa.field(EMPTY_RESULT_COLUMN, self.pa.string())]))
+        metadata = self._metadata()
+        if metadata is not None and self.format_options.output_format == "parquet":
+            self.writer.add_key_value_metadata({str(name): str(value) for name, value in metadata})
+        self.writer.close()
+
+    def _release(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class SplitFileWriter(ResultWriter):
+    """Writes results to files of at most `max_rows_per_file` rows each, and
+    zips them together when there is more than one.
+
+    Only one file is open at a time. The parts are named
+    "<name>_part<n><extension>" inside the zip file, and each part carries
+    its own metadata.
+    """
+
+    # Formats that are compressed already are stored without compressing them again
+    STORED_FORMATS = ("xlsx", "csv.gz", "parquet")
+
+    def __init__(self, file_path: str, format_options, metadata_builder: Optional[MetadataBuilder] = None):
+        super().__init__(file_path, format_options, metadata_builder)
+        extension = OUTPUT_FORMATS[format_options.output_format][0]
+        self.base_path = file_path[:-len(extension)]
+        self.extension = extension
+        self.part: Optional[ResultWriter] = None
+        self.part_paths: List[str] = []
+
+    def _next_part(self):
+        if self.part is not None:
+            self.part.close()
+        path = f"{self.base_path}_part{len(self.part_paths) + 1}{self.extension}"
+        self.part_paths.append(path)
+        self.part = _create_file_writer(path, self.format_options, self.metadata_builder)
+
+    def write_batch(self, rows):
+        if not rows:
+            return
+        if self.columns is None:
+            self.columns = list(rows[0].keys())
+        self.row_count += len(rows)
+
+        max_rows = self.format_options.max_rows_per_file
+        while rows:
+            if self.part is None or self.part.row_count >= max_rows:
+                self._next_part()
+            room = max_rows - self.part.row_count
+            self.part.write_batch(rows[:room])
+            rows = rows[room:]
+
+    def close(self):
+        if self.part is None:
+            self._next_part()
+        self.part.close()
+
+        if len(self.part_paths) == 1:
+            os.replace(self.part_paths[0], self.file_path)
+            return
+
+        zip_path = self.base_path + ".zip"
+        compression = (
+            zipfile.ZIP_STORED if self.format_options.output_format in self.STORED_FORMATS
+            else zipfile.ZIP_DEFLATED
+        )
+        with zipfile.ZipFile(zip_path, "w", compression, allowZip64=True) as archive:
+            for path in self.part_paths:
+                archive.write(path, os.path.basename(path))
+                os.remove(path)
+        self.file_path = zip_path
+
+    def abort(self):
+        if self.part is not None:
+            self.part.abort()
+        for path in self.part_paths + [self.file_path, self.base_path + ".zip"]:
+            _remove(path)
+
+
+EXCEL_WRITERS = {
+    "xlsxwriter": XlsxWriterExcelWriter,
+    "openpyxl": OpenpyxlExcelWriter,
+}
+
+
+def _create_file_writer(
+    file_path: str, format_options, metadata_builder: Optional[MetadataBuilder] = None
+) -> ResultWriter:
+    output_format = format_options.output_format
+    if output_format == "xlsx":
+        return EXCEL_WRITERS[format_options.engine](file_path, format_options, metadata_builder)
+    if output_format in ("csv", "csv.gz"):
+        return CsvResultWriter(file_path, format_options, metadata_builder)
+    return ArrowResultWriter(file_path, format_options, metadata_builder)
+
+
+def create_writer(
+    file_path: str, format_options, metadata_builder: Optional[MetadataBuilder] = None
+) -> ResultWriter:
+    """Creates the writer for the output format and, for xlsx, the engine
+    selected in the format options. With `max_rows_per_file` set, the rows
+    are split over several files that end up in one zip file."""
+    if format_options.max_rows_per_file:
+        return SplitFileWriter(file_path, format_options, metadata_builder)
+    return _create_file_writer(file_path, format_options, metadata_builder)
@@ -1,8 +1,6 @@
-from common.server import A2AServer
+from common.server import A2AServer, AdmissionController, SQLTaskStore, create_task_store
 from common.types import AgentCard, AgentCapabilities, AgentSkill, MissingAPIKeyError
 from common.utils.push_notification_auth import PushNotificationSenderAuth
-from agents.sql_agent.task_manager import AgentTaskManager
-from agents.sql_agent.agent import SQLAgent
 import click
 import os
 import logging
@@ -11,53 +9,128 @@ from dotenv import load_dotenv
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
-logger = logging.getlogger(__name__)
+logger = logging.getLogger(__name__)
+
+
+def check_api_key():
+    if not os.getenv("GOOGLE_API_KEY"):
+        raise MissingAPIKeyError("GOOGLE_API_KEY environment variable not set.")
+
+
+def build_server(
+    host, port, task_store_url=None, private_jwk=None, create_tables=True
+) -> A2AServer:
+    """Builds the SQL agent server."""
+    check_api_key()
+    # Imported here, importing the agent reflects the database schema, which
+    # the main process of a multi-worker server does not need
+    from agents.sql_agent.task_manager import AgentTaskManager
+    from agents.sql_agent.agent import SQLAgent
+    from core.database import db
+
+    capabilities = AgentCapabilities(streaming=True, pushNotifications=True)
+    skill = AgentSkill(
+        id="text_to_sql",
+        description="Helps with convert natural language query to SQL query, and approach to database",
+        tags=["text-to-sql", "database manage"],
+        examples=["I want to get data related to eletric machine from the database"]
+    )
+    agent_card = AgentCard(
+        name="Database Agent",
+        description="Helps with convert natural language query to SQL query, and approach to database",
+        url=f"http://{host}:{port}/",
+        version="1.0.0",
+        defaultInputModes=SQLAgent.SUPPORTED_CONTENT_TYPES,
+        defaultOutputModes=SQLAgent.SUPPORTED_CONTENT_TYPES,
+        capabilities=capabilities,
+        skills=[skill],
+    )
+
+    notification_sender_auth = PushNotificationSenderAuth()
+    if private_jwk:
+        notification_sender_auth.load_jwk(private_jwk)
+    else:
+        notification_sender_auth.generate_jwk()
+    agent = SQLAgent()
+    server = A2AServer(
+        agent_card=agent_card,
+        task_manager=AgentTaskManager(
+            agent=agent,
+            notification_sender_auth=notification_sender_auth,
+            task_store=create_task_store(task_store_url, create_tables),
+            ),
+        host=host,
+        port=port,
+        admission_controller=AdmissionController.from_env(),
+        # The schema is reflected on import, before the server accepts connections.
+        # The model is a stateless HTTP client with nothing to warm up, so it has
+        # no check; probing it would call the paid API on every poll.
+        readiness_checks={"database": db.ping},
+    )
+
+    server.app.add_route(
+        "/.well-known/jwks.json", notification_sender_auth.handle_jwks_endpoint, methods=["GET"]
+    )
+    return server
+
+
+def create_app():
+    """App factory used by each worker process in multi-worker mode."""
+    server = build_server(
+        os.environ["A2A_HOST"],
+        int(os.environ["A2A_PORT"]),
+        task_store_url=os.environ.get("A2A_TASK_STORE_URL"),
+        private_jwk=os.environ.get("A2A_PUSH_NOTIFICATION_JWK"),
+        # Created by the main process before starting the workers
+        create_tables=False,
+    )
+    return server.app
+
 
 @click.command()
 @click.option("--host", "host", default="localhost")
 @click.option("--port", "port", default=10000)
-def main(host, port):
+@click.option("--workers", default=1, help="Number of worker processes")
+@click.option("--task-store-url", envvar="A2A_TASK_STORE_URL", default=None,
+              help="SQLAlchemy URL of the task store shared by workers")
+@click.option("--keep-alive", default=5, help="HTTP keep-alive timeout in seconds")
+@click.option("--backlog", default=2048, help="Maximum number of pending connections")
+@click.option("--limit-concurrency", default=None, type=int,
+              help="Maximum number of concurrent connections per worker")
+@click.option("--loop", type=click.Choice(["auto", "asyncio", "uvloop"]), default="auto")
+@click.option("--http", type=click.Choice(["auto", "h11", "httptools"]), default="auto")
+def main(host, port, workers, task_store_url, keep_alive, backlog, limit_concurrency, loop, http):
     """Starts the SQL agent server."""
+    options = dict(
+        timeout_keep_alive=keep_alive,
+        backlog=backlog,
+        limit_concurrency=limit_concurrency,
+        loop=loop,
+        http=http,
+    )
     try:
-        if not os.getenv("GOOGLE_API_KEY"):
-            raise MissingAPIKeyError("GOOGLE_API_KEY environment variable not set.")
-        
-        capabilities = AgentCapabilities(streaming=True, pushNotifications=True)
-        skill = AgentSkill(
-            id="text_to_sql",
-            description="Helps with convert natural language query to SQL query, and approach to database",
-            tags=["text-to-sql", "database manage"],
-            examples=["I want to get data related to eletric machine from the database"]
-        )
-        agent_card = AgentCard(
-            name="Database Agent",
-            description="Helps with convert natural language query to SQL query, and approach to database",
-            url=f"http://{host}:{port}/",
-            version="1.0.0",
-            defaultInputModes=SQLAgent.SUPPORTED_CONTENT_TYPES,
-            defaultOutputModes=SQLAgent.SUPPORTED_CONTENT_TYPES,
-            capabilities=capabilities,
-            skills=[skill],
-        )
-
-        notification_sender_auth = PushNotificationSenderAuth()
-        notification_sender_auth.generate_jwk()
-        server = A2AServer(
-            agent_card=agent_card,
-            task_manager=AgentTaskManager(
-                agent=SQLAgent(),
-                notification_sender_auth=notification_sender_auth
-                ),
-            host=host,
-            port=port,
-        )
-
-        server.app.route(
-            "/.well-known/jwks.json", notification_sender_auth.handle_jwks_endpoint, methods=["GET"]
-        )
-
-        logger.info(f"Starting server on {host}:{port}")
-        server.start()
+        if workers > 1:
+            check_api_key()
+            if not task_store_url:
+                logger.warning("No --task-store-url given, tasks are not shared between workers")
+            # Worker processes build the server through create_app() from these,
+            # the main process only starts them.
+            os.environ["A2A_HOST"] = host
+            os.environ["A2A_PORT"] = str(port)
+            os.environ["A2A_PUSH_NOTIFICATION_JWK"] = PushNotificationSenderAuth().generate_jwk()
+            if task_store_url:
+                os.environ["A2A_TASK_STORE_URL"] = task_store_url
+                # Creates the tables once, before the workers open the store
+                SQLTaskStore(task_store_url).engine.dispose()
+
+            logger.info(f"Starting server on {host}:{port} with {workers} workers")
+            A2AServer.start_workers(
+                f"{__spec__.name}:create_app", workers, host, port, **options
+            )
+        else:
+            server = build_server(host, port, task_store_url)
+            logger.info(f"Starting server on {host}:{port}")
+            server.start(**options)
     except MissingAPIKeyError as e:
         logger.error(f"Error: {e}")
     except Exception as e:
@@ -66,4 +139,4 @@ def main(host, port):
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
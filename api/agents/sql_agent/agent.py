@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional, Literal, AsyncIterable
+from typing import Any, Dict, Iterator, List, Optional, Literal, AsyncIterable
 from pydantic import BaseModel
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.tools import tool
@@ -9,10 +9,21 @@ from langchain_core.messages import AIMessage, ToolMessage
 from core.config import settings
 from core.database import db
 from core.schema import schema_manager
-from core.models import QueryRequest, QueryResponse, SQLResultMessage
+from core.models import QueryRequest, QueryResponse, ResultHandle, SQLResultMessage
+import re
 
 memory = MemorySaver()
 
+# A Markdown code block, its language tag and an unterminated end included
+CODE_BLOCK = re.compile(r"```[^\n]*\n(.*?)(?:```|\Z)", re.DOTALL)
+
+def extract_sql(text: str) -> str:
+    """Return the SQL of a model answer, the first code block if there is one"""
+    match = CODE_BLOCK.search(text)
+    if match:
+        return match.group(1).strip()
+    return text.strip().strip("`").strip()
+
 @tool("list_tables")
 def list_tables() -> List[str]:
     """Returns all table names of the database"""
@@ -132,6 +143,29 @@ class SQLAgent:
         
         yield self.get_agent_response(config)
 
+    def plan(self, query) -> Dict[str, Any]:
+        """Convert the query to SQL without executing it
+
+        The result holds a handle in place of the rows, for consumers that
+        read them from the database themselves.
+        """
+        # The model may wrap the SQL in a Markdown code block
+        sql_query = extract_sql(text_to_sql.invoke(query))
+        result = SQLResultMessage(
+            sql_query=sql_query,
+            result=[],
+            metadata={"result_mode": "handle"},
+            result_handle=ResultHandle(sql_query=sql_query),
+        )
+        return {
+            "is_task_complete": True,
+            "require_user_input": False,
+            "content": result.model_dump(),
+        }
+
+    def stream_rows(self, sql_query: str, batch_size: int = 10000) -> Iterator[List[Dict[str, Any]]]:
+        """Execute SQL and yield its rows batch by batch"""
+        return db.stream_query(sql_query, batch_size=batch_size)
 
     def get_agent_response(self, config):
         current_state = self.graph.get_state(config)        
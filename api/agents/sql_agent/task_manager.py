@@ -6,6 +6,7 @@ from common.types import (
     TaskStatus,
     Artifact,
     TextPart,
+    DataPart,
     TaskState,
     SendTaskResponse,
     InternalError,
@@ -24,20 +25,36 @@ from common.types import (
     InvalidParamsError,
 )
 from common.server.task_manager import InMemoryTaskManager
+from common.server.task_store import TaskStore
 from sql_agent.agent import SQLAgent
+from core.models import SQLResultMessage
 from common.utils.push_notification_auth import PushNotificationSenderAuth
 import common.server.utils as utils
-from typing import Union
+from typing import Any, Dict, List, Union
 import asyncio
 import logging
 import traceback
 
 logger = logging.getLogger(__name__)
 
+# Task metadata asking for the SQL query and a result handle instead of the rows
+RESULT_MODE_HANDLE = "handle"
+# Task metadata asking for the rows as artifact chunks, tasks/sendSubscribe only
+RESULT_MODE_STREAM = "stream"
+
 
 class AgentTaskManager(InMemoryTaskManager):
-    def __init__(self, agent: SQLAgent, notification_sender_auth: PushNotificationSenderAuth):
-        super().__init__()
+    # Rows per result chunk, and chunks queued for a subscriber before more rows are read
+    CHUNK_SIZE = 5000
+    MAX_QUEUED_CHUNKS = 2
+
+    def __init__(
+        self,
+        agent: SQLAgent,
+        notification_sender_auth: PushNotificationSenderAuth,
+        task_store: TaskStore | None = None,
+    ):
+        super().__init__(task_store=task_store)
         self.agent = agent
         self.notification_sender_auth = notification_sender_auth
 
@@ -45,13 +62,24 @@ class AgentTaskManager(InMemoryTaskManager):
         task_send_params: TaskSendParams = request.params
         query = self._get_user_query(task_send_params)
 
+        result_mode = self._result_mode(task_send_params)
+        if result_mode == RESULT_MODE_STREAM:
+            items = None
+        elif result_mode == RESULT_MODE_HANDLE:
+            items = self._stream_plan(query)
+        else:
+            items = self.agent.stream(query, task_send_params.sessionId)
         try:
-            async for item in self.agent.stream(query, task_send_params.sessionId):
+            if items is None:
+                await self._stream_result(task_send_params, query)
+                return
+
+            async for item in items:
                 is_task_complete = item["is_task_complete"]
                 require_user_input = item["require_user_input"]
                 artifact = None
                 message = None
-                parts = [{"type": "text", "text": item["content"]}]
+                parts = self._content_parts(item["content"])
                 end_stream = False
 
                 if not is_task_complete and not require_user_input:
@@ -92,10 +120,21 @@ class AgentTaskManager(InMemoryTaskManager):
 
         except Exception as e:
             logger.error(f"An error occurred while streaming the response: {e}")
-            await self.enqueue_events_for_sse(
-                task_send_params.id,
-                InternalError(message=f"An error occurred while streaming the response: {e}")                
-            )
+            message = f"An error occurred while streaming the response: {e}"
+            try:
+                # Record the failure for clients that poll or were notified
+                latest_task = await self.update_store(
+                    task_send_params.id,
+                    TaskStatus(
+                        state=TaskState.FAILED,
+                        message=Message(role="agent", parts=[TextPart(text=message)]),
+                    ),
+                    None,
+                )
+                await self.send_task_notification(latest_task)
+            except Exception as store_error:
+                logger.error(f"Could not mark task {task_send_params.id} as failed: {store_error}")
+            await self.enqueue_events_for_sse(task_send_params.id, InternalError(message=message))
 
     def _validate_request(
         self, request: Union[SendTaskRequest, SendTaskStreamingRequest]
@@ -122,6 +161,11 @@ class AgentTaskManager(InMemoryTaskManager):
         validation_error = self._validate_request(request)
         if validation_error:
             return SendTaskResponse(id=request.id, error=validation_error.error)
+        if self._result_mode(request.params) == RESULT_MODE_STREAM:
+            return SendTaskResponse(
+                id=request.id,
+                error=InvalidParamsError(message="Streamed results require tasks/sendSubscribe"),
+            )
         
         if request.params.pushNotification:
             if not await self.set_push_notification_info(request.params.id, request.params.pushNotification):
@@ -136,7 +180,13 @@ class AgentTaskManager(InMemoryTaskManager):
         task_send_params: TaskSendParams = request.params
         query = self._get_user_query(task_send_params)
         try:
-            agent_response = self.agent.invoke(query, task_send_params.sessionId)
+            # The agent blocks, run it in a thread to keep serving other requests
+            if self._returns_result_handle(task_send_params):
+                agent_response = await asyncio.to_thread(self.agent.plan, query)
+            else:
+                agent_response = await asyncio.to_thread(
+                    self.agent.invoke, query, task_send_params.sessionId
+                )
         except Exception as e:
             logger.error(f"Error invoking agent: {e}")
             raise ValueError(f"Error invoking agent: {e}")
@@ -185,7 +235,7 @@ class AgentTaskManager(InMemoryTaskManager):
         history_length = task_send_params.historyLength
         task_status = None
 
-        parts = [{"type": "text", "text": agent_response["content"]}]
+        parts = self._content_parts(agent_response["content"])
         artifact = None
         if agent_response["require_user_input"]:
             task_status = TaskStatus(
@@ -202,6 +252,76 @@ class AgentTaskManager(InMemoryTaskManager):
         await self.send_task_notification(task)
         return SendTaskResponse(id=request.id, result=task_result)
     
+    def _result_mode(self, task_send_params: TaskSendParams) -> str | None:
+        metadata = task_send_params.metadata or {}
+        return metadata.get("result_mode")
+
+    def _returns_result_handle(self, task_send_params: TaskSendParams) -> bool:
+        """Whether the task asks for a result handle instead of the result rows"""
+        return self._result_mode(task_send_params) == RESULT_MODE_HANDLE
+
+    async def _stream_result(self, task_send_params: TaskSendParams, query: str):
+        """Run the query and stream its rows as chunks of one artifact
+
+        The first chunk holds the SQL query, every chunk holds rows, and the
+        last one, which may be empty, is marked `lastChunk`. Chunks are only
+        published to subscribers, they are neither stored nor replayed, and
+        rows are read from the database only as fast as the subscribers take
+        them. The stored artifact holds the SQL query and the row count.
+        """
+        task_id = task_send_params.id
+        plan = await asyncio.to_thread(self.agent.plan, query)
+        sql_query = plan["content"]["sql_query"]
+        batches = self.agent.stream_rows(sql_query, batch_size=self.CHUNK_SIZE)
+        row_count = 0
+        try:
+            while True:
+                rows = await asyncio.to_thread(next, batches, None)
+                data = {"result": rows or []}
+                if row_count == 0:
+                    data["sql_query"] = sql_query
+                artifact = Artifact(
+                    name="SQL Result",
+                    parts=[DataPart(data=data)],
+                    index=0,
+                    append=row_count > 0,
+                    lastChunk=rows is None,
+                )
+                await self.enqueue_events_for_sse(
+                    task_id, TaskArtifactUpdateEvent(id=task_id, artifact=artifact), retain=False
+                )
+                if rows is None:
+                    break
+                row_count += len(rows)
+                await self.wait_for_sse_consumers(task_id, self.MAX_QUEUED_CHUNKS)
+                if not self.task_sse_subscribers.get(task_id):
+                    raise ValueError("The client closed the result stream")
+        finally:
+            await asyncio.to_thread(batches.close)
+
+        result = SQLResultMessage(
+            sql_query=sql_query,
+            result=[],
+            metadata={"row_count": row_count, "result_mode": RESULT_MODE_STREAM},
+        )
+        task_status = TaskStatus(state=TaskState.COMPLETED)
+        latest_task = await self.update_store(
+            task_id, task_status, [Artifact(parts=self._content_parts(result.model_dump()))]
+        )
+        await self.send_task_notification(latest_task)
+        await self.enqueue_events_for_sse(
+            task_id, TaskStatusUpdateEvent(id=task_id, status=task_status, final=True)
+        )
+
+    async def _stream_plan(self, query: str) -> AsyncIterable[Dict[str, Any]]:
+        yield await asyncio.to_thread(self.agent.plan, query)
+
+    @staticmethod
+    def _content_parts(content: Any) -> List[Dict[str, Any]]:
+        if isinstance(content, dict):
+            return [{"type": "data", "data": content}]
+        return [{"type": "text", "text": content}]
+
     def _get_user_query(self, task_send_params: TaskSendParams) -> str:
         part = task_send_params.message.parts[0]
         if not isinstance(part, TextPart):
@@ -220,22 +340,6 @@ class AgentTaskManager(InMemoryTaskManager):
             data=task.model_dump(exclude_none=True)
         )
 
-    async def on_resubscribe_to_task(
-        self, request
-    ) -> AsyncIterable[SendTaskStreamingResponse] | JSONRPCResponse:
-        task_id_params: TaskIdParams = request.params
-        try:
-            sse_event_queue = await self.setup_sse_consumer(task_id_params.id, True)
-            return self.dequeue_events_for_sse(request.id, task_id_params.id, sse_event_queue)
-        except Exception as e:
-            logger.error(f"Error while reconnecting to SSE stream: {e}")
-            return JSONRPCResponse(
-                id=request.id,
-                error=InternalError(
-                    message=f"An error occurred while reconnecting to stream: {e}"
-                ),
-            )
-    
     async def set_push_notification_info(self, task_id: str, push_notification_config: PushNotificationConfig):
         # Verify the ownership of notification URL by issuing a challenge request.
         is_verified = await self.notification_sender_auth.verify_push_notification_url(push_notification_config.url)
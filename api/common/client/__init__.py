@@ -1,4 +1,17 @@
 from .client import A2AClient
-from .card_resolver import A2ACardResolver
+from .loopback import LoopbackA2AClient
+from .card_resolver import (
+    A2ACardResolver,
+    AgentCardCache,
+    resolve_agent_cards,
+    refresh_agent_cards,
+)
 
-__all__ = ["A2AClient", "A2ACardResolver"]
+__all__ = [
+    "A2AClient",
+    "LoopbackA2AClient",
+    "A2ACardResolver",
+    "AgentCardCache",
+    "resolve_agent_cards",
+    "refresh_agent_cards",
+]
@@ -3,19 +3,169 @@ from common.types import (
     AgentCard,
     A2AClientJSONError,
 )
+from typing import Callable, Iterable
+import asyncio
 import json
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CachedAgentCard:
+    def __init__(self, card: AgentCard, etag: str | None, expires_at: float):
+        self.card = card
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class AgentCardCache:
+    """Agent cards by URL, kept for as long as the server's Cache-Control allows.
+
+    Expired entries are kept too, so that they can be revalidated with their ETag.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, CachedAgentCard] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> CachedAgentCard | None:
+        with self._lock:
+            return self._entries.get(url)
+
+    def put(self, url: str, entry: CachedAgentCard):
+        with self._lock:
+            self._entries[url] = entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by all resolvers that are not given their own cache.
+default_agent_card_cache = AgentCardCache()
+
+
+def _parse_max_age(cache_control: str | None) -> float:
+    if not cache_control or "no-cache" in cache_control or "no-store" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return float(match.group(1)) if match else 0
 
 
 class A2ACardResolver:
-    def __init__(self, base_url, agent_card_path="/.well-known/agent.json"):
+    def __init__(
+        self,
+        base_url,
+        agent_card_path="/.well-known/agent.json",
+        cache: AgentCardCache | None = None,
+    ):
         self.base_url = base_url.rstrip("/")
         self.agent_card_path = agent_card_path.lstrip("/")
+        self.cache = cache or default_agent_card_cache
+
+    @property
+    def card_url(self) -> str:
+        return self.base_url + "/" + self.agent_card_path
+
+    def _fresh_card(self) -> AgentCard | None:
+        entry = self.cache.get(self.card_url)
+        if entry is not None and entry.expires_at > time.monotonic():
+            return entry.card
+        return None
+
+    def _request_headers(self) -> dict[str, str]:
+        entry = self.cache.get(self.card_url)
+        if entry is not None and entry.etag:
+            return {"If-None-Match": entry.etag}
+        return {}
+
+    def _handle_response(self, response: httpx.Response) -> AgentCard:
+        expires_at = time.monotonic() + _parse_max_age(response.headers.get("cache-control"))
+        if response.status_code == 304:
+            entry = self.cache.get(self.card_url)
+            if entry is not None:
+                entry.expires_at = expires_at
+                return entry.card
+
+        response.raise_for_status()
+        try:
+            card = AgentCard(**response.json())
+        except json.JSONDecodeError as e:
+            raise A2AClientJSONError(str(e)) from e
+
+        self.cache.put(
+            self.card_url,
+            CachedAgentCard(card, response.headers.get("etag"), expires_at),
+        )
+        return card
 
     def get_agent_card(self) -> AgentCard:
+        card = self._fresh_card()
+        if card is not None:
+            return card
+
         with httpx.Client() as client:
-            response = client.get(self.base_url + "/" + self.agent_card_path)
-            response.raise_for_status()
-            try:
-                return AgentCard(**response.json())
-            except json.JSONDecodeError as e:
-                raise A2AClientJSONError(str(e)) from e
+            response = client.get(self.card_url, headers=self._request_headers())
+            return self._handle_response(response)
+
+    async def get_agent_card_async(
+        self, httpx_client: httpx.AsyncClient | None = None
+    ) -> AgentCard:
+        card = self._fresh_card()
+        if card is not None:
+            return card
+
+        if httpx_client is None:
+            async with httpx.AsyncClient() as client:
+                response = await client.get(self.card_url, headers=self._request_headers())
+        else:
+            response = await httpx_client.get(self.card_url, headers=self._request_headers())
+        return self._handle_response(response)
+
+
+async def resolve_agent_cards(
+    base_urls: Iterable[str], cache: AgentCardCache | None = None
+) -> list[AgentCard]:
+    """Resolves the cards of several agents concurrently over one connection pool."""
+    async with httpx.AsyncClient() as client:
+        return await asyncio.gather(
+            *(
+                A2ACardResolver(url, cache=cache).get_agent_card_async(client)
+                for url in base_urls
+            )
+        )
+
+
+async def refresh_agent_cards(
+    base_urls: Iterable[str],
+    on_update: Callable[[AgentCard], None],
+    interval: float = 60,
+    cache: AgentCardCache | None = None,
+):
+    """Re-resolves the agent cards every `interval` seconds until cancelled and
+    calls `on_update` with each card that changed.
+
+    Cards that are still fresh, or that the server confirms with a 304, cost
+    no download.
+    """
+    base_urls = list(base_urls)
+    async with httpx.AsyncClient() as client:
+        while True:
+            await asyncio.sleep(interval)
+            resolvers = [A2ACardResolver(url, cache=cache) for url in base_urls]
+            previous = [
+                entry.card if (entry := resolver.cache.get(resolver.card_url)) else None
+                for resolver in resolvers
+            ]
+            results = await asyncio.gather(
+                *(resolver.get_agent_card_async(client) for resolver in resolvers),
+                return_exceptions=True,
+            )
+            for url, old_card, result in zip(base_urls, previous, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Failed to refresh agent card of {url}: {result}")
+                elif result is not old_card:
+                    on_update(result)
@@ -1,5 +1,6 @@
 import httpx
-from httpx_sse import connect_sse
+from httpx_sse import aconnect_sse
+from pydantic import ValidationError
 from typing import Any, AsyncIterable
 from common.types import (
     AgentCard,
@@ -18,12 +19,34 @@ from common.types import (
     A2AClientJSONError,
     SendTaskStreamingRequest,
     SendTaskStreamingResponse,
+    TaskResubscriptionRequest,
+    TaskSendParams,
 )
+import importlib.util
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class A2AClient:
-    def __init__(self, agent_card: AgentCard = None, url: str = None):
+    """JSON-RPC client for an A2A server.
+
+    Requests go through one pooled `httpx.AsyncClient`, created on first use, so
+    connections are kept alive between calls. Close it with `aclose()` or use the
+    client as `async with A2AClient(...) as client:`. Pass `httpx_client` to share
+    a pool between several clients; a client passed in is not closed by `aclose()`.
+    """
+
+    def __init__(
+        self,
+        agent_card: AgentCard = None,
+        url: str = None,
+        timeout: httpx.Timeout | float | None = 30.0,
+        limits: httpx.Limits | None = None,
+        http2: bool = False,
+        httpx_client: httpx.AsyncClient | None = None,
+    ):
         if agent_card:
             self.url = agent_card.url
         elif url:
@@ -31,44 +54,138 @@ class A2AClient:
         else:
             raise ValueError("Must provide either agent_card or url")
 
-    async def send_task(self, payload: dict[str, Any]) -> SendTaskResponse:
+        self.timeout = timeout
+        self.limits = limits or httpx.Limits(
+            max_connections=100, max_keepalive_connections=20
+        )
+        # HTTP/2 requires the `h2` package (pip install httpx[http2]).
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 needs the h2 package (pip install httpx[http2]), using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self._httpx_client = httpx_client
+        self._owns_httpx_client = httpx_client is None
+
+    @property
+    def httpx_client(self) -> httpx.AsyncClient:
+        if self._httpx_client is None:
+            self._httpx_client = httpx.AsyncClient(
+                timeout=self.timeout, limits=self.limits, http2=self.http2
+            )
+        return self._httpx_client
+
+    async def aclose(self):
+        if self._httpx_client is not None and self._owns_httpx_client:
+            await self._httpx_client.aclose()
+            self._httpx_client = None
+
+    async def __aenter__(self) -> "A2AClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def send_task(self, payload: dict[str, Any] | TaskSendParams) -> SendTaskResponse:
+        # A TaskSendParams is used as is, without validating it again
         request = SendTaskRequest(params=payload)
         return SendTaskResponse(**await self._send_request(request))
 
     async def send_task_streaming(
-        self, payload: dict[str, Any]
+        self, payload: dict[str, Any] | TaskSendParams
     ) -> AsyncIterable[SendTaskStreamingResponse]:
         request = SendTaskStreamingRequest(params=payload)
-        with httpx.Client(timeout=None) as client:
-            with connect_sse(
-                client, "POST", self.url, json=request.model_dump()
+        async for response in self._send_streaming_request(request):
+            yield response
+
+    async def resubscribe_task(
+        self, payload: dict[str, Any], last_event_id: int | None = None
+    ) -> AsyncIterable[SendTaskStreamingResponse]:
+        """Reconnects to the event stream of a task.
+
+        If `last_event_id` is given, only events published after it are replayed.
+        """
+        request = TaskResubscriptionRequest(params=payload)
+        headers = {}
+        if last_event_id is not None:
+            headers["Last-Event-ID"] = str(last_event_id)
+        async for response in self._send_streaming_request(request, headers):
+            yield response
+
+    async def _send_streaming_request(
+        self, request: JSONRPCRequest, headers: dict[str, str] | None = None
+    ) -> AsyncIterable[SendTaskStreamingResponse]:
+        # Streams stay open for as long as the task runs, so only connecting is
+        # bounded by the client timeout.
+        connect_timeout = (
+            self.timeout.connect if isinstance(self.timeout, httpx.Timeout) else self.timeout
+        )
+        try:
+            async with aconnect_sse(
+                self.httpx_client,
+                "POST",
+                self.url,
+                json=request.model_dump(),
+                headers=headers or {},
+                timeout=httpx.Timeout(connect_timeout, read=None),
             ) as event_source:
-                try:
-                    for sse in event_source.iter_sse():
-                        yield SendTaskStreamingResponse(**json.loads(sse.data))
-                except json.JSONDecodeError as e:
-                    raise A2AClientJSONError(str(e)) from e
-                except httpx.RequestError as e:
-                    raise A2AClientHTTPError(400, str(e)) from e
+                content_type = event_source.response.headers.get("content-type", "")
+                if content_type.startswith("application/json"):
+                    # The request was rejected before a stream was opened.
+                    yield SendTaskStreamingResponse.model_validate_json(
+                        await event_source.response.aread()
+                    )
+                    return
+
+                async for sse in event_source.aiter_sse():
+                    response = SendTaskStreamingResponse.model_validate_json(sse.data)
+                    if sse.id and sse.id.isdigit():
+                        response._event_id = int(sse.id)
+                    yield response
+        except ValidationError as e:
+            raise A2AClientJSONError(str(e)) from e
+        except httpx.RequestError as e:
+            raise A2AClientHTTPError(400, str(e)) from e
 
     async def _send_request(self, request: JSONRPCRequest) -> dict[str, Any]:
-        async with httpx.AsyncClient() as client:
-            try:
-                # Image generation could take time, adding timeout
-                response = await client.post(
-                    self.url, json=request.model_dump(), timeout=30
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                raise A2AClientHTTPError(e.response.status_code, str(e)) from e
-            except json.JSONDecodeError as e:
-                raise A2AClientJSONError(str(e)) from e
+        try:
+            response = await self.httpx_client.post(self.url, json=request.model_dump())
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            raise A2AClientHTTPError(e.response.status_code, str(e)) from e
+        except json.JSONDecodeError as e:
+            raise A2AClientJSONError(str(e)) from e
+
+    async def send_batch(self, requests: list[JSONRPCRequest]) -> list[dict[str, Any]]:
+        """Sends several JSON-RPC requests in one HTTP round trip.
+
+        Returns the raw responses in the order of `requests`.
+        """
+        try:
+            response = await self.httpx_client.post(
+                self.url, json=[request.model_dump() for request in requests]
+            )
+            response.raise_for_status()
+            responses = {item.get("id"): item for item in response.json()}
+        except httpx.HTTPStatusError as e:
+            raise A2AClientHTTPError(e.response.status_code, str(e)) from e
+        except json.JSONDecodeError as e:
+            raise A2AClientJSONError(str(e)) from e
+
+        try:
+            return [responses[request.id] for request in requests]
+        except KeyError as e:
+            raise A2AClientJSONError(f"Missing response for request {e}") from e
 
     async def get_task(self, payload: dict[str, Any]) -> GetTaskResponse:
         request = GetTaskRequest(params=payload)
         return GetTaskResponse(**await self._send_request(request))
 
+    async def get_tasks(self, payloads: list[dict[str, Any]]) -> list[GetTaskResponse]:
+        """Fetches several tasks with a single batch request."""
+        requests = [GetTaskRequest(params=payload) for payload in payloads]
+        return [GetTaskResponse(**item) for item in await self.send_batch(requests)]
+
     async def cancel_task(self, payload: dict[str, Any]) -> CancelTaskResponse:
         request = CancelTaskRequest(params=payload)
         return CancelTaskResponse(**await self._send_request(request))
@@ -0,0 +1,120 @@
+import asyncio
+from typing import Any, AsyncIterable
+from common.client.client import A2AClient
+from common.server.task_manager import TaskManager
+from common.types import (
+    AgentCard,
+    GetTaskRequest,
+    SendTaskRequest,
+    SendTaskResponse,
+    JSONRPCRequest,
+    JSONRPCResponse,
+    GetTaskResponse,
+    CancelTaskResponse,
+    CancelTaskRequest,
+    SetTaskPushNotificationRequest,
+    SetTaskPushNotificationResponse,
+    GetTaskPushNotificationRequest,
+    GetTaskPushNotificationResponse,
+    SendTaskStreamingRequest,
+    SendTaskStreamingResponse,
+    TaskResubscriptionRequest,
+    TaskSendParams,
+    UnsupportedOperationError,
+)
+
+
+class LoopbackA2AClient(A2AClient):
+    """A2A client that calls a task manager in the same process.
+
+    Requests are handed to the task manager as models and its responses are
+    returned as they are, so nothing is serialized and no connection is made.
+    Requests skip what the server does around the task manager, such as
+    admission control.
+    """
+
+    URL = "loopback://"
+
+    def __init__(self, task_manager: TaskManager, agent_card: AgentCard = None):
+        super().__init__(agent_card=agent_card, url=self.URL)
+        self.task_manager = task_manager
+
+    async def aclose(self):
+        pass
+
+    async def send_task(self, payload: dict[str, Any] | TaskSendParams) -> SendTaskResponse:
+        return await self.task_manager.on_send_task(SendTaskRequest(params=payload))
+
+    async def send_task_streaming(
+        self, payload: dict[str, Any] | TaskSendParams
+    ) -> AsyncIterable[SendTaskStreamingResponse]:
+        request = SendTaskStreamingRequest(params=payload)
+        result = await self.task_manager.on_send_task_subscribe(request)
+        async for response in self._stream_result(result):
+            yield response
+
+    async def resubscribe_task(
+        self, payload: dict[str, Any], last_event_id: int | None = None
+    ) -> AsyncIterable[SendTaskStreamingResponse]:
+        request = TaskResubscriptionRequest(params=payload)
+        if last_event_id is not None:
+            request.params.lastEventId = last_event_id
+        result = await self.task_manager.on_resubscribe_to_task(request)
+        async for response in self._stream_result(result):
+            yield response
+
+    @staticmethod
+    async def _stream_result(
+        result: AsyncIterable[SendTaskStreamingResponse] | JSONRPCResponse,
+    ) -> AsyncIterable[SendTaskStreamingResponse]:
+        if isinstance(result, JSONRPCResponse):
+            # The request was rejected before a stream was opened.
+            yield SendTaskStreamingResponse(id=result.id, error=result.error)
+            return
+        async for response in result:
+            yield response
+
+    async def _dispatch(self, request: JSONRPCRequest) -> JSONRPCResponse:
+        if isinstance(request, GetTaskRequest):
+            return await self.task_manager.on_get_task(request)
+        if isinstance(request, SendTaskRequest):
+            return await self.task_manager.on_send_task(request)
+        if isinstance(request, CancelTaskRequest):
+            return await self.task_manager.on_cancel_task(request)
+        if isinstance(request, SetTaskPushNotificationRequest):
+            return await self.task_manager.on_set_task_push_notification(request)
+        if isinstance(request, GetTaskPushNotificationRequest):
+            return await self.task_manager.on_get_task_push_notification(request)
+        return JSONRPCResponse(
+            id=request.id,
+            error=UnsupportedOperationError(message=f"{request.method} cannot be sent in a batch"),
+        )
+
+    async def send_batch(self, requests: list[JSONRPCRequest]) -> list[dict[str, Any]]:
+        """Dispatches the requests concurrently.
+
+        Returns the responses as dicts, like `A2AClient.send_batch`.
+        """
+        responses = await asyncio.gather(*(self._dispatch(request) for request in requests))
+        return [response.model_dump(exclude_none=True) for response in responses]
+
+    async def get_task(self, payload: dict[str, Any]) -> GetTaskResponse:
+        return await self.task_manager.on_get_task(GetTaskRequest(params=payload))
+
+    async def get_tasks(self, payloads: list[dict[str, Any]]) -> list[GetTaskResponse]:
+        return await asyncio.gather(*(self.get_task(payload) for payload in payloads))
+
+    async def cancel_task(self, payload: dict[str, Any]) -> CancelTaskResponse:
+        return await self.task_manager.on_cancel_task(CancelTaskRequest(params=payload))
+
+    async def set_task_callback(
+        self, payload: dict[str, Any]
+    ) -> SetTaskPushNotificationResponse:
+        request = SetTaskPushNotificationRequest(params=payload)
+        return await self.task_manager.on_set_task_push_notification(request)
+
+    async def get_task_callback(
+        self, payload: dict[str, Any]
+    ) -> GetTaskPushNotificationResponse:
+        request = GetTaskPushNotificationRequest(params=payload)
+        return await self.task_manager.on_get_task_push_notification(request)
@@ -1,4 +1,16 @@
 from .server import A2AServer
 from .task_manager import TaskManager, InMemoryTaskManager
+from .task_store import TaskStore, InMemoryTaskStore, SQLTaskStore, create_task_store
+from .admission import AdmissionController, AdmissionRejectedError
 
-__all__ = ["A2AServer", "TaskManager", "InMemoryTaskManager"]
+__all__ = [
+    "A2AServer",
+    "TaskManager",
+    "InMemoryTaskManager",
+    "TaskStore",
+    "InMemoryTaskStore",
+    "SQLTaskStore",
+    "create_task_store",
+    "AdmissionController",
+    "AdmissionRejectedError",
+]
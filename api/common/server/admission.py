@@ -0,0 +1,212 @@
+from common.types import JSONRPCError, RateLimitExceededError, ServerBusyError
+from typing import Awaitable, Callable
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to
+    `capacity`."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class AdmissionRejectedError(Exception):
+    def __init__(self, error: JSONRPCError):
+        self.error = error
+        super().__init__(error.message)
+
+
+class AdmissionController:
+    """Limits how much task work a server accepts at once.
+
+    A request must pass the global and per-session token buckets and then get
+    one of `max_concurrency` slots, of which at most `max_concurrency_per_session`
+    may be held by one session. Requests that cannot get a slot wait in a queue
+    of at most `max_queue_size` entries for up to `queue_timeout` seconds.
+    Everything that does not fit is rejected immediately with a JSON-RPC error.
+    """
+
+    # Per-session token buckets are dropped once there are more sessions than
+    # this and their buckets have refilled completely.
+    MAX_TRACKED_SESSIONS = 10000
+
+    def __init__(
+        self,
+        max_concurrency: int | None = None,
+        max_concurrency_per_session: int | None = None,
+        rate_limit: float | None = None,
+        rate_limit_burst: float | None = None,
+        rate_limit_per_session: float | None = None,
+        rate_limit_per_session_burst: float | None = None,
+        max_queue_size: int = 0,
+        queue_timeout: float | None = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_session = max_concurrency_per_session
+        self.rate_limiter = TokenBucket(rate_limit, rate_limit_burst) if rate_limit else None
+        self.rate_limit_per_session = rate_limit_per_session
+        self.rate_limit_per_session_burst = rate_limit_per_session_burst
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout
+
+        self.session_rate_limiters: dict[str, TokenBucket] = {}
+        self.in_flight = 0
+        self.session_in_flight: dict[str, int] = {}
+        self.queue_depth = 0
+        self.condition = asyncio.Condition()
+
+        self.admitted = 0
+        self.rejected_rate_limited = 0
+        self.rejected_queue_full = 0
+        self.rejected_queue_timeout = 0
+        self.max_queue_depth_seen = 0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController | None":
+        """Builds a controller from `A2A_*` environment variables, or returns None
+        if no limit is configured."""
+
+        def read(name: str, cast: Callable):
+            value = os.getenv(name)
+            return cast(value) if value else None
+
+        options = dict(
+            max_concurrency=read("A2A_MAX_CONCURRENT_TASKS", int),
+            max_concurrency_per_session=read("A2A_MAX_CONCURRENT_TASKS_PER_SESSION", int),
+            rate_limit=read("A2A_RATE_LIMIT", float),
+            rate_limit_burst=read("A2A_RATE_LIMIT_BURST", float),
+            rate_limit_per_session=read("A2A_RATE_LIMIT_PER_SESSION", float),
+            rate_limit_per_session_burst=read("A2A_RATE_LIMIT_PER_SESSION_BURST", float),
+            queue_timeout=read("A2A_QUEUE_TIMEOUT", float),
+        )
+        if all(value is None for value in options.values()):
+            return None
+        return cls(max_queue_size=read("A2A_MAX_QUEUE_SIZE", int) or 0, **options)
+
+    def _check_rate_limits(self, session_id: str):
+        if self.rate_limiter and not self.rate_limiter.try_acquire():
+            self.rejected_rate_limited += 1
+            raise AdmissionRejectedError(RateLimitExceededError())
+
+        if self.rate_limit_per_session:
+            bucket = self.session_rate_limiters.get(session_id)
+            if bucket is None:
+                if len(self.session_rate_limiters) >= self.MAX_TRACKED_SESSIONS:
+                    self._prune_session_rate_limiters()
+                bucket = TokenBucket(
+                    self.rate_limit_per_session, self.rate_limit_per_session_burst
+                )
+                self.session_rate_limiters[session_id] = bucket
+            if not bucket.try_acquire():
+                self.rejected_rate_limited += 1
+                raise AdmissionRejectedError(
+                    RateLimitExceededError(message="Rate limit exceeded for session")
+                )
+
+    def _prune_session_rate_limiters(self):
+        self.session_rate_limiters = {
+            session_id: bucket
+            for session_id, bucket in self.session_rate_limiters.items()
+            if not bucket.is_full()
+        }
+
+    def _has_slot(self, session_id: str) -> bool:
+        if self.max_concurrency is not None and self.in_flight >= self.max_concurrency:
+            return False
+        if (
+            self.max_concurrency_per_session is not None
+            and self.session_in_flight.get(session_id, 0) >= self.max_concurrency_per_session
+        ):
+            return False
+        return True
+
+    async def acquire(self, session_id: str) -> Callable[[], Awaitable[None]]:
+        """Admits a request of `session_id` or raises `AdmissionRejectedError`.
+
+        Returns a coroutine function to await when the admitted work has ended.
+        """
+        async with self.condition:
+            self._check_rate_limits(session_id)
+
+            if not self._has_slot(session_id):
+                if self.queue_depth >= self.max_queue_size:
+                    self.rejected_queue_full += 1
+                    logger.warning(f"Rejecting task of session {session_id}: queue is full")
+                    raise AdmissionRejectedError(ServerBusyError(data={"queue_depth": self.queue_depth}))
+
+                self.queue_depth += 1
+                self.max_queue_depth_seen = max(self.max_queue_depth_seen, self.queue_depth)
+                try:
+                    await asyncio.wait_for(
+                        self.condition.wait_for(lambda: self._has_slot(session_id)),
+                        self.queue_timeout,
+                    )
+                except asyncio.TimeoutError:
+                    self.rejected_queue_timeout += 1
+                    logger.warning(f"Rejecting task of session {session_id}: timed out in queue")
+                    raise AdmissionRejectedError(
+                        ServerBusyError(message="Timed out waiting for a free slot")
+                    )
+                finally:
+                    self.queue_depth -= 1
+
+            self.in_flight += 1
+            self.session_in_flight[session_id] = self.session_in_flight.get(session_id, 0) + 1
+            self.admitted += 1
+
+        released = False
+
+        async def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            async with self.condition:
+                self.in_flight -= 1
+                remaining = self.session_in_flight[session_id] - 1
+                if remaining > 0:
+                    self.session_in_flight[session_id] = remaining
+                else:
+                    del self.session_in_flight[session_id]
+                self.condition.notify_all()
+
+        return release
+
+    def metrics(self) -> dict[str, int | float | None]:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth_seen": self.max_queue_depth_seen,
+            "active_sessions": len(self.session_in_flight),
+            "admitted": self.admitted,
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_queue_timeout": self.rejected_queue_timeout,
+            "max_concurrency": self.max_concurrency,
+            "max_queue_size": self.max_queue_size,
+        }
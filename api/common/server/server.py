@@ -1,6 +1,6 @@
 from starlette.applications import Starlette
-from starlette.responses import JSONResponse
-from sse_starlette.sse import EventSourceResponse
+from starlette.responses import FileResponse, JSONResponse, Response
+from sse_starlette.sse import EventSourceResponse, ServerSentEvent
 from starlette.requests import Request
 from common.types import (
     A2ARequest,
@@ -16,18 +16,64 @@ from common.types import (
     AgentCard,
     TaskResubscriptionRequest,
     SendTaskStreamingRequest,
+    UnsupportedOperationError,
 )
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
+from pydantic_core import from_json
+import asyncio
+import contextlib
+import hashlib
+import inspect
 import json
-from typing import AsyncIterable, Any
+from typing import AsyncIterable, Any, Awaitable, Callable
 from common.server.task_manager import TaskManager
+from common.server.admission import AdmissionController, AdmissionRejectedError
+from common.utils.blob_store import BlobStore
+import os
 
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class _AdmittedStream:
+    """A task's event stream that holds an admission slot until `release` is
+    awaited. Iterating it to the end or closing it releases the slot."""
+
+    def __init__(self, stream: AsyncIterable, release: Callable[[], Awaitable[None]]):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self):
+        try:
+            async for item in self.stream:
+                yield item
+        finally:
+            await self.release()
+
+
+class _ReleasingEventSourceResponse(EventSourceResponse):
+    """Releases an admission slot once the response is over, also if the
+    client left before its stream was started."""
+
+    def __init__(self, content, release: Callable[[], Awaitable[None]]):
+        super().__init__(content)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.release()
+
+
 class A2AServer:
+    FILES_PATH = "/files/"
+    LIVE_PATH = "/health/live"
+    READY_PATH = "/health/ready"
+    # Seconds a readiness check may take before it counts as failed
+    READINESS_CHECK_TIMEOUT = 5.0
+
     def __init__(
         self,
         host="0.0.0.0",
@@ -35,86 +81,367 @@ class A2AServer:
         endpoint="/",
         agent_card: AgentCard = None,
         task_manager: TaskManager = None,
+        admission_controller: AdmissionController = None,
+        max_batch_size: int = 100,
+        agent_card_max_age: int = 300,
+        blob_store: BlobStore = None,
+        readiness_checks: dict[str, Callable[[], Any]] | None = None,
     ):
         self.host = host
         self.port = port
         self.endpoint = endpoint
         self.task_manager = task_manager
         self.agent_card = agent_card
-        self.app = Starlette()
+        self.admission_controller = admission_controller
+        self.max_batch_size = max_batch_size
+        self.agent_card_max_age = agent_card_max_age
+        self.blob_store = blob_store
+        self.readiness_checks = dict(readiness_checks or {})
+        self.app = Starlette(lifespan=self._lifespan)
         self.app.add_route(self.endpoint, self._process_request, methods=["POST"])
         self.app.add_route(
             "/.well-known/agent.json", self._get_agent_card, methods=["GET"]
         )
+        self.app.add_route(self.LIVE_PATH, self._get_liveness, methods=["GET"])
+        self.app.add_route(self.READY_PATH, self._get_readiness, methods=["GET"])
+        if self.admission_controller is not None:
+            self.app.add_route("/metrics", self._get_metrics, methods=["GET"])
+        if self.blob_store is not None:
+            self.app.add_route(
+                self.FILES_PATH + "{blob_id:path}", self._get_file, methods=["GET", "HEAD"]
+            )
+
+    def add_readiness_check(self, name: str, check: Callable[[], Any]):
+        """Registers a check that must pass before the server reports ready.
+
+        A check is a function or coroutine function without arguments. It
+        passes if it returns a truthy value; it fails if it returns a falsy
+        value, raises, or takes longer than `READINESS_CHECK_TIMEOUT` seconds.
+        Plain functions run in a thread, so they may block.
+        """
+        self.readiness_checks[name] = check
+
+    @contextlib.asynccontextmanager
+    async def _lifespan(self, app: Starlette):
+        # Each worker cleans up the blob store, deleting a file twice is harmless
+        cleanup_task = None
+        if self.blob_store is not None and self.blob_store.has_limits:
+            cleanup_task = asyncio.create_task(self.blob_store.run_cleanup())
+        try:
+            yield
+        finally:
+            if cleanup_task is not None:
+                cleanup_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await cleanup_task
+
+    def start(
+        self,
+        workers: int = 1,
+        app_factory: str | None = None,
+        timeout_keep_alive: int = 5,
+        backlog: int = 2048,
+        limit_concurrency: int | None = None,
+        loop: str = "auto",
+        http: str = "auto",
+    ):
+        """Serves the app with uvicorn.
 
-    def start(self):
+        With `workers > 1`, uvicorn spawns that many processes which each build
+        their own app through `app_factory`, an import string such as
+        "excel_agent.__main__:create_app". Workers only share task state if the
+        factory gives them a shared `TaskStore`; SSE streams stay on the worker
+        that accepted them.
+        """
         if self.agent_card is None:
             raise ValueError("agent_card is not defined")
 
         if self.task_manager is None:
             raise ValueError("request_handler is not defined")
 
+        options = dict(
+            timeout_keep_alive=timeout_keep_alive,
+            backlog=backlog,
+            limit_concurrency=limit_concurrency,
+            loop=loop,
+            http=http,
+        )
+
+        if workers > 1:
+            if app_factory is None:
+                raise ValueError("app_factory is required to run multiple workers")
+            self.start_workers(app_factory, workers, self.host, self.port, **options)
+        else:
+            import uvicorn
+
+            uvicorn.run(self.app, host=self.host, port=self.port, **options)
+
+    @staticmethod
+    def start_workers(
+        app_factory: str,
+        workers: int,
+        host: str = "0.0.0.0",
+        port: int = 5000,
+        timeout_keep_alive: int = 5,
+        backlog: int = 2048,
+        limit_concurrency: int | None = None,
+        loop: str = "auto",
+        http: str = "auto",
+    ):
+        """Serves the app built by `app_factory` in `workers` uvicorn processes.
+
+        Only the workers build a server, so the main process does not need one
+        of its own; the options are those of `start`.
+        """
         import uvicorn
 
-        uvicorn.run(self.app, host=self.host, port=self.port)
+        uvicorn.run(
+            app_factory,
+            factory=True,
+            workers=workers,
+            host=host,
+            port=port,
+            timeout_keep_alive=timeout_keep_alive,
+            backlog=backlog,
+            limit_concurrency=limit_concurrency,
+            loop=loop,
+            http=http,
+        )
 
-    def _get_agent_card(self, request: Request) -> JSONResponse:
-        return JSONResponse(self.agent_card.model_dump(exclude_none=True))
+    def _get_agent_card(self, request: Request) -> Response:
+        content = self.agent_card.model_dump_json(exclude_none=True)
+        etag = '"' + hashlib.sha256(content.encode()).hexdigest()[:32] + '"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"max-age={self.agent_card_max_age}",
+        }
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content, media_type="application/json", headers=headers)
+
+    @staticmethod
+    def _json_response(model: BaseModel, status_code: int = 200) -> Response:
+        # Serialize straight to bytes with pydantic-core instead of going through
+        # a dict and the stdlib json encoder in JSONResponse.
+        return Response(
+            model.model_dump_json(exclude_none=True),
+            status_code=status_code,
+            media_type="application/json",
+        )
 
     async def _process_request(self, request: Request):
         try:
-            body = await request.json()
-            json_rpc_request = A2ARequest.validate_python(body)
+            body = await request.body()
+            if body.lstrip()[:1] == b"[":
+                return await self._process_batch(body)
 
-            if isinstance(json_rpc_request, GetTaskRequest):
-                result = await self.task_manager.on_get_task(json_rpc_request)
-            elif isinstance(json_rpc_request, SendTaskRequest):
-                result = await self.task_manager.on_send_task(json_rpc_request)
-            elif isinstance(json_rpc_request, SendTaskStreamingRequest):
-                result = await self.task_manager.on_send_task_subscribe(
-                    json_rpc_request
-                )
-            elif isinstance(json_rpc_request, CancelTaskRequest):
-                result = await self.task_manager.on_cancel_task(json_rpc_request)
-            elif isinstance(json_rpc_request, SetTaskPushNotificationRequest):
-                result = await self.task_manager.on_set_task_push_notification(json_rpc_request)
-            elif isinstance(json_rpc_request, GetTaskPushNotificationRequest):
-                result = await self.task_manager.on_get_task_push_notification(json_rpc_request)
-            elif isinstance(json_rpc_request, TaskResubscriptionRequest):
-                result = await self.task_manager.on_resubscribe_to_task(
-                    json_rpc_request
+            # Parse and validate the raw bytes in one pass.
+            json_rpc_request = A2ARequest.validate_json(body)
+
+            if (
+                isinstance(json_rpc_request, TaskResubscriptionRequest)
+                and json_rpc_request.params.lastEventId is None
+            ):
+                json_rpc_request.params.lastEventId = self._get_last_event_id(request)
+
+            result = await self._dispatch(json_rpc_request)
+            try:
+                return self._create_response(result)
+            except Exception:
+                if isinstance(result, _AdmittedStream):
+                    await result.release()
+                raise
+
+        except Exception as e:
+            return self._handle_exception(e)
+
+    async def _dispatch(self, json_rpc_request) -> Any:
+        if isinstance(json_rpc_request, GetTaskRequest):
+            result = await self.task_manager.on_get_task(json_rpc_request)
+        elif isinstance(json_rpc_request, (SendTaskRequest, SendTaskStreamingRequest)):
+            result = await self._send_task(json_rpc_request)
+        elif isinstance(json_rpc_request, CancelTaskRequest):
+            result = await self.task_manager.on_cancel_task(json_rpc_request)
+        elif isinstance(json_rpc_request, SetTaskPushNotificationRequest):
+            result = await self.task_manager.on_set_task_push_notification(json_rpc_request)
+        elif isinstance(json_rpc_request, GetTaskPushNotificationRequest):
+            result = await self.task_manager.on_get_task_push_notification(json_rpc_request)
+        elif isinstance(json_rpc_request, TaskResubscriptionRequest):
+            result = await self.task_manager.on_resubscribe_to_task(
+                json_rpc_request
+            )
+        else:
+            logger.warning(f"Unexpected request type: {type(json_rpc_request)}")
+            raise ValueError(f"Unexpected request type: {type(json_rpc_request)}")
+
+        return result
+
+    async def _process_batch(self, body: bytes) -> Response:
+        """Handles a JSON-RPC 2.0 batch: the requests are dispatched concurrently and
+        their responses are returned together as one array."""
+        try:
+            items = from_json(body)
+        except ValueError:
+            return self._json_response(
+                JSONRPCResponse(id=None, error=JSONParseError()), status_code=400
+            )
+
+        if not items or len(items) > self.max_batch_size:
+            error = InvalidRequestError(
+                message=f"Batch must contain between 1 and {self.max_batch_size} requests"
+            )
+            return self._json_response(JSONRPCResponse(id=None, error=error), status_code=400)
+
+        responses = await asyncio.gather(
+            *(self._process_batch_item(item) for item in items)
+        )
+        content = b"[" + b",".join(
+            response.model_dump_json(exclude_none=True).encode() for response in responses
+        ) + b"]"
+        return Response(content, media_type="application/json")
+
+    async def _process_batch_item(self, item: Any) -> JSONRPCResponse:
+        request_id = item.get("id") if isinstance(item, dict) else None
+        try:
+            json_rpc_request = A2ARequest.validate_python(item)
+        except ValidationError as e:
+            return JSONRPCResponse(
+                id=request_id, error=InvalidRequestError(data=json.loads(e.json()))
+            )
+
+        if isinstance(json_rpc_request, (SendTaskStreamingRequest, TaskResubscriptionRequest)):
+            return JSONRPCResponse(
+                id=json_rpc_request.id,
+                error=UnsupportedOperationError(
+                    message="Streaming methods cannot be part of a batch"
+                ),
+            )
+
+        try:
+            return await self._dispatch(json_rpc_request)
+        except Exception as e:
+            logger.error(f"Unhandled exception in batch request {json_rpc_request.id}: {e}")
+            return JSONRPCResponse(id=json_rpc_request.id, error=InternalError())
+
+    async def _send_task(
+        self, json_rpc_request: SendTaskRequest | SendTaskStreamingRequest
+    ) -> Any:
+        if self.admission_controller is None:
+            release = None
+        else:
+            try:
+                release = await self.admission_controller.acquire(
+                    json_rpc_request.params.sessionId
                 )
+            except AdmissionRejectedError as e:
+                return JSONRPCResponse(id=json_rpc_request.id, error=e.error)
+
+        try:
+            if isinstance(json_rpc_request, SendTaskRequest):
+                result = await self.task_manager.on_send_task(json_rpc_request)
             else:
-                logger.warning(f"Unexpected request type: {type(json_rpc_request)}")
-                raise ValueError(f"Unexpected request type: {type(request)}")
+                result = await self.task_manager.on_send_task_subscribe(json_rpc_request)
+        except Exception:
+            if release:
+                await release()
+            raise
 
-            return self._create_response(result)
+        if release is None:
+            return result
+        if isinstance(result, AsyncIterable):
+            # Streaming tasks hold their slot until the response is over.
+            return _AdmittedStream(result, release)
+        await release()
+        return result
+
+    def _get_file(self, request: Request) -> Response:
+        path = self.blob_store.resolve(request.path_params["blob_id"])
+        if path is None:
+            return Response(status_code=404)
+        # FileResponse streams the file in chunks, answers Range requests and
+        # hands the path to the server for sendfile where it supports it.
+        return FileResponse(
+            path,
+            media_type=self.blob_store.guess_mime_type(path),
+            filename=os.path.basename(path),
+        )
+
+    def _get_liveness(self, request: Request) -> JSONResponse:
+        return JSONResponse({"status": "alive"})
+
+    async def _get_readiness(self, request: Request) -> JSONResponse:
+        """Runs the readiness checks concurrently, answering 503 unless all pass."""
+        names = list(self.readiness_checks)
+        results = await asyncio.gather(
+            *(self._run_readiness_check(self.readiness_checks[name]) for name in names)
+        )
+        checks = dict(zip(names, results))
+        ready = all(check["ready"] for check in checks.values())
+        return JSONResponse(
+            {"status": "ready" if ready else "not_ready", "checks": checks},
+            status_code=200 if ready else 503,
+        )
 
+    async def _run_readiness_check(self, check: Callable[[], Any]) -> dict[str, Any]:
+        try:
+            if inspect.iscoroutinefunction(check):
+                result = await asyncio.wait_for(check(), self.READINESS_CHECK_TIMEOUT)
+            else:
+                result = await asyncio.wait_for(
+                    asyncio.to_thread(check), self.READINESS_CHECK_TIMEOUT
+                )
+        except asyncio.TimeoutError:
+            return {"ready": False, "error": "Timed out"}
         except Exception as e:
-            return self._handle_exception(e)
+            return {"ready": False, "error": str(e)}
+        return {"ready": bool(result)}
 
-    def _handle_exception(self, e: Exception) -> JSONResponse:
+    def _get_metrics(self, request: Request) -> JSONResponse:
+        return JSONResponse({"admission": self.admission_controller.metrics()})
+
+    @staticmethod
+    def _get_last_event_id(request: Request) -> int | None:
+        last_event_id = request.headers.get("last-event-id")
+        if last_event_id is None:
+            return None
+        try:
+            return int(last_event_id)
+        except ValueError:
+            logger.warning(f"Ignoring malformed Last-Event-ID header: {last_event_id}")
+            return None
+
+    def _handle_exception(self, e: Exception) -> Response:
         if isinstance(e, json.decoder.JSONDecodeError):
             json_rpc_error = JSONParseError()
         elif isinstance(e, ValidationError):
-            json_rpc_error = InvalidRequestError(data=json.loads(e.json()))
+            if any(error["type"] == "json_invalid" for error in e.errors()):
+                json_rpc_error = JSONParseError()
+            else:
+                json_rpc_error = InvalidRequestError(data=json.loads(e.json()))
         else:
             logger.error(f"Unhandled exception: {e}")
             json_rpc_error = InternalError()
 
         response = JSONRPCResponse(id=None, error=json_rpc_error)
-        return JSONResponse(response.model_dump(exclude_none=True), status_code=400)
+        return self._json_response(response, status_code=400)
 
-    def _create_response(self, result: Any) -> JSONResponse | EventSourceResponse:
+    def _create_response(self, result: Any) -> Response | EventSourceResponse:
         if isinstance(result, AsyncIterable):
 
-            async def event_generator(result) -> AsyncIterable[dict[str, str]]:
+            async def event_generator(result) -> AsyncIterable[ServerSentEvent]:
                 async for item in result:
-                    yield {"data": item.model_dump_json(exclude_none=True)}
+                    # Each event is encoded exactly once, directly to its JSON text.
+                    event_id = getattr(item, "_event_id", None)
+                    yield ServerSentEvent(
+                        data=item.model_dump_json(exclude_none=True),
+                        id=None if event_id is None else str(event_id),
+                    )
 
+            if isinstance(result, _AdmittedStream):
+                return _ReleasingEventSourceResponse(event_generator(result), result.release)
             return EventSourceResponse(event_generator(result))
         elif isinstance(result, JSONRPCResponse):
-            return JSONResponse(result.model_dump(exclude_none=True))
+            return self._json_response(result)
         else:
             logger.error(f"Unexpected result type: {type(result)}")
             raise ValueError(f"Unexpected result type: {type(result)}")
@@ -29,14 +29,24 @@ from common.types import (
     TaskStatusUpdateEvent,
     JSONRPCError,
     TaskPushNotificationConfig,
+    TaskResubscriptionParams,
     InternalError,
 )
-from common.server.utils import new_not_implemented_error
+from common.server.task_store import TaskStore, InMemoryTaskStore
+from collections import deque
 import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# States after which a task stream is closed.
+FINAL_STREAM_STATES = (
+    TaskState.COMPLETED,
+    TaskState.CANCELED,
+    TaskState.FAILED,
+    TaskState.INPUT_REQUIRED,
+)
+
 class TaskManager(ABC):
     @abstractmethod
     async def on_get_task(self, request: GetTaskRequest) -> GetTaskResponse:
@@ -76,19 +86,35 @@ class TaskManager(ABC):
 
 
 class InMemoryTaskManager(TaskManager):
-    def __init__(self):
-        self.tasks: dict[str, Task] = {}
-        self.push_notification_infos: dict[str, PushNotificationConfig] = {}
+    def __init__(
+        self,
+        task_store: TaskStore | None = None,
+        sse_history_size: int = 256,
+        sse_history_ttl: float = 300.0,
+    ):
+        # Task state lives in the store; SSE subscribers and event history below
+        # are always local to this process.
+        self.task_store = task_store or InMemoryTaskStore()
         self.lock = asyncio.Lock()
         self.task_sse_subscribers: dict[str, List[asyncio.Queue]] = {}
+        # Last `sse_history_size` (event_id, event) pairs per task, retained so that
+        # a client can resume a stream after reconnecting, until `sse_history_ttl`
+        # seconds after the task's final event.
+        self.task_sse_history: dict[str, deque] = {}
+        self.task_sse_last_event_id: dict[str, int] = {}
+        self.sse_history_size = sse_history_size
+        self.sse_history_ttl = sse_history_ttl
         self.subscriber_lock = asyncio.Lock()
+        # Notified whenever a subscriber is added or removed or takes an event
+        # off its queue, for producers waiting on slow consumers
+        self.sse_consumers_changed = asyncio.Condition(self.subscriber_lock)
 
     async def on_get_task(self, request: GetTaskRequest) -> GetTaskResponse:
         logger.info(f"Getting task {request.params.id}")
         task_query_params: TaskQueryParams = request.params
 
         async with self.lock:
-            task = self.tasks.get(task_query_params.id)
+            task = await self.task_store.get_task(task_query_params.id)
             if task is None:
                 return GetTaskResponse(id=request.id, error=TaskNotFoundError())
 
@@ -103,7 +129,7 @@ class InMemoryTaskManager(TaskManager):
         task_id_params: TaskIdParams = request.params
 
         async with self.lock:
-            task = self.tasks.get(task_id_params.id)
+            task = await self.task_store.get_task(task_id_params.id)
             if task is None:
                 return CancelTaskResponse(id=request.id, error=TaskNotFoundError())
 
@@ -121,27 +147,31 @@ class InMemoryTaskManager(TaskManager):
 
     async def set_push_notification_info(self, task_id: str, notification_config: PushNotificationConfig):
         async with self.lock:
-            task = self.tasks.get(task_id)
+            task = await self.task_store.get_task(task_id)
             if task is None:
                 raise ValueError(f"Task not found for {task_id}")
 
-            self.push_notification_infos[task_id] = notification_config
+            await self.task_store.save_push_notification_config(task_id, notification_config)
 
         return
     
     async def get_push_notification_info(self, task_id: str) -> PushNotificationConfig:
         async with self.lock:
-            task = self.tasks.get(task_id)
+            task = await self.task_store.get_task(task_id)
             if task is None:
                 raise ValueError(f"Task not found for {task_id}")
 
-            return self.push_notification_infos[task_id]
+            notification_config = await self.task_store.get_push_notification_config(task_id)
+            if notification_config is None:
+                raise ValueError(f"Push notification info not found for {task_id}")
+
+            return notification_config
             
         return
     
     async def has_push_notification_info(self, task_id: str) -> bool:
         async with self.lock:
-            return task_id in self.push_notification_infos
+            return await self.task_store.get_push_notification_config(task_id) is not None
             
 
     async def on_set_task_push_notification(
@@ -184,34 +214,57 @@ class InMemoryTaskManager(TaskManager):
 
     async def upsert_task(self, task_send_params: TaskSendParams) -> Task:
         logger.info(f"Upserting task {task_send_params.id}")
-        async with self.lock:
-            task = self.tasks.get(task_send_params.id)
+
+        def upsert(task: Task | None) -> Task:
             if task is None:
-                task = Task(
+                return Task(
                     id=task_send_params.id,
                     sessionId = task_send_params.sessionId,
                     messages=[task_send_params.message],
                     status=TaskStatus(state=TaskState.SUBMITTED),
                     history=[task_send_params.message],
                 )
-                self.tasks[task_send_params.id] = task
-            else:
-                task.history.append(task_send_params.message)
-
+            task.history.append(task_send_params.message)
             return task
 
+        async with self.lock:
+            return await self.task_store.update_task(task_send_params.id, upsert)
+
     async def on_resubscribe_to_task(
         self, request: TaskResubscriptionRequest
     ) -> Union[AsyncIterable[SendTaskStreamingResponse], JSONRPCResponse]:
-        return new_not_implemented_error(request.id)
+        task_params: TaskResubscriptionParams = request.params
+        logger.info(
+            f"Resubscribing to task {task_params.id} after event {task_params.lastEventId}"
+        )
+
+        async with self.lock:
+            task = await self.task_store.get_task(task_params.id)
+            if task is None:
+                return JSONRPCResponse(id=request.id, error=TaskNotFoundError())
+            current_status = task.status.model_copy()
+
+        try:
+            sse_event_queue = await self.setup_resumed_sse_consumer(
+                task_params.id, task_params.lastEventId, current_status
+            )
+        except Exception as e:
+            logger.error(f"Error while reconnecting to SSE stream: {e}")
+            return JSONRPCResponse(
+                id=request.id,
+                error=InternalError(
+                    message=f"An error occurred while reconnecting to stream: {e}"
+                ),
+            )
+
+        return self.dequeue_events_for_sse(request.id, task_params.id, sse_event_queue)
 
     async def update_store(
         self, task_id: str, status: TaskStatus, artifacts: list[Artifact]
     ) -> Task:
-        async with self.lock:
-            try:
-                task = self.tasks[task_id]
-            except KeyError:
+
+        def update(task: Task | None) -> Task:
+            if task is None:
                 logger.error(f"Task {task_id} not found for updating the task")
                 raise ValueError(f"Task {task_id} not found")
 
@@ -224,9 +277,11 @@ class InMemoryTaskManager(TaskManager):
                 if task.artifacts is None:
                     task.artifacts = []
                 task.artifacts.extend(artifacts)
-
             return task
 
+        async with self.lock:
+            return await self.task_store.update_task(task_id, update)
+
     def append_task_history(self, task: Task, historyLength: int | None):
         new_task = task.model_copy()
         if historyLength is not None and historyLength > 0:
@@ -246,32 +301,145 @@ class InMemoryTaskManager(TaskManager):
 
             sse_event_queue = asyncio.Queue(maxsize=0) # <=0 is unlimited
             self.task_sse_subscribers[task_id].append(sse_event_queue)
+            self.sse_consumers_changed.notify_all()
             return sse_event_queue
 
-    async def enqueue_events_for_sse(self, task_id, task_update_event):
+    async def setup_resumed_sse_consumer(
+        self, task_id: str, last_event_id: int | None, current_status: TaskStatus
+    ) -> asyncio.Queue:
+        """Creates a consumer queue pre-filled with the events after `last_event_id`.
+
+        Replay and registration happen under the subscriber lock so that no event
+        published in between is lost or delivered twice. Raises ValueError if some
+        of the events after `last_event_id` were not retained. If this process has no
+        events of the task, its stream ran elsewhere or has not started, so the
+        consumer gets the stored status and the stream ends instead of waiting
+        for events that may never come.
+        """
         async with self.subscriber_lock:
+            history = self.task_sse_history.get(task_id, deque())
+            sse_event_queue = asyncio.Queue(maxsize=0)
+
+            if last_event_id is None:
+                replay = []
+            else:
+                replay = [item for item in history if item[0] > last_event_id]
+                last_published = self.task_sse_last_event_id.get(task_id, last_event_id)
+                missing = (last_published - last_event_id) - len(replay)
+                if history and missing > 0:
+                    # Dropped from the history or published with retain=False,
+                    # resuming would silently skip them
+                    raise ValueError(
+                        f"{missing} events of task {task_id} after event {last_event_id} "
+                        "are no longer available, get the task with tasks/get instead"
+                    )
+
+            for item in replay:
+                sse_event_queue.put_nowait(item)
+
+            if history and self._is_terminal_event(history[-1][1]):
+                # The stream has already ended. Make sure the consumer still sees
+                # the terminal event so that it closes cleanly.
+                if not replay:
+                    sse_event_queue.put_nowait(history[-1])
+            elif not history and current_status.state in FINAL_STREAM_STATES:
+                # Task ran without a stream (e.g. tasks/send), report its final state.
+                sse_event_queue.put_nowait(
+                    (None, TaskStatusUpdateEvent(id=task_id, status=current_status, final=True))
+                )
+            elif not history:
+                # Report the current state and end the stream, the client polls
+                # or resubscribes for the rest
+                sse_event_queue.put_nowait(
+                    (None, TaskStatusUpdateEvent(id=task_id, status=current_status, final=False))
+                )
+                sse_event_queue.put_nowait((None, None))
+            else:
+                self.task_sse_subscribers.setdefault(task_id, []).append(sse_event_queue)
+                self.sse_consumers_changed.notify_all()
+
+            return sse_event_queue
+
+    @staticmethod
+    def _is_terminal_event(event) -> bool:
+        return isinstance(event, JSONRPCError) or (
+            isinstance(event, TaskStatusUpdateEvent) and event.final
+        )
+
+    async def enqueue_events_for_sse(self, task_id, task_update_event, retain: bool = True):
+        """Publishes an event to the task's subscribers.
+
+        Events published with `retain=False`, such as large result chunks, are
+        not kept for replay, and clients cannot resume the stream past them.
+        """
+        async with self.subscriber_lock:
+            event_id = self.task_sse_last_event_id.get(task_id, 0) + 1
+            self.task_sse_last_event_id[task_id] = event_id
+
+            if task_id not in self.task_sse_history:
+                self.task_sse_history[task_id] = deque(maxlen=self.sse_history_size)
+            if retain or self._is_terminal_event(task_update_event):
+                self.task_sse_history[task_id].append((event_id, task_update_event))
+            if self._is_terminal_event(task_update_event):
+                # Kept a while for clients reconnecting to read the end of the stream
+                asyncio.get_running_loop().call_later(
+                    self.sse_history_ttl, self._drop_sse_history, task_id, event_id
+                )
+
             if task_id not in self.task_sse_subscribers:
                 return
 
             current_subscribers = self.task_sse_subscribers[task_id]
             for subscriber in current_subscribers:
-                await subscriber.put(task_update_event)
+                await subscriber.put((event_id, task_update_event))
+
+    def _drop_sse_history(self, task_id: str, final_event_id: int):
+        """Forgets the events of a task whose stream ended, unless it has
+        published events again since."""
+        if self.task_sse_last_event_id.get(task_id) != final_event_id:
+            return
+        self.task_sse_history.pop(task_id, None)
+        self.task_sse_last_event_id.pop(task_id, None)
+        if not self.task_sse_subscribers.get(task_id, True):
+            del self.task_sse_subscribers[task_id]
+
+    async def wait_for_sse_consumers(self, task_id: str, max_queued: int):
+        """Waits until no subscriber of the task has more than `max_queued`
+        events left to send, so that a fast producer does not buffer a whole
+        result for a slow consumer."""
+        async with self.sse_consumers_changed:
+            await self.sse_consumers_changed.wait_for(
+                lambda: all(
+                    queue.qsize() <= max_queued
+                    for queue in self.task_sse_subscribers.get(task_id, [])
+                )
+            )
 
     async def dequeue_events_for_sse(
         self, request_id, task_id, sse_event_queue: asyncio.Queue
     ) -> AsyncIterable[SendTaskStreamingResponse] | JSONRPCResponse:
         try:
-            while True:                
-                event = await sse_event_queue.get()
+            while True:
+                event_id, event = await sse_event_queue.get()
+                async with self.sse_consumers_changed:
+                    self.sse_consumers_changed.notify_all()
+                if event is None:
+                    # End of a stream without a final event
+                    break
                 if isinstance(event, JSONRPCError):
-                    yield SendTaskStreamingResponse(id=request_id, error=event)
+                    response = SendTaskStreamingResponse(id=request_id, error=event)
+                    response._event_id = event_id
+                    yield response
                     break
-                                                
-                yield SendTaskStreamingResponse(id=request_id, result=event)
+
+                response = SendTaskStreamingResponse(id=request_id, result=event)
+                response._event_id = event_id
+                yield response
                 if isinstance(event, TaskStatusUpdateEvent) and event.final:
                     break
         finally:
             async with self.subscriber_lock:
-                if task_id in self.task_sse_subscribers:
-                    self.task_sse_subscribers[task_id].remove(sse_event_queue)
-
+                subscribers = self.task_sse_subscribers.get(task_id, [])
+                if sse_event_queue in subscribers:
+                    subscribers.remove(sse_event_queue)
+                    self.sse_consumers_changed.notify_all()
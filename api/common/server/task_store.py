@@ -0,0 +1,223 @@
+from abc import ABC, abstractmethod
+from typing import Callable
+from common.types import Task, PushNotificationConfig
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TaskStore(ABC):
+    """Storage backend for task state and push notification configs.
+
+    `InMemoryTaskManager` keeps its tasks in a `TaskStore`, so that several
+    server processes can share task state by sharing the store.
+    """
+
+    @abstractmethod
+    async def get_task(self, task_id: str) -> Task | None:
+        pass
+
+    @abstractmethod
+    async def save_task(self, task: Task) -> None:
+        pass
+
+    @abstractmethod
+    async def update_task(
+        self, task_id: str, update: Callable[[Task | None], Task | None]
+    ) -> Task | None:
+        """Reads a task, passes it to `update` and saves what it returns, as
+        one atomic step even if other processes update the task concurrently.
+
+        `update` gets None if the task does not exist, and returns the task to
+        save or None to leave the store unchanged. It may be called more than
+        once. Returns the saved task, or None if nothing was saved.
+        """
+        pass
+
+    @abstractmethod
+    async def get_push_notification_config(
+        self, task_id: str
+    ) -> PushNotificationConfig | None:
+        pass
+
+    @abstractmethod
+    async def save_push_notification_config(
+        self, task_id: str, config: PushNotificationConfig
+    ) -> None:
+        pass
+
+
+class InMemoryTaskStore(TaskStore):
+    """Keeps tasks in process memory. State is lost on restart and is not
+    visible to other worker processes."""
+
+    def __init__(self):
+        self.tasks: dict[str, Task] = {}
+        self.push_notification_infos: dict[str, PushNotificationConfig] = {}
+
+    async def get_task(self, task_id: str) -> Task | None:
+        return self.tasks.get(task_id)
+
+    async def save_task(self, task: Task) -> None:
+        self.tasks[task.id] = task
+
+    async def update_task(
+        self, task_id: str, update: Callable[[Task | None], Task | None]
+    ) -> Task | None:
+        task = update(self.tasks.get(task_id))
+        if task is not None:
+            self.tasks[task_id] = task
+        return task
+
+    async def get_push_notification_config(
+        self, task_id: str
+    ) -> PushNotificationConfig | None:
+        return self.push_notification_infos.get(task_id)
+
+    async def save_push_notification_config(
+        self, task_id: str, config: PushNotificationConfig
+    ) -> None:
+        self.push_notification_infos[task_id] = config
+
+
+class SQLTaskStore(TaskStore):
+    """Stores tasks as JSON documents in a SQL database through SQLAlchemy.
+
+    Any database reachable by all workers works, e.g. `sqlite:///outputs/tasks.db`
+    for a single host or the PostgreSQL instance the SQL agent already uses.
+
+    Each row has a version that every write increments. A write only succeeds
+    if the version is still the one that was read, and is retried from the
+    read otherwise, so concurrent updates from several workers are not lost.
+    """
+
+    # Attempts of a write that keeps losing to concurrent writes
+    MAX_WRITE_ATTEMPTS = 10
+
+    def __init__(self, db_url: str, create_tables: bool = True):
+        """
+        Args:
+            db_url: SQLAlchemy URL of the database.
+            create_tables: Create the tables if they do not exist. With several
+                workers, the tables are created once before they are started.
+        """
+        from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Text
+
+        self.db_url = db_url
+        self.engine = create_engine(db_url)
+        self.metadata = MetaData()
+        self.tasks_table = Table(
+            "a2a_tasks",
+            self.metadata,
+            Column("id", String(255), primary_key=True),
+            Column("data", Text, nullable=False),
+            Column("version", Integer, nullable=False),
+        )
+        self.push_notification_table = Table(
+            "a2a_push_notification_configs",
+            self.metadata,
+            Column("id", String(255), primary_key=True),
+            Column("data", Text, nullable=False),
+            Column("version", Integer, nullable=False),
+        )
+        if create_tables:
+            self.metadata.create_all(self.engine)
+        logger.info(f"Task store initialized at {self.engine.url!r}")
+
+    def _get(self, table, key: str) -> str | None:
+        from sqlalchemy import select
+
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select(table.c.data).where(table.c.id == key)
+            ).scalar_one_or_none()
+
+    def _update(
+        self, table, key: str, update: Callable[[str | None], str | None]
+    ) -> str | None:
+        from sqlalchemy import select
+        from sqlalchemy.exc import IntegrityError
+
+        for _ in range(self.MAX_WRITE_ATTEMPTS):
+            try:
+                with self.engine.begin() as connection:
+                    row = connection.execute(
+                        select(table.c.data, table.c.version).where(table.c.id == key)
+                    ).one_or_none()
+                    data = update(None if row is None else row.data)
+                    if data is None:
+                        return None
+                    if row is None:
+                        # Fails if another worker inserted the row meanwhile
+                        connection.execute(table.insert().values(id=key, data=data, version=1))
+                        return data
+                    result = connection.execute(
+                        table.update()
+                        .where(table.c.id == key, table.c.version == row.version)
+                        .values(data=data, version=row.version + 1)
+                    )
+                    if result.rowcount == 1:
+                        return data
+                    # Another worker wrote the row since it was read, the
+                    # transaction is rolled back and the update retried
+                    raise _WriteConflict()
+            except (IntegrityError, _WriteConflict):
+                continue
+        raise RuntimeError(
+            f"{key} in {table.name} kept changing, gave up after "
+            f"{self.MAX_WRITE_ATTEMPTS} attempts"
+        )
+
+    def _put(self, table, key: str, data: str) -> None:
+        self._update(table, key, lambda _: data)
+
+    async def get_task(self, task_id: str) -> Task | None:
+        data = await asyncio.to_thread(self._get, self.tasks_table, task_id)
+        return None if data is None else Task.model_validate_json(data)
+
+    async def save_task(self, task: Task) -> None:
+        await asyncio.to_thread(
+            self._put, self.tasks_table, task.id, task.model_dump_json(exclude_none=True)
+        )
+
+    async def update_task(
+        self, task_id: str, update: Callable[[Task | None], Task | None]
+    ) -> Task | None:
+        updated = None
+
+        def update_data(data: str | None) -> str | None:
+            nonlocal updated
+            updated = update(None if data is None else Task.model_validate_json(data))
+            return None if updated is None else updated.model_dump_json(exclude_none=True)
+
+        if await asyncio.to_thread(self._update, self.tasks_table, task_id, update_data) is None:
+            return None
+        return updated
+
+    async def get_push_notification_config(
+        self, task_id: str
+    ) -> PushNotificationConfig | None:
+        data = await asyncio.to_thread(self._get, self.push_notification_table, task_id)
+        return None if data is None else PushNotificationConfig.model_validate_json(data)
+
+    async def save_push_notification_config(
+        self, task_id: str, config: PushNotificationConfig
+    ) -> None:
+        await asyncio.to_thread(
+            self._put,
+            self.push_notification_table,
+            task_id,
+            config.model_dump_json(exclude_none=True),
+        )
+
+
+class _WriteConflict(Exception):
+    """A row was written by someone else between reading and writing it."""
+
+
+def create_task_store(db_url: str | None = None, create_tables: bool = True) -> TaskStore:
+    """Returns a `SQLTaskStore` for `db_url`, or an `InMemoryTaskStore` if unset."""
+    if db_url:
+        return SQLTaskStore(db_url, create_tables=create_tables)
+    return InMemoryTaskStore()
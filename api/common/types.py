@@ -2,7 +2,7 @@ from typing import Union, Any
 from pydantic import BaseModel, Field, TypeAdapter
 from typing import Literal, List, Annotated, Optional
 from datetime import datetime
-from pydantic import model_validator, ConfigDict, field_serializer
+from pydantic import model_validator, ConfigDict, field_serializer, PrivateAttr
 from uuid import uuid4
 from enum import Enum
 from typing_extensions import Self
@@ -126,6 +126,10 @@ class TaskQueryParams(TaskIdParams):
     historyLength: int | None = None
 
 
+class TaskResubscriptionParams(TaskIdParams):
+    lastEventId: int | None = None
+
+
 class TaskSendParams(BaseModel):
     id: str
     sessionId: str = Field(default_factory=lambda: uuid4().hex)
@@ -182,6 +186,10 @@ class SendTaskStreamingRequest(JSONRPCRequest):
 class SendTaskStreamingResponse(JSONRPCResponse):
     result: TaskStatusUpdateEvent | TaskArtifactUpdateEvent | None = None
 
+    # Sequence number of the event within its task stream, sent as the SSE `id`
+    # field so that clients can resume with `Last-Event-ID`. Not serialized.
+    _event_id: int | None = PrivateAttr(default=None)
+
 
 class GetTaskRequest(JSONRPCRequest):
     method: Literal["tasks/get"] = "tasks/get"
@@ -221,7 +229,7 @@ class GetTaskPushNotificationResponse(JSONRPCResponse):
 
 class TaskResubscriptionRequest(JSONRPCRequest):
     method: Literal["tasks/resubscribe",] = "tasks/resubscribe"
-    params: TaskIdParams
+    params: TaskResubscriptionParams
 
 
 A2ARequest = TypeAdapter(
@@ -302,6 +310,18 @@ class ContentTypeNotSupportedError(JSONRPCError):
     data: None = None
 
 
+class RateLimitExceededError(JSONRPCError):
+    code: int = -32006
+    message: str = "Rate limit exceeded"
+    data: Any | None = None
+
+
+class ServerBusyError(JSONRPCError):
+    code: int = -32007
+    message: str = "Server is busy, retry later"
+    data: Any | None = None
+
+
 class AgentProvider(BaseModel):
     organization: str
     url: str | None = None
@@ -0,0 +1,188 @@
+"""Blob store for serving generated files out of band."""
+
+import asyncio
+import logging
+import mimetypes
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BlobInfo:
+    path: str
+    size: int
+    last_used: float
+
+
+class BlobStore:
+    """Serves files below a root directory by id, and deletes them again.
+
+    A blob id is the file's path relative to the root directory, so any process
+    sharing the directory can resolve it without a shared index. Each store
+    still keeps an index of the files by id, so lookups are a dictionary access
+    and quotas are checked without listing the directory. The index is filled
+    as files are registered and resolved, and rebuilt on every cleanup.
+
+    Files not used for `ttl_seconds` are deleted, and the least recently used
+    ones are deleted while the files take more than `max_bytes` or number more
+    than `max_files`. A file is used when it is registered or resolved, or when
+    its modification time changes. Files in hidden directories, such as staging
+    directories, are not managed.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        max_bytes: Optional[int] = None,
+        max_files: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        cleanup_interval: float = 60.0,
+    ):
+        self.root_dir = Path(root_dir).resolve()
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval = cleanup_interval
+        self._index: Dict[str, BlobInfo] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def has_limits(self) -> bool:
+        return bool(self.max_bytes or self.max_files or self.ttl_seconds)
+
+    def register(self, file_path: str) -> str:
+        """Returns the blob id of a file stored below the root directory.
+
+        Deletes the least recently used other files if the directory is over
+        quota, so call it in a thread from async code.
+
+        Args:
+            file_path: Path of an existing file below the root directory.
+
+        Returns:
+            The blob id to use in download URLs.
+        """
+        path = Path(file_path).resolve()
+        if not path.is_relative_to(self.root_dir):
+            raise ValueError(f"{file_path} is not inside {self.root_dir}")
+        blob_id = path.relative_to(self.root_dir).as_posix()
+        with self._lock:
+            self._index[blob_id] = BlobInfo(str(path), path.stat().st_size, time.time())
+        if self.max_bytes or self.max_files:
+            self._enforce_quota(keep=blob_id)
+        return blob_id
+
+    def resolve(self, blob_id: str) -> Optional[str]:
+        """Returns the path of a blob, or None if it does not exist.
+
+        Ids that point outside the root directory are rejected.
+        """
+        with self._lock:
+            info = self._index.get(blob_id)
+        if info is None:
+            # Written by another process since the last refresh
+            path = (self.root_dir / blob_id).resolve()
+            if not path.is_relative_to(self.root_dir) or not path.is_file():
+                return None
+            info = BlobInfo(str(path), path.stat().st_size, time.time())
+            with self._lock:
+                self._index[blob_id] = info
+        elif not os.path.isfile(info.path):
+            # Deleted by another process
+            with self._lock:
+                self._index.pop(blob_id, None)
+            return None
+        info.last_used = time.time()
+        return info.path
+
+    def delete(self, blob_id: str) -> bool:
+        """Deletes a blob. Returns False if it did not exist."""
+        with self._lock:
+            info = self._index.pop(blob_id, None)
+        if info is None:
+            return False
+        try:
+            os.remove(info.path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def refresh(self):
+        """Rebuilds the index from the files in the root directory."""
+        found = {}
+        for dir_path, dir_names, file_names in os.walk(self.root_dir):
+            dir_names[:] = [name for name in dir_names if not name.startswith(".")]
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                blob_id = Path(path).relative_to(self.root_dir).as_posix()
+                found[blob_id] = (path, stat.st_size, stat.st_mtime)
+
+        with self._lock:
+            index = {}
+            for blob_id, (path, size, mtime) in found.items():
+                info = self._index.get(blob_id)
+                last_used = max(mtime, info.last_used) if info else mtime
+                index[blob_id] = BlobInfo(path, size, last_used)
+            self._index = index
+
+    def cleanup(self) -> int:
+        """Deletes expired files and the files over quota. Returns the number
+        of files deleted."""
+        self.refresh()
+        deleted = 0
+        if self.ttl_seconds:
+            expiry = time.time() - self.ttl_seconds
+            with self._lock:
+                expired = [
+                    blob_id for blob_id, info in self._index.items() if info.last_used < expiry
+                ]
+            for blob_id in expired:
+                if self.delete(blob_id):
+                    deleted += 1
+                    logger.info(f"Deleted expired file {blob_id}")
+        return deleted + self._enforce_quota()
+
+    def _enforce_quota(self, keep: Optional[str] = None) -> int:
+        with self._lock:
+            entries = sorted(self._index.items(), key=lambda item: item[1].last_used)
+        total_bytes = sum(info.size for _, info in entries)
+        total_files = len(entries)
+
+        deleted = 0
+        for blob_id, info in entries:
+            if (not self.max_bytes or total_bytes <= self.max_bytes) and (
+                not self.max_files or total_files <= self.max_files
+            ):
+                break
+            if blob_id == keep:
+                continue
+            if self.delete(blob_id):
+                deleted += 1
+                logger.info(f"Deleted {blob_id} to stay within the output quota")
+            total_bytes -= info.size
+            total_files -= 1
+        return deleted
+
+    async def run_cleanup(self):
+        """Runs `cleanup` every `cleanup_interval` seconds until cancelled."""
+        while True:
+            try:
+                await asyncio.to_thread(self.cleanup)
+            except Exception as e:
+                logger.error(f"Error cleaning up {self.root_dir}: {e}")
+            await asyncio.sleep(self.cleanup_interval)
+
+    @staticmethod
+    def guess_mime_type(file_path: str) -> str:
+        return mimetypes.guess_type(file_path)[0] or "application/octet-stream"
@@ -59,6 +59,14 @@ class PushNotificationSenderAuth(PushNotificationAuth):
         key = jwk.JWK.generate(kty='RSA', size=2048, kid=str(uuid.uuid4()), use="sig")
         self.public_keys.append(key.export_public(as_dict=True))
         self.private_key_jwk = PyJWK.from_json(key.export_private())
+        return key.export_private()
+
+    def load_jwk(self, private_key_json: str):
+        """Uses a key exported by `generate_jwk`, so that several server
+        processes sign with (and publish) the same key."""
+        key = jwk.JWK.from_json(private_key_json)
+        self.public_keys.append(key.export_public(as_dict=True))
+        self.private_key_jwk = PyJWK.from_json(private_key_json)
     
     def handle_jwks_endpoint(self, _request: Request):
         """Allow clients to fetch public keys.
@@ -1,4 +1,5 @@
 import os
+from typing import Dict
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -17,6 +18,9 @@ class Settings(BaseSettings):
     POSTGRES_PORT: str = os.getenv("DB_PORT", "5432")
     POSTGRES_DB: str = os.getenv("DB_NAME", "postgres")
 
+    # Further databases by connection name, as a JSON object of SQLAlchemy URLs
+    DATABASE_CONNECTIONS: Dict[str, str] = {}
+
     @property
     def DATABASE_URL(self) -> str:  # noqa: N802
         return (
@@ -2,6 +2,7 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from core.config import settings
+from core.sql_safety import is_single_select
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,17 +12,24 @@ class Database:
 
     def __init__(self, db_url=None):
         self.db_url = db_url or settings.DATABASE_URL
-        self.engine = None
+        self._engine = None
         self.SessionLocal = None
-        self.init_db()
+
+    @property
+    def engine(self):
+        """The engine, created on first use, so that importing this module
+        does not load the database driver"""
+        if self._engine is None:
+            self.init_db()
+        return self._engine
 
     def init_db(self):
         """Initalize database"""
         try:
-            self.engine = create_engine(self.db_url)
+            self._engine = create_engine(self.db_url)
             self.SessionLocal = sessionmaker(autocommit = False,
                                              autoflush  = False,
-                                             bind       = self.engine)
+                                             bind       = self._engine)
             self.Base = declarative_base()
             logger.info("Database connection established")
         except Exception as e:
@@ -30,6 +38,8 @@ class Database:
     
     def get_session(self):
         """Return database session"""
+        if self.SessionLocal is None:
+            self.init_db()
         db = self.SessionLocal()
         try:
             yield db
@@ -64,4 +74,57 @@ class Database:
                 logger.error(f"Params: {params}")
             raise
 
-db = Database()
\ No newline at end of file
+    def stream_query(self, query, params = None, batch_size = 10000):
+        """
+        Execute SQL query and yield its rows batch by batch
+
+        Rows are fetched through a server-side cursor, so only one batch is in
+        memory at a time. On PostgreSQL the query runs in a read-only
+        transaction, other databases only accept a single SELECT statement.
+
+        Args:
+            query: SQL query string
+            params: (Optional) Query parameter
+            batch_size: Rows per batch
+        Yields:
+            Lists of up to batch_size rows (Dictionary list)
+        """
+        options = {"stream_results": True, "max_row_buffer": batch_size}
+        if self.engine.dialect.name == "postgresql":
+            options["postgresql_readonly"] = True
+        elif not is_single_select(query):
+            raise ValueError("Only a single SELECT statement can be streamed")
+        try:
+            with self.engine.connect() as connection:
+                connection = connection.execution_options(**options)
+                result = connection.execute(text(query), params or {})
+                if not result.returns_rows:
+                    return
+                columns = list(result.keys())
+                for rows in result.partitions(batch_size):
+                    yield [dict(zip(columns, row)) for row in rows]
+        except Exception as e:
+            logger.error(f"Query execution failed: {e}")
+            logger.error(f"Query: {query}")
+            raise
+
+    def ping(self):
+        """Check that the database accepts connections, raising if it does not"""
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return True
+
+
+db = Database()
+
+# Databases by connection name, connections other than "default" are
+# configured in settings.DATABASE_CONNECTIONS
+_databases = {"default": db}
+
+def get_database(connection = "default"):
+    """Return the database of a named connection"""
+    if connection not in _databases:
+        if connection not in settings.DATABASE_CONNECTIONS:
+            raise ValueError(f"Unknown database connection: {connection}")
+        _databases[connection] = Database(settings.DATABASE_CONNECTIONS[connection])
+    return _databases[connection]
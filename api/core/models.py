@@ -21,18 +21,26 @@ class QueryResponse(BaseModel):
     guidance: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
 
+# Reference to a query result that is read from the database by its consumer
+class ResultHandle(BaseModel):
+    sql_query: str
+    # Name of a connection configured on the consumer, never its URL
+    connection: str = "default"
+
 # SQL result message
 class SQLResultMessage(BaseModel):
     sql_query: str
     result: List[Dict[str, Any]]
     error: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
+    result_handle: Optional[ResultHandle] = None
 
-# Excel request message
+# Excel request message, with either the result rows or a handle to read them from
 class ExcelRequestMessage(BaseModel):
     query: str
     sql_query: str
-    result: List[Dict[str, Any]]
+    result: List[Dict[str, Any]] = []
+    result_handle: Optional[ResultHandle] = None
     format_options: Optional[Dict[str, Any]] = None
 
 # Agent State - (Using in LangChain)
@@ -0,0 +1,26 @@
+"""Checks of SQL text that do not need a database connection."""
+
+import re
+
+# String literals, quoted identifiers and comments, which may hold anything
+_SQL_QUOTED_OR_COMMENT = re.compile(
+    r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?\*/",
+    re.DOTALL,
+)
+# Keywords of statements that write, or change the schema or the connection
+_SQL_WRITE_KEYWORDS = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|UPSERT|INTO|CREATE|DROP|ALTER|TRUNCATE|"
+    r"GRANT|REVOKE|ATTACH|DETACH|PRAGMA|VACUUM|CALL|EXEC|EXECUTE|LOCK|SET|COPY)\b",
+    re.IGNORECASE,
+)
+
+
+def is_single_select(query):
+    """Return whether a query is a single SELECT statement, optionally with
+    common table expressions, that writes nothing"""
+    stripped = _SQL_QUOTED_OR_COMMENT.sub(" ", query).strip().rstrip(";").strip()
+    if ";" in stripped:
+        return False
+    if not re.match(r"(SELECT|WITH)\b", stripped, re.IGNORECASE):
+        return False
+    return _SQL_WRITE_KEYWORDS.search(stripped) is None
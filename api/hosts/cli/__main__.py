@@ -39,7 +39,6 @@ async def cli(agent, session, history, use_push_notifications: bool, push_notifi
         )
         push_notification_listener.start()
 
-    client = A2AClient(agent_card=card)
     if session == 0:
         sessionId = uuid4().hex
     else:
@@ -48,15 +47,16 @@ async def cli(agent, session, history, use_push_notifications: bool, push_notifi
     continue_loop = True
     streaming = card.capabilities.streaming
 
-    while continue_loop:
-        taskId = uuid4().hex
-        print("=========  starting a new task ========")
-        continue_loop = await completeTask(client, streaming, use_push_notifications, notification_receiver_host, notification_receiver_port, taskId, sessionId)
+    async with A2AClient(agent_card=card) as client:
+        while continue_loop:
+            taskId = uuid4().hex
+            print("=========  starting a new task ========")
+            continue_loop = await completeTask(client, streaming, use_push_notifications, notification_receiver_host, notification_receiver_port, taskId, sessionId)
 
-        if history and continue_loop:
-            print("========= history ======== ")
-            task_response = await client.get_task({"id": taskId, "historyLength": 10})
-            print(task_response.model_dump_json(include={"result": {"history": True}}))
+            if history and continue_loop:
+                print("========= history ======== ")
+                task_response = await client.get_task({"id": taskId, "historyLength": 10})
+                print(task_response.model_dump_json(include={"result": {"history": True}}))
 
 
 async def completeTask(client: A2AClient, streaming, use_push_notifications: bool, notification_receiver_host: str, notification_receiver_port: int, taskId, sessionId):
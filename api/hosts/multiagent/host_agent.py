@@ -18,7 +18,7 @@ from .remote_agent_connection import (
     RemoteAgentConnections,
     TaskUpdateCallback
 )
-from common.client import A2ACardResolver
+from common.client import A2ACardResolver, resolve_agent_cards, refresh_agent_cards
 from common.types import (
     AgentCard,
     Message,
@@ -39,14 +39,26 @@ class HostAgent:
     tasks to and coordinate their work
     """
 
+    # Seconds a remote agent may take on a task sent with `send_tasks`
+    DEFAULT_SUBTASK_TIMEOUT = 120.0
+
     def __init__(
         self,
         remote_agent_addresses: List[str],
-        task_callback: TaskUpdateCallback | None = None
+        task_callback: TaskUpdateCallback | None = None,
+        agent_timeouts: dict[str, float] | None = None
     ):
+        """
+        Args:
+          agent_timeouts: Seconds each remote agent, by name, may take on a task
+            sent with `send_tasks`, instead of `DEFAULT_SUBTASK_TIMEOUT`.
+        """
         self.task_callback = task_callback
+        self.agent_timeouts = dict(agent_timeouts or {})
+        self.remote_agent_addresses = list(remote_agent_addresses)
         self.remote_agent_connections: dict[str, RemoteAgentConnections] = {}
         self.cards: dict[str, AgentCard] = {}
+        self.card_refresh_task: asyncio.Task | None = None
         for address in remote_agent_addresses:
             card_resolver = A2ACardResolver(address)
             card = card_resolver.get_agent_card()
@@ -58,6 +70,54 @@ class HostAgent:
             agent_info.append(json.dumps(ra))
         self.agents = "\n".join(agent_info)
 
+    @classmethod
+    async def create(
+        cls,
+        remote_agent_addresses: List[str],
+        task_callback: TaskUpdateCallback | None = None,
+        agent_timeouts: dict[str, float] | None = None
+    ) -> "HostAgent":
+        """Creates a host agent, resolving all remote agent cards concurrently."""
+        host_agent = cls([], task_callback, agent_timeouts)
+        host_agent.remote_agent_addresses = list(remote_agent_addresses)
+        for card in await resolve_agent_cards(remote_agent_addresses):
+            host_agent.register_agent_card(card)
+        return host_agent
+
+    async def aclose(self):
+        """Stops the card refresh and closes the connections to the remote agents."""
+        if self.card_refresh_task is not None:
+            self.card_refresh_task.cancel()
+            self.card_refresh_task = None
+        await asyncio.gather(*(
+            connection.aclose() for connection in self.remote_agent_connections.values()
+        ))
+
+    async def __aenter__(self) -> "HostAgent":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def start_card_refresh(self, interval: float = 60):
+        """Keeps the remote agent cards up to date in the background."""
+        if self.card_refresh_task is None:
+            self.card_refresh_task = asyncio.create_task(
+                refresh_agent_cards(
+                    self.remote_agent_addresses, self.update_agent_card, interval
+                )
+            )
+
+    def update_agent_card(self, card: AgentCard):
+        connection = self.remote_agent_connections.get(card.name)
+        if connection is None:
+            self.register_agent_card(card)
+            return
+        # Keep the existing connection (and its pooled HTTP client) alive.
+        connection.card = card
+        connection.agent_client.url = card.url
+        self.cards[card.name] = card
+
     def register_agent_card(self, card: AgentCard):
         remote_connection = RemoteAgentConnections(card)
         self.remote_agent_connections[card.name] = remote_connection
@@ -80,6 +140,7 @@ class HostAgent:
             tools=[
                 self.list_remote_agents,
                 self.send_task,
+                self.send_tasks,
             ],
         )
     
@@ -93,6 +154,9 @@ Discovery:
 Execution:
 - For actionable tasks, you can use `create_task` to assign tasks to remote agents to perform.
 Be sure to include the remote agent name when you respond to the user.
+- When the request needs several independent tasks, for example the same question against
+several databases, use `send_tasks` to send them all at once instead of one after another.
+Report the subtasks that failed or timed out along with the results of the others.
 
 You can use `check_pending_task_states` to check the states of the pending tasks.
 
@@ -166,27 +230,7 @@ Current agent: {current_agent['active_agent']}
             taskId = str(uuid.uuid4())
         sessionId = state['task_id']
         task: Task
-        messageId = ""
-        metadata = {}
-        if 'input_message_metadata' in state:
-            metadata.update(**state['input_message_metadata'])
-            if 'message_id' in state['input_message_metadata']:
-                messageId = state['input_message_metadata']['message_id']
-        if not messageId:
-            messageId = str(uuid.uuid4())
-        metadata.update(**{'conversation_id': sessionId, 'message_id': messageId})
-        request: TaskSendParams = TaskSendParams(
-            id=taskId,
-            sessionId=sessionId,
-            message=Message(
-                role="user",
-                parts=[TextPart(text=message)],
-                metadata=metadata,
-            ),
-            acceptedOutputModes=["text", "text/plain", "image/png"],
-            # pushNotification=None,
-            metadata={'conversation_id': sessionId},
-        )
+        request = self._build_request(message, taskId, sessionId, state)
         task = await client.send_task(request, self.task_callback)
         # Assume completion unless a state returns that isn't complete
         state['session_active'] = task.status.state not in [
@@ -205,14 +249,113 @@ Current agent: {current_agent['active_agent']}
         elif task.status.state == TaskState.FAILED:
             # Raise error for failure
             raise ValueError(f"Agent {agent_name} task {task.id} failed")
-        response = []
-        if task.status.message:
-            # Assume the info is in the task message.
-            response.extend(convert_parts(task.status.message.parts, tool_context))
-        if task.artifacts:
-            for artifact in task.artifacts:
-                response.extend(convert_parts(artifact.parts, tool_context))
-        return response
+        return convert_task(task, tool_context)
+
+    async def send_tasks(
+            self,
+            subtasks: list[dict],
+            tool_context: ToolContext):
+        """Sends tasks to several remote agents at once and waits for all of them.
+
+        Use this instead of calling send_task repeatedly when the request needs
+        several independent answers, such as the same question asked of several
+        database agents, or several questions asked of one agent. A subtask that
+        fails or times out does not stop the others.
+
+        Args:
+        subtasks: The tasks to send, each a dictionary with the "agent_name" of
+          the agent to send it to and the "message" for that agent.
+        tool_context: The tool context this method runs in.
+
+        Returns:
+        One dictionary per subtask, in order, with the "agent_name", the
+        "state" of its task, and its "response" or, if it did not complete,
+        an "error".
+        """
+        state = tool_context.state
+        # The same session as send_task, so the remote agents see one conversation
+        if 'task_id' in state:
+            session_id = state['task_id']
+        else:
+            session_id = str(uuid.uuid4())
+        return await asyncio.gather(*(
+            self._run_subtask(subtask, session_id, tool_context)
+            for subtask in subtasks
+        ))
+
+    async def _run_subtask(
+            self,
+            subtask: dict,
+            session_id: str,
+            tool_context: ToolContext) -> dict:
+        agent_name = subtask.get("agent_name")
+        result = {"agent_name": agent_name}
+        client = self.remote_agent_connections.get(agent_name)
+        if client is None:
+            return {
+                **result, "state": TaskState.FAILED.value, "error": f"Agent {agent_name} not found"
+            }
+
+        # Each subtask is a task of its own within the conversation
+        request = self._build_request(
+            subtask.get("message", ""), str(uuid.uuid4()), session_id, tool_context.state
+        )
+        timeout = self.agent_timeouts.get(agent_name, self.DEFAULT_SUBTASK_TIMEOUT)
+        try:
+            task = await asyncio.wait_for(
+                client.send_task(request, self.task_callback), timeout
+            )
+            if task is None:
+                raise ValueError(f"Agent {agent_name} returned no task")
+            response = convert_task(task, tool_context)
+        except asyncio.TimeoutError:
+            return {**result, "state": "timeout", "error": f"No answer within {timeout} seconds"}
+        except Exception as e:
+            return {**result, "state": TaskState.FAILED.value, "error": str(e)}
+
+        result["state"] = task.status.state.value
+        if task.status.state in (TaskState.FAILED, TaskState.CANCELED):
+            result["error"] = f"Agent {agent_name} task {task.id} {task.status.state.value}"
+        result["response"] = response
+        return result
+
+    def _build_request(
+            self,
+            message: str,
+            task_id: str,
+            session_id: str,
+            state) -> TaskSendParams:
+        messageId = ""
+        metadata = {}
+        if 'input_message_metadata' in state:
+            metadata.update(**state['input_message_metadata'])
+            if 'message_id' in state['input_message_metadata']:
+                messageId = state['input_message_metadata']['message_id']
+        if not messageId:
+            messageId = str(uuid.uuid4())
+        metadata.update(**{'conversation_id': session_id, 'message_id': messageId})
+        return TaskSendParams(
+            id=task_id,
+            sessionId=session_id,
+            message=Message(
+                role="user",
+                parts=[TextPart(text=message)],
+                metadata=metadata,
+            ),
+            acceptedOutputModes=["text", "text/plain", "image/png"],
+            # pushNotification=None,
+            metadata={'conversation_id': session_id},
+        )
+
+def convert_task(task: Task, tool_context: ToolContext):
+    response = []
+    if task.status.message:
+        # Assume the info is in the task message.
+        response.extend(convert_parts(task.status.message.parts, tool_context))
+    if task.artifacts:
+        for artifact in task.artifacts:
+            response.extend(convert_parts(artifact.parts, tool_context))
+    return response
     
 def convert_parts(parts: list[Part], tool_context: ToolContext):
     rval = []
@@ -225,6 +368,9 @@ def convert_part(part: Part, tool_context: ToolContext):
         return part.text
     elif part.type == "data":
         return part.data
+    elif part.type == "file" and part.file.uri:
+        # Files served by URI are passed on as a link instead of being downloaded
+        return DataPart(data = {"artifact-file-uri": part.file.uri, "name": part.file.name})
     elif part.type == "file":
         # Repackage A2A FilePart to google.genai Blob
         # Currently not considering plain text as files    
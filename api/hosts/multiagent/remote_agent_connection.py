@@ -27,6 +27,10 @@ class RemoteAgentConnections:
 
     def get_agent(self) -> AgentCard:
         return self.card
+
+    async def aclose(self):
+        """Closes the pooled HTTP connections to the agent."""
+        await self.agent_client.aclose()
     
     async def send_task(
             self,
@@ -34,23 +38,27 @@ class RemoteAgentConnections:
             task_callback: TaskUpdateCallback | None,
     ) -> Task | None:
         if self.card.capabilities.streaming:
-            task = None
+            task = Task(
+                id=request.id,
+                sessionId=request.sessionId,
+                status=TaskStatus(
+                    state=TaskState.SUBMITTED,
+                    message=request.message,
+                ),
+                history=[request.message],
+            )
             if task_callback:
-                task_callback(Task(
-                    id=request.id,
-                    sessionId=request.sessionId,
-                    status=TaskStatus(
-                        state=TaskState.SUBMITTED,
-                        message=request.message,
-                    ),
-                    history=[request.message],
-                ), self.card)
+                task_callback(task, self.card)
             async for response in self.agent_client.send_task_streaming(request.model_dump()):
+                if response.error:
+                    raise ValueError(
+                        f"Agent {self.card.name} returned an error: {response.error.message}"
+                    )
                 merge_metadata(response.result, request)
                 # For task status updates, we need to propagate metadata and provide
                 # a unique message id.
                 if (hasattr(response.result, 'status') and
-                    hasattr(response.result.status, 'merge') and
+                    hasattr(response.result.status, 'message') and
                     response.result.status.message):
                     merge_metadata(response.result.status.message, request.message)
                     m = response.result.status.message
@@ -61,28 +69,50 @@ class RemoteAgentConnections:
                     m.metadata['message_id'] = str(uuid.uuid4())
                 if task_callback:
                     task = task_callback(response.result, self.card)
+                else:
+                    apply_event(task, response.result)
                 if hasattr(response.result, 'final') and response.result.final:
                     break
-                return task
-            else:
-                response = await self.agent_client.send_task(request.model_dump())
-                merge_metadata(response.result, request)
-                # For task status updates, we need to propagate metadata and provide
-                # a unique message id.
-                if (hasattr(response.result, 'status') and
-                    hasattr(response.result.status, 'message') and
-                    response.result.status.message):
-                    merge_metadata(response.result.status.message, request.message)
-                    m = response.result.status.message
-                    if not m.metadata:
-                        m.metadata = {}
-                    if 'message_id' in m.metadata:
-                        m.metadata['last_message_id'] = m.metadata['message_id']
-                    m.metadata['message_id'] = str(uuid.uuid4())
-                
-                if task_callback:
-                    task_callback(response.result, self.card)
-                return response.result
+            return task
+        else:
+            response = await self.agent_client.send_task(request.model_dump())
+            if response.error:
+                # e.g. the agent is busy or rate limits the client
+                raise ValueError(
+                    f"Agent {self.card.name} returned an error: {response.error.message}"
+                )
+            merge_metadata(response.result, request)
+            # For task status updates, we need to propagate metadata and provide
+            # a unique message id.
+            if (hasattr(response.result, 'status') and
+                hasattr(response.result.status, 'message') and
+                response.result.status.message):
+                merge_metadata(response.result.status.message, request.message)
+                m = response.result.status.message
+                if not m.metadata:
+                    m.metadata = {}
+                if 'message_id' in m.metadata:
+                    m.metadata['last_message_id'] = m.metadata['message_id']
+                m.metadata['message_id'] = str(uuid.uuid4())
+
+            if task_callback:
+                task_callback(response.result, self.card)
+            return response.result
+
+def apply_event(task: Task, event: TaskStatusUpdateEvent | TaskArtifactUpdateEvent):
+    """Updates a task with a streamed event, for callers without a task callback"""
+    if isinstance(event, TaskStatusUpdateEvent):
+        task.status = event.status
+        if event.status.message:
+            task.history.append(event.status.message)
+    elif isinstance(event, TaskArtifactUpdateEvent):
+        artifact = event.artifact
+        if task.artifacts is None:
+            task.artifacts = []
+        if artifact.append and len(task.artifacts) > artifact.index:
+            task.artifacts[artifact.index].parts.extend(artifact.parts)
+        else:
+            task.artifacts.append(artifact)
 
 def merge_metadata(target, source):
     if not hasattr(target, 'metadata') or not hasattr(source, 'metadata'):
@@ -1,19 +1,27 @@
 import asyncio
+import contextlib
 import json
 import uuid
 import os
 import logging
+import time
 from typing import Dict, Any, List, Optional
 
-from common.client import A2AClient, A2ACardResolver
+import httpx
+
+from common.client import A2AClient, A2ACardResolver, LoopbackA2AClient
+from common.server import TaskManager
 from common.types import (
+    AgentCard,
     TaskSendParams,
     Message,
     TextPart,
     DataPart,
     TaskState,
     Task,
-    PushNotificationConfig
+    TaskStatusUpdateEvent,
+    PushNotificationConfig,
+    ServerBusyError
 )
 from core.models import SQLResultMessage
 
@@ -30,14 +38,39 @@ class SQLExcelWorkflow:
     4. Returns Excel file to user
     """
     
-    def __init__(self, sql_agent_url: str, excel_agent_url: str, output_dir: str = None):
+    # Seconds a chunk is sent again while the Excel Agent is busy before the
+    # query fails
+    CHUNK_RETRY_TIMEOUT = 120.0
+    
+    def __init__(
+        self,
+        sql_agent_url: str,
+        excel_agent_url: str,
+        output_dir: str = None,
+        sql_agent_card: Optional[AgentCard] = None,
+        excel_agent_card: Optional[AgentCard] = None,
+        httpx_client: Optional[httpx.AsyncClient] = None,
+        sql_client: Optional[A2AClient] = None,
+        excel_client: Optional[A2AClient] = None
+    ):
         """
         Initialize the workflow with agent URLs
         
+        Prefer `await SQLExcelWorkflow.create(...)`, which fetches the agent
+        cards without blocking the event loop.
+        
         Args:
             sql_agent_url: URL of the SQL Agent
             excel_agent_url: URL of the Excel Agent
             output_dir: Directory to save output files
+            sql_agent_card: Card of the SQL Agent, fetched if not given
+            excel_agent_card: Card of the Excel Agent, fetched if not given
+            httpx_client: Connection pool shared by both agent clients, which
+                the workflow closes in `aclose`
+            sql_client: Client of the SQL Agent, used instead of one built from
+                its card
+            excel_client: Client of the Excel Agent, used instead of one built
+                from its card
         """
         self.sql_agent_url = sql_agent_url
         self.excel_agent_url = excel_agent_url
@@ -48,22 +81,230 @@ class SQLExcelWorkflow:
         self.sql_card_resolver = A2ACardResolver(sql_agent_url)
         self.excel_card_resolver = A2ACardResolver(excel_agent_url)
         
-        self.sql_client = A2AClient(self.sql_card_resolver.get_agent_card())
-        self.excel_client = A2AClient(self.excel_card_resolver.get_agent_card())
+        self.httpx_client = httpx_client
+        self.sql_client = sql_client or A2AClient(
+            sql_agent_card or self.sql_card_resolver.get_agent_card(), httpx_client=httpx_client
+        )
+        self.excel_client = excel_client or A2AClient(
+            excel_agent_card or self.excel_card_resolver.get_agent_card(), httpx_client=httpx_client
+        )
         
         logger.info(f"Initialized SQL-Excel workflow with SQL agent at {sql_agent_url} and Excel agent at {excel_agent_url}")
     
-    async def process_query(self, query: str, format_options: Dict[str, Any] = None) -> Dict[str, Any]:
+    @classmethod
+    async def create(
+        cls,
+        sql_agent_url: str,
+        excel_agent_url: str,
+        output_dir: str = None,
+        timeout: float = 30.0
+    ) -> "SQLExcelWorkflow":
+        """
+        Create a workflow, resolving both agent cards concurrently
+        
+        Both agent clients share one connection pool for the lifetime of the
+        workflow, so each question only pays for the agent work. Close the
+        workflow with `aclose()` or use it as `async with`.
+        
+        Args:
+            sql_agent_url: URL of the SQL Agent
+            excel_agent_url: URL of the Excel Agent
+            output_dir: Directory to save output files
+            timeout: Timeout of each HTTP request in seconds
+        """
+        httpx_client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        try:
+            sql_agent_card, excel_agent_card = await asyncio.gather(
+                A2ACardResolver(sql_agent_url).get_agent_card_async(httpx_client),
+                A2ACardResolver(excel_agent_url).get_agent_card_async(httpx_client)
+            )
+        except BaseException:
+            await httpx_client.aclose()
+            raise
+        return cls(
+            sql_agent_url,
+            excel_agent_url,
+            output_dir,
+            sql_agent_card=sql_agent_card,
+            excel_agent_card=excel_agent_card,
+            httpx_client=httpx_client
+        )
+    
+    @classmethod
+    def embedded(
+        cls,
+        sql_task_manager: TaskManager,
+        excel_task_manager: TaskManager,
+        output_dir: str = None
+    ) -> "SQLExcelWorkflow":
+        """
+        Create a workflow that calls the task managers of both agents in this
+        process, without servers, HTTP or JSON in between
+        
+        Args:
+            sql_task_manager: Task manager of the SQL Agent
+            excel_task_manager: Task manager of the Excel Agent
+            output_dir: Directory to save output files
+        """
+        return cls(
+            LoopbackA2AClient.URL,
+            LoopbackA2AClient.URL,
+            output_dir,
+            sql_client=LoopbackA2AClient(sql_task_manager),
+            excel_client=LoopbackA2AClient(excel_task_manager)
+        )
+    
+    async def aclose(self):
+        """Close the connections to both agents"""
+        await self.sql_client.aclose()
+        await self.excel_client.aclose()
+        if self.httpx_client is not None:
+            await self.httpx_client.aclose()
+    
+    async def __aenter__(self) -> "SQLExcelWorkflow":
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+    
+    async def process_query(
+        self,
+        query: str,
+        format_options: Dict[str, Any] = None,
+        pipeline: bool = False,
+        stream: bool = False
+    ) -> Dict[str, Any]:
         """
         Process a natural language query through the workflow
         
         Args:
             query: Natural language query for SQL database
             format_options: Optional formatting options for Excel output
+            pipeline: Only pass a handle to the result from the SQL Agent to the
+                Excel Agent, which reads the rows from the database itself. The
+                Excel Agent must be started with database exports enabled.
+            stream: Forward the result rows to the Excel Agent in chunks as the
+                SQL Agent reads them, so that the file is written while the query
+                runs and the full result is held nowhere
             
         Returns:
-            Dictionary with results including file paths
+            Dictionary with results including file paths, and the seconds spent
+            in each agent under "timings"
+        """
+        if pipeline and stream:
+            raise ValueError("pipeline and stream cannot be combined")
+        return await self._process_query(query, format_options, pipeline, stream=stream)
+    
+    async def process_queries(
+        self,
+        queries: List[str],
+        format_options: Dict[str, Any] = None,
+        pipeline: bool = False,
+        max_sql_concurrency: int = 4,
+        max_excel_concurrency: int = 4,
+        stream: bool = False
+    ) -> List[Dict[str, Any]]:
         """
+        Process many natural language queries through the workflow concurrently
+        
+        Each agent works on a bounded number of queries at a time. A query
+        moves on to the Excel Agent as soon as the SQL Agent is done with it,
+        which frees the SQL slot for the next query, so both agents stay busy.
+        Identical queries, ignoring surrounding whitespace, are processed once.
+        
+        Args:
+            queries: Natural language queries for SQL database
+            format_options: Optional formatting options for Excel output
+            pipeline: See `process_query`
+            stream: See `process_query`. A streamed query holds a slot of both
+                agents until its file is written.
+            max_sql_concurrency: Queries processed by the SQL Agent at once
+            max_excel_concurrency: Queries processed by the Excel Agent at once
+            
+        Returns:
+            One result per query, in the order of `queries`, as returned by
+            `process_query`. Results of repeated queries are marked "duplicate".
+        """
+        if pipeline and stream:
+            raise ValueError("pipeline and stream cannot be combined")
+        sql_slots = asyncio.Semaphore(max_sql_concurrency)
+        excel_slots = asyncio.Semaphore(max_excel_concurrency)
+        unique_queries = list(dict.fromkeys(query.strip() for query in queries))
+        logger.info(f"Processing {len(unique_queries)} unique of {len(queries)} queries")
+        
+        results = await asyncio.gather(
+            *(
+                self._process_query(
+                    query, format_options, pipeline, sql_slots, excel_slots, stream
+                )
+                for query in unique_queries
+            ),
+            return_exceptions=True
+        )
+        results_by_query = {}
+        for query, result in zip(unique_queries, results):
+            # A cancelled query returns a CancelledError, which is no Exception
+            if isinstance(result, BaseException):
+                logger.error(f"Workflow failed for query {query}: {result!r}")
+                result = {
+                    "success": False, "query": query, "error": str(result) or type(result).__name__
+                }
+            results_by_query[query] = result
+        
+        batch_results = []
+        seen = set()
+        for query in queries:
+            result = results_by_query[query.strip()]
+            if query.strip() in seen:
+                result = {**result, "duplicate": True}
+            seen.add(query.strip())
+            batch_results.append(result)
+        return batch_results
+    
+    async def _process_query(
+        self,
+        query: str,
+        format_options: Dict[str, Any],
+        pipeline: bool,
+        sql_slots: Optional[asyncio.Semaphore] = None,
+        excel_slots: Optional[asyncio.Semaphore] = None,
+        stream: bool = False
+    ) -> Dict[str, Any]:
+        """Run a query through both agents, each stage holding a slot of its
+        agent's semaphore if given, and record how long each stage took"""
+        started = time.perf_counter()
+        timings = {}
+        if stream:
+            result = await self._run_streamed_stages(
+                query, format_options,
+                sql_slots or contextlib.nullcontext(),
+                excel_slots or contextlib.nullcontext(),
+                timings
+            )
+        else:
+            result = await self._run_stages(
+                query, format_options, pipeline,
+                sql_slots or contextlib.nullcontext(),
+                excel_slots or contextlib.nullcontext(),
+                timings
+            )
+        timings["total_seconds"] = round(time.perf_counter() - started, 3)
+        result.setdefault("query", query)
+        result["timings"] = timings
+        return result
+    
+    async def _run_stages(
+        self,
+        query: str,
+        format_options: Dict[str, Any],
+        pipeline: bool,
+        sql_slot,
+        excel_slot,
+        timings: Dict[str, float]
+    ) -> Dict[str, Any]:
         # Step 1: Create a unique session ID for this workflow run
         session_id = str(uuid.uuid4())
         task_id = str(uuid.uuid4())
@@ -71,7 +312,10 @@ class SQLExcelWorkflow:
         logger.info(f"Starting workflow session {session_id} with query: {query}")
         
         # Step 2: Send query to SQL Agent
-        sql_result = await self._send_to_sql_agent(query, session_id, task_id)
+        async with sql_slot:
+            stage_started = time.perf_counter()
+            sql_result = await self._send_to_sql_agent(query, session_id, task_id, pipeline)
+            timings["sql_seconds"] = round(time.perf_counter() - stage_started, 3)
         
         if not sql_result or "status" not in sql_result or sql_result["status"] != "completed":
             logger.error(f"SQL Agent failed to process query: {sql_result}")
@@ -93,13 +337,17 @@ class SQLExcelWorkflow:
             }
         
         # Step 4: Send to Excel Agent
-        excel_result = await self._send_to_excel_agent(
-            sql_data["query"],
-            sql_data["sql_query"],
-            sql_data["result"],
-            format_options,
-            session_id
-        )
+        async with excel_slot:
+            stage_started = time.perf_counter()
+            excel_result = await self._send_to_excel_agent(
+                sql_data.get("query", query),
+                sql_data["sql_query"],
+                sql_data["result"],
+                format_options,
+                session_id,
+                sql_data.get("result_handle")
+            )
+            timings["excel_seconds"] = round(time.perf_counter() - stage_started, 3)
         
         if not excel_result or "status" not in excel_result or excel_result["status"] != "completed":
             logger.error(f"Excel Agent failed to process data: {excel_result}")
@@ -121,8 +369,177 @@ class SQLExcelWorkflow:
             "excel_file": excel_file_info
         }
     
-    async def _send_to_sql_agent(self, query: str, session_id: str, task_id: str) -> Dict[str, Any]:
-        """Send query to SQL Agent and get results"""
+    async def _run_streamed_stages(
+        self,
+        query: str,
+        format_options: Dict[str, Any],
+        sql_slot,
+        excel_slot,
+        timings: Dict[str, float]
+    ) -> Dict[str, Any]:
+        """Run both agents at once, forwarding each chunk of the SQL result to
+        the Excel Agent as it arrives
+        
+        "sql_seconds" is the time until the last chunk was forwarded, and
+        "excel_seconds" the time the Excel Agent took to finish the file after.
+        """
+        session_id = str(uuid.uuid4())
+        logger.info(f"Starting streamed workflow session {session_id} with query: {query}")
+        
+        async with sql_slot, excel_slot:
+            stage_started = time.perf_counter()
+            try:
+                sql_data, excel_task = await self._forward_chunks(
+                    query, format_options, session_id
+                )
+            except Exception as e:
+                logger.error(f"Error streaming SQL result to Excel Agent: {e}")
+                return {
+                    "success": False,
+                    "error": "Failed to stream SQL result to Excel Agent",
+                    "details": str(e)
+                }
+            timings["sql_seconds"] = round(time.perf_counter() - stage_started, 3)
+            
+            stage_started = time.perf_counter()
+            try:
+                excel_task = await self._wait_for_task(self.excel_client, excel_task)
+                excel_result = {"status": excel_task.status.state, "task": excel_task}
+            except Exception as e:
+                logger.error(f"Error waiting for Excel Agent: {e}")
+                excel_result = {"status": "error", "error": str(e)}
+            timings["excel_seconds"] = round(time.perf_counter() - stage_started, 3)
+        
+        if excel_result["status"] != "completed":
+            logger.error(f"Excel Agent failed to process data: {excel_result}")
+            return {
+                "success": False,
+                "error": "Excel Agent failed to process data",
+                "sql_data": sql_data,
+                "excel_result": excel_result
+            }
+        
+        return {
+            "success": True,
+            "query": query,
+            "sql_data": sql_data,
+            "excel_file": self._extract_excel_file_info(excel_result)
+        }
+    
+    async def _forward_chunks(
+        self, query: str, format_options: Dict[str, Any], session_id: str
+    ) -> tuple[Dict[str, Any], Task]:
+        """Subscribe to the SQL Agent's result chunks and send each one to the
+        Excel Agent as a chunk of a single task
+        
+        The next chunk is only read once the Excel Agent has taken the last
+        one, so neither agent runs ahead of the other. Returns the SQL data,
+        without rows, and the Excel task. If forwarding fails after the
+        first chunk, the Excel task is cancelled.
+        """
+        sql_params = TaskSendParams(
+            id=str(uuid.uuid4()),
+            sessionId=session_id,
+            message=Message(role="user", parts=[TextPart(text=query)]),
+            acceptedOutputModes=["text", "data"],
+            metadata={"result_mode": "stream"}
+        )
+        excel_task_id = str(uuid.uuid4())
+        sql_data = {
+            "query": query,
+            "sql_query": "",
+            "result": [],
+            "metadata": {"row_count": 0, "result_mode": "stream"}
+        }
+        chunk_index = 0
+        
+        try:
+            events = self.sql_client.send_task_streaming(sql_params)
+            async with contextlib.aclosing(events):
+                async for response in events:
+                    if response.error:
+                        raise RuntimeError(f"{response.error.message} ({response.error.code})")
+                    event = response.result
+                    if isinstance(event, TaskStatusUpdateEvent):
+                        if event.final and event.status.state != TaskState.COMPLETED:
+                            raise RuntimeError(f"SQL Agent task ended in state {event.status.state}")
+                        continue
+                
+                    data = next((part.data for part in event.artifact.parts if part.type == "data"), {})
+                    rows = data.get("result", [])
+                    excel_request = {"result": rows}
+                    if chunk_index == 0:
+                        sql_data["sql_query"] = data.get("sql_query", "")
+                        excel_request.update(
+                            query=query,
+                            sql_query=sql_data["sql_query"],
+                            format_options=format_options or {}
+                        )
+                    response = await self._send_chunk(
+                        TaskSendParams(
+                            id=excel_task_id,
+                            sessionId=session_id,
+                            message=Message(role="user", parts=[DataPart(data=excel_request)]),
+                            acceptedOutputModes=["text", "file"],
+                            metadata={"chunk_index": chunk_index, "last_chunk": bool(event.artifact.lastChunk)}
+                        )
+                    )
+                    if response.error:
+                        raise RuntimeError(f"{response.error.message} ({response.error.code})")
+                    excel_task = response.result
+                    sql_data["metadata"]["row_count"] += len(rows)
+                    chunk_index += 1
+                    if event.artifact.lastChunk:
+                        logger.info(f"Forwarded {sql_data['metadata']['row_count']} rows in {chunk_index} chunks")
+                        return sql_data, excel_task
+        
+            raise RuntimeError("SQL Agent ended the stream before the last chunk")
+        except BaseException:
+            if chunk_index > 0:
+                # Do not leave the export waiting for chunks that never come
+                await self._cancel_excel_task(excel_task_id)
+            raise
+    
+    async def _cancel_excel_task(self, task_id: str):
+        """Cancel a chunked Excel task, which ends its export"""
+        try:
+            response = await self.excel_client.cancel_task({"id": task_id})
+            if response.error:
+                logger.error(f"Excel Agent did not cancel task {task_id}: {response.error.message}")
+        except Exception as e:
+            logger.error(f"Error cancelling Excel Agent task {task_id}: {e}")
+    
+    async def _send_chunk(
+        self,
+        task_params: TaskSendParams,
+        retry_interval: float = 0.1,
+        max_retry_interval: float = 2.0
+    ):
+        """Send a chunk to the Excel Agent, and again with a growing interval
+        while it is busy writing the previous ones
+        
+        Gives up after `CHUNK_RETRY_TIMEOUT` seconds and returns the last
+        ServerBusyError, which fails the query.
+        """
+        deadline = time.monotonic() + self.CHUNK_RETRY_TIMEOUT
+        while True:
+            response = await self.excel_client.send_task(task_params)
+            if not response.error or response.error.code != ServerBusyError().code:
+                return response
+            if time.monotonic() + retry_interval > deadline:
+                logger.error(
+                    f"Excel Agent was busy for {self.CHUNK_RETRY_TIMEOUT} seconds, giving up on "
+                    f"chunk {task_params.metadata['chunk_index']} of task {task_params.id}"
+                )
+                return response
+            await asyncio.sleep(retry_interval)
+            retry_interval = min(retry_interval * 2, max_retry_interval)
+    
+    async def _send_to_sql_agent(
+        self, query: str, session_id: str, task_id: str, pipeline: bool = False
+    ) -> Dict[str, Any]:
+        """Send query to SQL Agent and get results, or only a handle to them
+        in pipeline mode"""
         logger.info(f"Sending query to SQL Agent: {query}")
         
         message = Message(
@@ -134,11 +551,12 @@ class SQLExcelWorkflow:
             id=task_id,
             sessionId=session_id,
             message=message,
-            acceptedOutputModes=["text", "data"]
+            acceptedOutputModes=["text", "data"],
+            metadata={"result_mode": "handle"} if pipeline else None
         )
         
         try:
-            task = await self.sql_client.send_task(task_params)
+            task = await self._run_task(self.sql_client, task_params)
             logger.info(f"SQL Agent task completed with status: {task.status.state}")
             
             return {
@@ -152,6 +570,41 @@ class SQLExcelWorkflow:
                 "error": str(e)
             }
     
+    async def _run_task(
+        self,
+        client: A2AClient,
+        task_params: TaskSendParams,
+        poll_interval: float = 0.5,
+        max_poll_interval: float = 5.0
+    ) -> Task:
+        """Send a task and poll it until it is no longer submitted or working
+        
+        Agents that process tasks in the background answer tasks/send with the
+        task still in the working state.
+        """
+        response = await client.send_task(task_params)
+        if response.error:
+            raise RuntimeError(f"{response.error.message} ({response.error.code})")
+        return await self._wait_for_task(client, response.result, poll_interval, max_poll_interval)
+    
+    async def _wait_for_task(
+        self,
+        client: A2AClient,
+        task: Task,
+        poll_interval: float = 0.5,
+        max_poll_interval: float = 5.0
+    ) -> Task:
+        """Poll a task until it is no longer submitted or working"""
+        while task.status.state in (TaskState.SUBMITTED, TaskState.WORKING):
+            await asyncio.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, max_poll_interval)
+            response = await client.get_task({"id": task.id})
+            if response.error:
+                raise RuntimeError(f"{response.error.message} ({response.error.code})")
+            task = response.result
+        
+        return task
+    
     def _extract_sql_result(self, sql_result: Dict[str, Any]) -> Dict[str, Any]:
         """Extract query result from SQL Agent response"""
         task = sql_result.get("task")
@@ -181,6 +634,8 @@ class SQLExcelWorkflow:
                         data["sql_query"] = part.data["sql_query"]
                         data["result"] = part.data["result"]
                         data["metadata"] = part.data.get("metadata", {})
+                        if part.data.get("result_handle"):
+                            data["result_handle"] = part.data["result_handle"]
         
         # If we don't have a query yet, try to get it from the task message
         if "query" not in data and task.status.message:
@@ -197,11 +652,10 @@ class SQLExcelWorkflow:
         sql_query: str, 
         result: List[Dict[str, Any]],
         format_options: Dict[str, Any], 
-        session_id: str
+        session_id: str,
+        result_handle: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        """Send SQL result to Excel Agent for processing"""
-        logger.info(f"Sending SQL result to Excel Agent with {len(result)} records")
-        
+        """Send SQL result, or a handle to it, to Excel Agent for processing"""
         # Prepare the request data
         excel_request = {
             "query": query,
@@ -209,6 +663,11 @@ class SQLExcelWorkflow:
             "result": result,
             "format_options": format_options or {}
         }
+        if result_handle:
+            logger.info("Sending SQL result handle to Excel Agent")
+            excel_request["result_handle"] = result_handle
+        else:
+            logger.info(f"Sending SQL result to Excel Agent with {len(result)} records")
         
         task_id = str(uuid.uuid4())
         message = Message(
@@ -224,7 +683,7 @@ class SQLExcelWorkflow:
         )
         
         try:
-            task = await self.excel_client.send_task(task_params)
+            task = await self._run_task(self.excel_client, task_params)
             logger.info(f"Excel Agent task completed with status: {task.status.state}")
             
             return {
@@ -272,20 +731,26 @@ if __name__ == "__main__":
     parser.add_argument("--excel-agent", default="http://localhost:10001", help="Excel Agent URL")
     parser.add_argument("--query", required=True, help="Natural language query to process")
     parser.add_argument("--output", default="./outputs", help="Output directory")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--pipeline", action="store_true",
+                      help="Let the Excel Agent read the rows from the database")
+    mode.add_argument("--stream", action="store_true",
+                      help="Forward the rows to the Excel Agent in chunks as they are read")
     
     args = parser.parse_args()
     
     async def main():
-        workflow = SQLExcelWorkflow(
+        async with await SQLExcelWorkflow.create(
             sql_agent_url=args.sql_agent,
             excel_agent_url=args.excel_agent,
             output_dir=args.output
-        )
-        
-        result = await workflow.process_query(
-            query=args.query,
-            format_options={"style_template": "professional"}
-        )
+        ) as workflow:
+            result = await workflow.process_query(
+                query=args.query,
+                format_options={"style_template": "professional"},
+                pipeline=args.pipeline,
+                stream=args.stream
+            )
         
         print(json.dumps(result, indent=2))
     
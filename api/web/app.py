@@ -89,7 +89,8 @@ async def send_query(query_text, session_id):
     
     # Send the task to the agent
     try:
-        response = await client.send_task(payload)
+        async with client:
+            response = await client.send_task(payload)
         
         if response.result and response.result.artifacts:
             # Process the artifacts and extract the results
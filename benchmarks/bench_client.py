@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+A2A client connection benchmark
+
+Starts an A2AServer with uvicorn on a local port and sends tasks/get
+requests to it three ways: with a new httpx client per call, as A2AClient
+did before it pooled connections, with one pooled A2AClient one call after
+the other, and with the pooled client and 20 calls at a time.
+
+Usage:
+  python benchmarks/bench_client.py
+  python benchmarks/bench_client.py --calls 5000 --port 18123
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "api")]
+
+import httpx
+import uvicorn
+
+from common.client import A2AClient
+from common.server import A2AServer
+from common.server.task_manager import InMemoryTaskManager
+from common.types import AgentCapabilities, AgentCard, GetTaskRequest
+
+
+class TaskManager(InMemoryTaskManager):
+    async def on_send_task(self, request):
+        raise NotImplementedError
+
+    async def on_send_task_subscribe(self, request):
+        raise NotImplementedError
+
+
+def start_server(port: int):
+    server = A2AServer(
+        agent_card=AgentCard(
+            name="Bench", url=f"http://127.0.0.1:{port}/", version="1.0.0",
+            capabilities=AgentCapabilities(), skills=[],
+        ),
+        task_manager=TaskManager(),
+    )
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning")
+    uvicorn_server = uvicorn.Server(config)
+    threading.Thread(target=uvicorn_server.run, daemon=True).start()
+    while not uvicorn_server.started:
+        time.sleep(0.05)
+
+
+async def client_per_call(url: str, calls: int):
+    payload = GetTaskRequest(params={"id": "missing"}).model_dump()
+    for _ in range(calls):
+        async with httpx.AsyncClient() as client:
+            response = await client.post(url, json=payload, timeout=30)
+            response.json()
+
+
+async def pooled_client(url: str, calls: int):
+    async with A2AClient(url=url) as client:
+        for _ in range(calls):
+            await client.get_task({"id": "missing"})
+
+
+async def pooled_client_concurrent(url: str, calls: int, concurrency: int = 20):
+    async with A2AClient(url=url) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call():
+            async with semaphore:
+                await client.get_task({"id": "missing"})
+
+        await asyncio.gather(*(call() for _ in range(calls)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A2A client connection benchmark")
+    parser.add_argument("--calls", type=int, default=2000, help="Calls per variant")
+    parser.add_argument("--port", type=int, default=18123, help="Port of the benchmark server")
+    args = parser.parse_args()
+
+    start_server(args.port)
+    url = f"http://127.0.0.1:{args.port}/"
+    for variant in (client_per_call, pooled_client, pooled_client_concurrent):
+        started = time.perf_counter()
+        asyncio.run(variant(url, args.calls))
+        calls_per_second = args.calls / (time.perf_counter() - started)
+        print(f"{variant.__name__:26s} {calls_per_second:8.0f} calls/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Excel generation benchmark
+
+Generates files from synthetic results through ExcelAgent.process_request and
+reports the time and the peak memory each run adds. Each run is a separate
+process, so peak memory is not carried over from the previous one. With
+--profile, also times profile_columns, which picks the column widths and
+number formats, on a 1,000-row sample of a 200-column result.
+
+Usage:
+  python benchmarks/bench_excel.py
+  python benchmarks/bench_excel.py --rows 10000 100000 --engines xlsxwriter openpyxl
+  python benchmarks/bench_excel.py --formats csv parquet --profile
+"""
+
+import argparse
+import datetime
+import decimal
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "api"), os.path.join(ROOT, "api", "agents")]
+
+
+def create_rows(count: int):
+    random.seed(0)
+    return [
+        {
+            "id": i,
+            "name": f"user_{i}",
+            "email": f"user{i}@example.com",
+            "amount": random.random() * 1000,
+            "active": i % 3 == 0,
+            "created": "2021-03-15 10:00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def run_once(rows: int, engine: str, output_format: str, style: str):
+    """Generates one file and prints its timing, in the current process"""
+    from core.models import ExcelRequestMessage
+    from excel_agent.agent import ExcelAgent
+
+    if output_format in ("parquet", "arrow"):
+        # Imported on first use, which is not what is measured
+        import pyarrow  # noqa: F401
+    agent = ExcelAgent(tempfile.mkdtemp(), cache_exports=False)
+    request = ExcelRequestMessage(
+        query="benchmark",
+        sql_query="SELECT * FROM benchmark",
+        result=create_rows(rows),
+        format_options={"style_template": style, "engine": engine, "output_format": output_format},
+    )
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    response = agent.process_request(request)
+    seconds = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    size = os.path.getsize(response["content"]["file_path"])
+    engine_name = engine if output_format == "xlsx" else ""
+    # ru_maxrss is in kilobytes on Linux
+    print(
+        f"{output_format:8s} {engine_name:10s} {rows:>9,d} rows  {seconds:8.2f} s  "
+        f"peak +{(rss_after - rss_before) / 1024:6.0f} MB  file {size / 1e6:7.1f} MB"
+    )
+
+
+def profile_sample(columns: int = 200, sample_rows: int = 1000, repeat: int = 10):
+    from excel_agent.writers import _cell_value, profile_columns
+
+    random.seed(1)
+
+    def value(column, row):
+        kind = column % 5
+        if kind == 0:
+            return row * 1000 + column
+        if kind == 1:
+            return round(random.random() * 1e4, 2)
+        if kind == 2:
+            return f"name {random.randint(0, 10 ** random.randint(1, 12))}"
+        if kind == 3:
+            return datetime.date(2020, 1, 1) + datetime.timedelta(days=row % 900)
+        return None if row % 7 == 0 else decimal.Decimal(f"{row}.{column % 100:02d}")
+
+    names = [f"col_{column}" for column in range(columns)]
+    sample = [
+        [_cell_value(value(column, row)) for column in range(columns)] for row in range(sample_rows)
+    ]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        profile_columns(names, sample)
+    milliseconds = (time.perf_counter() - started) / repeat * 1000
+    print(
+        f"profile_columns: {milliseconds:.1f} ms per {sample_rows:,d}-row sample "
+        f"of {columns} columns"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Excel generation benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--engines", nargs="+", default=["xlsxwriter", "openpyxl"],
+                        help="xlsx engines, used for the xlsx format only")
+    parser.add_argument("--formats", nargs="+", default=["xlsx"],
+                        help="Output formats: xlsx, csv, csv.gz, parquet, arrow")
+    parser.add_argument("--style", default="colorful", help="Style template")
+    parser.add_argument("--profile", action="store_true", help="Also time profile_columns")
+    parser.add_argument("--run-once", nargs=3, metavar=("ROWS", "ENGINE", "FORMAT"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_once:
+        rows, engine, output_format = args.run_once
+        run_once(int(rows), engine, output_format, args.style)
+        return
+
+    for output_format in args.formats:
+        engines = args.engines if output_format == "xlsx" else ["xlsxwriter"]
+        for engine in engines:
+            for rows in args.rows:
+                subprocess.run(
+                    [sys.executable, __file__, "--style", args.style,
+                     "--run-once", str(rows), engine, output_format],
+                    check=True,
+                )
+    if args.profile:
+        profile_sample()
+
+
+if __name__ == "__main__":
+    main()
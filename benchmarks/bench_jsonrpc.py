@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+JSON-RPC round trip benchmark
+
+Sends tasks/send requests whose message carries a payload of the given size
+to an A2AServer through an in-process ASGI transport. The task manager echoes
+the payload back as an artifact, so the time is spent parsing, validating
+and serializing the request and the response.
+
+Usage:
+  python benchmarks/bench_jsonrpc.py
+  python benchmarks/bench_jsonrpc.py --sizes 1000 10000000 --repeat 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "api")]
+
+import httpx
+
+from common.server import A2AServer
+from common.server.task_manager import InMemoryTaskManager
+from common.types import (
+    AgentCapabilities,
+    AgentCard,
+    Artifact,
+    SendTaskRequest,
+    SendTaskResponse,
+    TaskState,
+    TaskStatus,
+)
+
+
+class EchoTaskManager(InMemoryTaskManager):
+    """Completes each task with the parts of its message as the artifact"""
+
+    async def on_send_task(self, request):
+        await self.upsert_task(request.params)
+        task = await self.update_store(
+            request.params.id,
+            TaskStatus(state=TaskState.COMPLETED),
+            [Artifact(parts=request.params.message.parts)],
+        )
+        return SendTaskResponse(id=request.id, result=task)
+
+    async def on_send_task_subscribe(self, request):
+        raise NotImplementedError
+
+
+def create_request(size: int) -> bytes:
+    request = SendTaskRequest(
+        params={
+            "id": uuid.uuid4().hex,
+            "message": {"role": "user", "parts": [{"type": "text", "text": "x" * size}]},
+        }
+    )
+    return request.model_dump_json().encode()
+
+
+async def measure(size: int, repeat: int) -> float:
+    """Returns the median seconds per request"""
+    server = A2AServer(
+        agent_card=AgentCard(
+            name="Echo", url="http://bench/", version="1.0.0",
+            capabilities=AgentCapabilities(), skills=[],
+        ),
+        task_manager=EchoTaskManager(),
+    )
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        timings = []
+        for _ in range(repeat):
+            body = create_request(size)
+            started = time.perf_counter()
+            response = await client.post("/", content=body)
+            response.json()
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON-RPC round trip benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 1_000_000, 50_000_000],
+                        help="Payload sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=20, help="Requests per size")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        seconds = asyncio.run(measure(size, args.repeat))
+        print(f"{size:>12,d} bytes  {seconds * 1000:10.2f} ms per request (median of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
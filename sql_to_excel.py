@@ -11,6 +11,8 @@ It automates the process of:
 
 Usage:
   python sql_to_excel.py --query "Show me all users who joined after 2020"
+  python sql_to_excel.py --queries-file reports.txt --concurrency 8
+  python sql_to_excel.py --query "Show me all orders" --embedded
 """
 
 import os
@@ -23,12 +25,17 @@ import time
 import signal
 import atexit
 from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
 import shutil
 
+import httpx
+
 # Add the project root to Python path
 sys.path.append(os.path.abspath("."))
 
 from api.hosts.multiagent.sql_excel_workflow import SQLExcelWorkflow
+from api.common.utils.blob_store import BlobStore
 
 # Global process references for cleanup
 sql_agent_process = None
@@ -47,8 +54,36 @@ def cleanup_processes():
 # Register cleanup function
 atexit.register(cleanup_processes)
 
-def start_agent_servers(args):
-    """Start the SQL and Excel agent servers as background processes"""
+async def wait_for_agent(client, name, url, process, deadline, initial_delay=0.05, max_delay=2.0):
+    """Poll an agent's readiness endpoint with exponential backoff until it
+    reports ready, its process exits or the deadline passes"""
+    delay = initial_delay
+    while True:
+        try:
+            response = await client.get(url + "/health/ready")
+            if response.status_code == 200:
+                return
+            status = response.json().get("checks", response.text)
+        except (httpx.TransportError, ValueError) as e:
+            status = str(e) or type(e).__name__
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{name} exited with code {process.returncode}")
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"{name} at {url} not ready: {status}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+async def wait_for_agents(agents, timeout):
+    """Wait until all (name, url, process) agents are ready, polling them concurrently"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        await asyncio.gather(
+            *(wait_for_agent(client, name, url, process, deadline) for name, url, process in agents)
+        )
+
+async def start_agent_servers(args):
+    """Start the SQL and Excel agent servers as background processes and wait
+    until both are ready"""
     global sql_agent_process, excel_agent_process
     
     # Start SQL Agent
@@ -62,41 +97,126 @@ def start_agent_servers(args):
     # Start Excel Agent
     print(f"Starting Excel Agent on port {args.excel_port}...")
     excel_agent_process = subprocess.Popen(
-        [sys.executable, "-m", "api.agents.excel_agent", "--port", str(args.excel_port)],
+        [sys.executable, "-m", "api.agents.excel_agent", "--port", str(args.excel_port)]
+        + (["--database-exports"] if args.pipeline else []),
         stdout=subprocess.PIPE if not args.verbose else None,
         stderr=subprocess.PIPE if not args.verbose else None
     )
     
-    # Give the servers time to start up
-    print("Waiting for agents to start...")
-    time.sleep(5)
+    sql_url = f"http://localhost:{args.sql_port}"
+    excel_url = f"http://localhost:{args.excel_port}"
     
-    return (
-        f"http://localhost:{args.sql_port}",
-        f"http://localhost:{args.excel_port}"
+    print("Waiting for agents to start...")
+    started = time.monotonic()
+    await wait_for_agents(
+        [("SQL Agent", sql_url, sql_agent_process), ("Excel Agent", excel_url, excel_agent_process)],
+        args.startup_timeout
     )
+    print(f"Agents ready after {time.monotonic() - started:.1f}s")
+    
+    return sql_url, excel_url
 
-async def run_workflow(args, sql_url, excel_url):
-    """Run the SQL to Excel workflow"""
-    print(f"Processing query: {args.query}")
+def create_embedded_workflow(args):
+    """Build both agents in this process and connect the workflow to their
+    task managers directly"""
+    # Imported here, the agents' dependencies are only needed in embedded mode
+    from common.utils.push_notification_auth import PushNotificationSenderAuth
+    from sql_agent.agent import SQLAgent
+    from sql_agent.task_manager import AgentTaskManager
+    from excel_agent.agent import ExcelAgent
+    from excel_agent.task_manager import ExcelAgentTaskManager
     
-    # Create workflow instance
-    workflow = SQLExcelWorkflow(
+    # No push notifications are sent, the workflow polls the tasks
+    notification_sender_auth = PushNotificationSenderAuth()
+    output_dir = os.path.join(os.getcwd(), "outputs", "excel")
+    sql_task_manager = AgentTaskManager(
+        agent=SQLAgent(),
+        notification_sender_auth=notification_sender_auth
+    )
+    # Files are referenced by file URI and copied from where they were written
+    excel_task_manager = ExcelAgentTaskManager(
+        agent=ExcelAgent(output_dir, database_exports=args.pipeline),
+        notification_sender_auth=notification_sender_auth,
+        blob_store=BlobStore(output_dir)
+    )
+    return SQLExcelWorkflow.embedded(
+        sql_task_manager, excel_task_manager, output_dir=args.output_dir
+    )
+
+async def open_workflow(args, sql_url, excel_url):
+    """Create the workflow, calling the agents in this process with --embedded"""
+    if args.embedded:
+        return create_embedded_workflow(args)
+    return await SQLExcelWorkflow.create(
         sql_agent_url=sql_url,
         excel_agent_url=excel_url,
         output_dir=args.output_dir
     )
+
+async def run_workflow(args, sql_url, excel_url):
+    """Run the SQL to Excel workflow"""
+    print(f"Processing query: {args.query}")
     
-    # Process the query
-    result = await workflow.process_query(
-        query=args.query,
-        format_options={
-            "style_template": args.style,
-            "include_metadata": args.include_metadata
-        }
-    )
+    # Create workflow instance
+    async with await open_workflow(args, sql_url, excel_url) as workflow:
+        # Process the query
+        return await workflow.process_query(
+            query=args.query,
+            format_options={
+                "style_template": args.style,
+                "include_metadata": args.include_metadata
+            },
+            pipeline=args.pipeline,
+            stream=args.stream
+        )
+
+def read_queries_file(path):
+    """Read one query per line, skipping blank lines and # comments"""
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+async def run_batch_workflow(args, sql_url, excel_url, queries):
+    """Run the SQL to Excel workflow for many queries concurrently"""
+    print(f"Processing {len(queries)} queries, {args.concurrency} at a time per agent")
     
-    return result
+    async with await open_workflow(args, sql_url, excel_url) as workflow:
+        return await workflow.process_queries(
+            queries,
+            format_options={
+                "style_template": args.style,
+                "include_metadata": args.include_metadata
+            },
+            pipeline=args.pipeline,
+            stream=args.stream,
+            max_sql_concurrency=args.concurrency,
+            max_excel_concurrency=args.concurrency
+        )
+
+def print_timings(results):
+    """Print how long each query spent in each agent"""
+    print(f"\n{'SQL (s)':>9} {'Excel (s)':>9} {'Total (s)':>9}  Status  Query")
+    for result in results:
+        timings = result.get("timings", {})
+        if result.get("duplicate"):
+            status = "dup"
+        else:
+            status = "ok" if result.get("success") else "failed"
+        columns = [
+            f"{timings[key]:9.2f}" if key in timings else f"{'-':>9}"
+            for key in ("sql_seconds", "excel_seconds", "total_seconds")
+        ]
+        print(f"{' '.join(columns)}  {status:<6}  {result.get('query', '')}")
+
+def download_file(uri, dest_path):
+    """Stream a file from the Excel agent to dest_path"""
+    tmp_path = dest_path + ".part"
+    with httpx.stream("GET", uri, timeout=httpx.Timeout(30.0, read=None)) as response:
+        response.raise_for_status()
+        with open(tmp_path, "wb") as f:
+            for chunk in response.iter_bytes(chunk_size=1024 * 1024):
+                f.write(chunk)
+    os.replace(tmp_path, dest_path)
 
 def save_result_file(result, args):
     """Save the resulting file and return its path"""
@@ -110,31 +230,41 @@ def save_result_file(result, args):
         print("No Excel file found in result!")
         return None
     
+    # Create output directory
+    os.makedirs(args.output_dir, exist_ok=True)
+    
+    # Determine destination path
+    if args.output_file:
+        dest_path = args.output_file
+    else:
+        dest_path = os.path.join(args.output_dir, excel_file["name"])
+    
+    # Download the file if the Excel agent serves it by URI
+    if excel_file.get("uri", "").startswith("file:"):
+        # Written by the Excel agent embedded in this process
+        excel_file["file_path"] = url2pathname(urlparse(excel_file["uri"]).path)
+    elif excel_file.get("uri"):
+        print(f"Downloading Excel file to: {dest_path}")
+        try:
+            download_file(excel_file["uri"], dest_path)
+            return dest_path
+        except httpx.HTTPError as e:
+            print(f"Download failed ({e}), looking for a local copy")
+    
     # The file is already saved by the Excel agent
     # We just need to copy it to the final destination if needed
     source_path = None
+    blob_id = (excel_file.get("metadata") or {}).get("blob_id")
     if "file_path" in excel_file:
         source_path = excel_file["file_path"]
-    else:
-        # Search in outputs directory 
-        for root, _, files in os.walk(os.path.join(os.getcwd(), "outputs")):
-            if excel_file["name"] in files:
-                source_path = os.path.join(root, excel_file["name"])
-                break
+    elif blob_id:
+        # The Excel agent started by this script shares its output directory
+        source_path = BlobStore(os.path.join(os.getcwd(), "outputs", "excel")).resolve(blob_id)
     
     if not source_path or not os.path.exists(source_path):
         print(f"Could not find source file: {excel_file['name']}")
         return None
     
-    # Create output directory
-    os.makedirs(args.output_dir, exist_ok=True)
-    
-    # Determine destination path
-    if args.output_file:
-        dest_path = args.output_file
-    else:
-        dest_path = os.path.join(args.output_dir, excel_file["name"])
-    
     # Copy file
     print(f"Saving Excel file to: {dest_path}")
     shutil.copy2(source_path, dest_path)
@@ -143,7 +273,12 @@ def save_result_file(result, args):
 
 async def main():
     parser = argparse.ArgumentParser(description="SQL to Excel Workflow Runner")
-    parser.add_argument("--query", required=True, help="Natural language query to process")
+    queries_group = parser.add_mutually_exclusive_group(required=True)
+    queries_group.add_argument("--query", help="Natural language query to process")
+    queries_group.add_argument("--queries-file",
+                               help="File with one natural language query per line to process as a batch")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Queries each agent processes at once with --queries-file")
     parser.add_argument("--output-dir", default="./outputs", help="Output directory")
     parser.add_argument("--output-file", help="Output file path (if not specified, uses generated name)")
     parser.add_argument("--sql-port", type=int, default=10000, help="Port for SQL Agent server")
@@ -151,18 +286,42 @@ async def main():
     parser.add_argument("--style", choices=["default", "professional", "minimal", "colorful"], 
                         default="professional", help="Excel styling template")
     parser.add_argument("--include-metadata", action="store_true", help="Include metadata sheet in Excel file")
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument("--pipeline", action="store_true",
+                            help="Let the Excel Agent read the rows straight from the database")
+    mode_group.add_argument("--stream", action="store_true",
+                            help="Forward the rows to the Excel Agent in chunks while the query runs")
+    parser.add_argument("--embedded", action="store_true",
+                        help="Run both agents in this process instead of starting servers")
     parser.add_argument("--skip-server-start", action="store_true", 
                         help="Skip starting servers (assumes they're already running)")
+    parser.add_argument("--startup-timeout", type=float, default=60.0,
+                        help="Seconds to wait for the agent servers to become ready")
     parser.add_argument("--verbose", action="store_true", help="Show verbose output from agent servers")
     
     args = parser.parse_args()
+    if args.queries_file and args.output_file:
+        parser.error("--output-file cannot be used with --queries-file")
     
     try:
         sql_url = f"http://localhost:{args.sql_port}"
         excel_url = f"http://localhost:{args.excel_port}"
         
-        if not args.skip_server_start:
-            sql_url, excel_url = start_agent_servers(args)
+        if not args.skip_server_start and not args.embedded:
+            sql_url, excel_url = await start_agent_servers(args)
+        
+        if args.queries_file:
+            results = await run_batch_workflow(
+                args, sql_url, excel_url, read_queries_file(args.queries_file)
+            )
+            # Repeated queries share the file of their first occurrence
+            saved = [
+                save_result_file(result, args) for result in results if not result.get("duplicate")
+            ]
+            print_timings(results)
+            failed = saved.count(None)
+            print(f"\nSaved {len(saved) - failed} files to {args.output_dir}, {failed} queries failed.")
+            return 1 if failed else 0
         
         # Run the workflow
         result = await run_workflow(args, sql_url, excel_url)
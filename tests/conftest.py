@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The agents import the shared code as top-level packages (`common`, `core`)
+# and each other as `excel_agent` and `sql_agent`
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, "api"), os.path.join(ROOT, "api", "agents")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,40 @@
+import pytest
+
+from core.database import Database
+from core.sql_safety import is_single_select
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "SELECT 1",
+        "select id from orders;",
+        "WITH totals AS (SELECT 1 AS total) SELECT * FROM totals",
+        "SELECT replace(name, 'a', 'b') FROM users",
+        "SELECT 'a; DROP TABLE users' -- ; DELETE\n",
+    ],
+)
+def test_single_selects_are_accepted(query):
+    assert is_single_select(query)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "DELETE FROM orders",
+        "SELECT 1; DROP TABLE orders",
+        "WITH gone AS (DELETE FROM orders RETURNING *) SELECT * FROM gone",
+        "SELECT * INTO copy FROM orders",
+        "PRAGMA writable_schema = 1",
+    ],
+)
+def test_other_statements_are_rejected(query):
+    assert not is_single_select(query)
+
+
+def test_stream_query_refuses_writes_outside_postgresql():
+    database = Database("sqlite://")
+
+    assert list(database.stream_query("SELECT 1 AS one")) == [[{"one": 1}]]
+    with pytest.raises(ValueError):
+        list(database.stream_query("CREATE TABLE orders (id INTEGER)"))
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import queue
+
+import pytest
+
+from common.types import (
+    CancelTaskRequest,
+    DataPart,
+    Message,
+    SendTaskRequest,
+    SendTaskStreamingRequest,
+    TaskSendParams,
+)
+from common.utils.push_notification_auth import PushNotificationSenderAuth
+from core.models import ExcelRequestMessage
+from excel_agent.agent import ChunksCancelledError, ExcelAgent
+from excel_agent.task_manager import ExcelAgentTaskManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    notification_sender_auth = PushNotificationSenderAuth()
+    notification_sender_auth.generate_jwk()
+    return ExcelAgentTaskManager(ExcelAgent(str(tmp_path)), notification_sender_auth)
+
+
+def chunk_params(metadata, task_id="task"):
+    return TaskSendParams(
+        id=task_id,
+        message=Message(role="user", parts=[DataPart(data={"result": [{"id": 1}]})]),
+        metadata=metadata,
+    )
+
+
+@pytest.mark.parametrize(
+    "metadata, message",
+    [
+        ({"chunk_index": "one"}, "chunk_index"),
+        ({"chunk_index": -1}, "chunk_index"),
+        ({"chunk_index": True}, "chunk_index"),
+        ({"chunk_index": 1, "last_chunk": "false"}, "last_chunk"),
+    ],
+)
+def test_invalid_chunk_metadata_is_rejected(manager, metadata, message):
+    response = asyncio.run(manager.on_send_task(SendTaskRequest(params=chunk_params(metadata))))
+
+    assert response.error.code == -32602
+    assert message in response.error.message
+
+
+def test_chunk_of_an_unknown_task_is_rejected(manager):
+    response = asyncio.run(
+        manager.on_send_task(SendTaskRequest(params=chunk_params({"chunk_index": 1})))
+    )
+
+    assert response.error.code == -32602
+
+
+def test_chunk_is_rejected_as_busy_while_the_job_is_behind(manager):
+    chunks = queue.Queue(maxsize=manager.MAX_QUEUED_CHUNKS + 1)
+    for _ in range(manager.MAX_QUEUED_CHUNKS):
+        chunks.put([])
+    manager.chunk_queues["task"] = chunks
+    manager.next_chunk_index["task"] = 1
+
+    response = asyncio.run(
+        manager.on_send_task(SendTaskRequest(params=chunk_params({"chunk_index": 1})))
+    )
+
+    assert response.error.code == -32007
+    # The chunk can be sent again
+    assert manager.next_chunk_index["task"] == 1
+
+
+def test_subscriber_is_removed_when_submitting_fails(manager):
+    async def fail(request):
+        raise RuntimeError("submit failed")
+
+    manager._submit_task = fail
+    request = SendTaskStreamingRequest(params=chunk_params(None))
+
+    response = asyncio.run(manager.on_send_task_subscribe(request))
+
+    assert response.error.code == -32603
+    assert manager.task_sse_subscribers["task"] == []
+
+
+def test_cancelling_a_chunked_task_ends_its_export(manager):
+    chunks = queue.Queue(maxsize=manager.MAX_QUEUED_CHUNKS + 1)
+
+    async def run():
+        await manager.upsert_task(chunk_params({"chunk_index": 0}))
+        manager.chunk_queues["task"] = chunks
+        manager.next_chunk_index["task"] = 1
+        return await manager.on_cancel_task(CancelTaskRequest(params={"id": "task"}))
+
+    response = asyncio.run(run())
+
+    assert response.result.status.state == "canceled"
+    assert chunks.get_nowait() == ExcelAgent.CHUNKS_CANCELLED
+    assert "task" not in manager.chunk_queues
+
+
+def test_cancelled_chunks_stop_the_export_and_delete_its_file(tmp_path):
+    agent = ExcelAgent(str(tmp_path), cache_exports=False)
+    chunks = queue.Queue()
+    chunks.put([{"id": 1}])
+    chunks.put(ExcelAgent.CHUNKS_CANCELLED)
+
+    with pytest.raises(ChunksCancelledError):
+        agent.process_request(ExcelRequestMessage(query="q", sql_query="s", result=[]), None, chunks)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from common.types import (
+    AgentCapabilities,
+    AgentCard,
+    Message,
+    SendTaskResponse,
+    ServerBusyError,
+    TaskSendParams,
+    TextPart,
+)
+from hosts.multiagent.remote_agent_connection import RemoteAgentConnections
+
+
+def test_error_response_of_a_non_streaming_agent_raises():
+    card = AgentCard(
+        name="Busy Agent",
+        url="http://testserver/",
+        version="1.0.0",
+        capabilities=AgentCapabilities(streaming=False),
+        skills=[],
+    )
+    connection = RemoteAgentConnections(card)
+
+    async def send_task(payload):
+        return SendTaskResponse(error=ServerBusyError())
+
+    connection.agent_client.send_task = send_task
+    request = TaskSendParams(id="task", message=Message(role="user", parts=[TextPart(text="hi")]))
+
+    with pytest.raises(ValueError, match="Busy Agent returned an error"):
+        asyncio.run(connection.send_task(request, None))
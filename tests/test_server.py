@@ -0,0 +1,146 @@
+import asyncio
+import json
+
+import httpx
+
+from common.server import A2AServer, AdmissionController
+from common.server.task_manager import InMemoryTaskManager
+from common.types import (
+    AgentCapabilities,
+    AgentCard,
+    SendTaskResponse,
+    SendTaskStreamingRequest,
+)
+
+
+class TaskManager(InMemoryTaskManager):
+    """Stores sent tasks and answers subscriptions with a stream that waits"""
+
+    async def on_send_task(self, request):
+        task = await self.upsert_task(request.params)
+        return SendTaskResponse(id=request.id, result=task)
+
+    async def on_send_task_subscribe(self, request):
+        async def events():
+            await asyncio.sleep(60)
+            yield None
+
+        return events()
+
+
+def create_server(**kwargs) -> A2AServer:
+    agent_card = AgentCard(
+        name="Test Agent",
+        url="http://testserver/",
+        version="1.0.0",
+        capabilities=AgentCapabilities(streaming=True),
+        skills=[],
+    )
+    return A2AServer(agent_card=agent_card, task_manager=TaskManager(), **kwargs)
+
+
+def send_request(request_id, task_id, method="tasks/send"):
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": method,
+        "params": {
+            "id": task_id,
+            "sessionId": "session",
+            "message": {"role": "user", "parts": [{"type": "text", "text": "hello"}]},
+        },
+    }
+
+
+def get_request(request_id, task_id):
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tasks/get", "params": {"id": task_id}}
+
+
+def post(server: A2AServer, body) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await client.post("/", content=json.dumps(body))
+
+    return asyncio.run(run())
+
+
+def test_batch_returns_the_responses_in_request_order():
+    server = create_server()
+    post(server, send_request(1, "existing"))
+
+    response = post(
+        server, [get_request(2, "existing"), get_request(3, "missing"), send_request(4, "new")]
+    )
+
+    assert response.status_code == 200
+    responses = response.json()
+    assert [item["id"] for item in responses] == [2, 3, 4]
+    assert responses[0]["result"]["id"] == "existing"
+    assert responses[1]["error"]["code"] == -32001
+    assert responses[2]["result"]["status"]["state"] == "submitted"
+
+
+def test_batch_rejects_invalid_and_streaming_items_alone():
+    server = create_server()
+
+    response = post(
+        server,
+        [
+            {"jsonrpc": "2.0", "id": 1, "method": "tasks/unknown"},
+            send_request(2, "t", "tasks/sendSubscribe"),
+            get_request(3, "missing"),
+        ],
+    )
+
+    responses = response.json()
+    assert [item["id"] for item in responses] == [1, 2, 3]
+    assert responses[0]["error"]["code"] == -32600
+    assert responses[1]["error"]["code"] == -32004
+    assert responses[2]["error"]["code"] == -32001
+
+
+def test_batch_size_is_limited():
+    server = create_server(max_batch_size=2)
+
+    assert post(server, []).status_code == 400
+    too_large = post(server, [get_request(i, "t") for i in range(3)])
+    assert too_large.status_code == 400
+    assert too_large.json()["error"]["code"] == -32600
+
+
+def test_stream_that_never_starts_releases_its_admission_slot():
+    async def run():
+        admission_controller = AdmissionController(max_concurrency=1)
+        server = create_server(admission_controller=admission_controller)
+        request = SendTaskStreamingRequest.model_validate(
+            send_request(1, "task", "tasks/sendSubscribe")
+        )
+        response = server._create_response(await server._send_task(request))
+        assert admission_controller.in_flight == 1
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            pass
+
+        await response({"type": "http"}, receive, send)
+        return admission_controller.in_flight
+
+    assert asyncio.run(run()) == 0
+
+
+def test_workers_are_started_from_the_app_factory(monkeypatch):
+    import uvicorn
+
+    calls = []
+    monkeypatch.setattr(uvicorn, "run", lambda app, **options: calls.append((app, options)))
+
+    create_server(host="127.0.0.1", port=8000).start(workers=2, app_factory="module:create_app")
+
+    app, options = calls[0]
+    assert app == "module:create_app"
+    assert options["factory"] is True
+    assert options["workers"] == 2
+    assert (options["host"], options["port"]) == ("127.0.0.1", 8000)
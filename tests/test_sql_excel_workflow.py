@@ -0,0 +1,99 @@
+import asyncio
+
+from common.server.task_manager import InMemoryTaskManager
+from common.types import (
+    Artifact,
+    CancelTaskResponse,
+    DataPart,
+    InternalError,
+    Message,
+    SendTaskResponse,
+    SendTaskStreamingResponse,
+    ServerBusyError,
+    Task,
+    TaskArtifactUpdateEvent,
+    TaskSendParams,
+    TaskState,
+    TaskStatus,
+)
+from hosts.multiagent.sql_excel_workflow import SQLExcelWorkflow
+
+
+class TaskManager(InMemoryTaskManager):
+    async def on_send_task(self, request):
+        raise NotImplementedError
+
+    async def on_send_task_subscribe(self, request):
+        raise NotImplementedError
+
+
+def create_workflow(tmp_path) -> SQLExcelWorkflow:
+    return SQLExcelWorkflow.embedded(TaskManager(), TaskManager(), str(tmp_path))
+
+
+def test_cancelled_query_is_reported_as_failed(tmp_path):
+    workflow = create_workflow(tmp_path)
+
+    async def process_query(query, *args):
+        if query == "cancelled":
+            raise asyncio.CancelledError()
+        return {"success": True, "query": query}
+
+    workflow._process_query = process_query
+    results = asyncio.run(workflow.process_queries(["done", "cancelled", "done"]))
+
+    assert results == [
+        {"success": True, "query": "done"},
+        {"success": False, "query": "cancelled", "error": "CancelledError"},
+        {"success": True, "query": "done", "duplicate": True},
+    ]
+
+
+def test_busy_chunk_is_given_up_after_the_retry_timeout(tmp_path):
+    workflow = create_workflow(tmp_path)
+    workflow.CHUNK_RETRY_TIMEOUT = 0.05
+    attempts = []
+
+    async def send_task(params):
+        attempts.append(params.metadata["chunk_index"])
+        return SendTaskResponse(error=ServerBusyError())
+
+    workflow.excel_client.send_task = send_task
+    params = TaskSendParams(
+        id="excel",
+        message=Message(role="user", parts=[DataPart(data={"result": []})]),
+        metadata={"chunk_index": 1, "last_chunk": False},
+    )
+    response = asyncio.run(workflow._send_chunk(params, retry_interval=0.01))
+
+    assert response.error.code == ServerBusyError().code
+    assert 1 < len(attempts) < 10
+
+
+def test_excel_task_is_cancelled_when_the_sql_stream_fails(tmp_path):
+    workflow = create_workflow(tmp_path)
+    calls = []
+
+    async def send_task_streaming(params):
+        artifact = Artifact(parts=[DataPart(data={"sql_query": "SELECT 1", "result": [{"id": 1}]})])
+        yield SendTaskStreamingResponse(result=TaskArtifactUpdateEvent(id=params.id, artifact=artifact))
+        yield SendTaskStreamingResponse(error=InternalError(message="connection lost"))
+
+    async def send_task(params):
+        calls.append(("send", params.metadata["chunk_index"]))
+        task = Task(id=params.id, status=TaskStatus(state=TaskState.WORKING))
+        return SendTaskResponse(result=task)
+
+    async def cancel_task(payload):
+        calls.append(("cancel", payload["id"]))
+        return CancelTaskResponse()
+
+    workflow.sql_client.send_task_streaming = send_task_streaming
+    workflow.excel_client.send_task = send_task
+    workflow.excel_client.cancel_task = cancel_task
+
+    result = asyncio.run(workflow.process_query("question", stream=True))
+
+    assert result["success"] is False
+    assert "connection lost" in result["details"]
+    assert [call[0] for call in calls] == ["send", "cancel"]
@@ -0,0 +1,210 @@
+import asyncio
+import threading
+
+import pytest
+
+from common.server.task_manager import InMemoryTaskManager
+from common.server.task_store import SQLTaskStore
+from common.types import (
+    InternalError,
+    Message,
+    TaskResubscriptionRequest,
+    TaskSendParams,
+    TaskState,
+    TaskStatus,
+    TaskStatusUpdateEvent,
+    TextPart,
+)
+
+
+class TaskManager(InMemoryTaskManager):
+    async def on_send_task(self, request):
+        raise NotImplementedError
+
+    async def on_send_task_subscribe(self, request):
+        raise NotImplementedError
+
+
+def send_params(task_id="task", text="hello"):
+    return TaskSendParams(id=task_id, message=Message(role="user", parts=[TextPart(text=text)]))
+
+
+def status_event(task_id, state, final=False):
+    return TaskStatusUpdateEvent(id=task_id, status=TaskStatus(state=state), final=final)
+
+
+async def resubscribe(manager, task_id, last_event_id=None, timeout=1.0):
+    """Returns the (event id, state, final) of each event of a resumed stream"""
+    result = await manager.on_resubscribe_to_task(
+        TaskResubscriptionRequest(params={"id": task_id, "lastEventId": last_event_id})
+    )
+
+    async def collect():
+        return [
+            (response._event_id, response.result.status.state, response.result.final)
+            async for response in result
+        ]
+
+    return await asyncio.wait_for(collect(), timeout)
+
+
+def test_resume_replays_the_events_after_the_last_event_id():
+    async def run():
+        manager = TaskManager()
+        await manager.upsert_task(send_params())
+        for state, final in [
+            (TaskState.WORKING, False), (TaskState.WORKING, False), (TaskState.COMPLETED, True)
+        ]:
+            await manager.enqueue_events_for_sse("task", status_event("task", state, final))
+        return await resubscribe(manager, "task", last_event_id=1)
+
+    assert asyncio.run(run()) == [
+        (2, TaskState.WORKING, False), (3, TaskState.COMPLETED, True)
+    ]
+
+
+def test_resume_of_an_ended_stream_repeats_its_final_event():
+    async def run():
+        manager = TaskManager()
+        await manager.upsert_task(send_params())
+        await manager.enqueue_events_for_sse(
+            "task", status_event("task", TaskState.COMPLETED, final=True)
+        )
+        return await resubscribe(manager, "task", last_event_id=1)
+
+    assert asyncio.run(run()) == [(1, TaskState.COMPLETED, True)]
+
+
+def test_resume_receives_events_published_later():
+    async def run():
+        manager = TaskManager()
+        await manager.upsert_task(send_params())
+        await manager.enqueue_events_for_sse("task", status_event("task", TaskState.WORKING))
+        events = asyncio.create_task(resubscribe(manager, "task", last_event_id=1))
+        await asyncio.sleep(0.01)
+        await manager.enqueue_events_for_sse(
+            "task", status_event("task", TaskState.COMPLETED, final=True)
+        )
+        return await events
+
+    assert asyncio.run(run()) == [(2, TaskState.COMPLETED, True)]
+
+
+def test_resume_without_events_reports_the_stored_status_and_ends():
+    async def run():
+        manager = TaskManager()
+        await manager.upsert_task(send_params())
+        return await resubscribe(manager, "task")
+
+    assert asyncio.run(run()) == [(None, TaskState.SUBMITTED, False)]
+
+
+def test_resume_past_events_that_were_not_retained_fails():
+    async def run():
+        manager = TaskManager()
+        await manager.upsert_task(send_params())
+        await manager.enqueue_events_for_sse("task", status_event("task", TaskState.WORKING))
+        await manager.enqueue_events_for_sse(
+            "task", status_event("task", TaskState.WORKING), retain=False
+        )
+        await manager.enqueue_events_for_sse(
+            "task", status_event("task", TaskState.COMPLETED, final=True)
+        )
+        failed = await manager.on_resubscribe_to_task(
+            TaskResubscriptionRequest(params={"id": "task", "lastEventId": 1})
+        )
+        return failed, await resubscribe(manager, "task", last_event_id=2)
+
+    failed, resumed = asyncio.run(run())
+    assert "no longer available" in failed.error.message
+    assert resumed == [(3, TaskState.COMPLETED, True)]
+
+
+def test_history_is_dropped_after_the_final_event():
+    async def run():
+        manager = TaskManager(sse_history_ttl=0.01)
+        await manager.upsert_task(send_params())
+        await manager.enqueue_events_for_sse(
+            "task", status_event("task", TaskState.COMPLETED, final=True)
+        )
+        assert "task" in manager.task_sse_history
+        await asyncio.sleep(0.05)
+        return manager
+
+    manager = asyncio.run(run())
+    assert manager.task_sse_history == {}
+    assert manager.task_sse_last_event_id == {}
+
+
+def test_error_events_end_the_stream():
+    async def run():
+        manager = TaskManager()
+        await manager.upsert_task(send_params())
+        queue = await manager.setup_sse_consumer("task")
+        await manager.enqueue_events_for_sse("task", InternalError(message="failed"))
+        return [
+            response async for response in manager.dequeue_events_for_sse("request", "task", queue)
+        ]
+
+    responses = asyncio.run(run())
+    assert [response.error.message for response in responses] == ["failed"]
+
+
+def test_producer_waits_until_the_consumer_takes_its_events():
+    async def run():
+        manager = TaskManager()
+        await manager.upsert_task(send_params())
+        queue = await manager.setup_sse_consumer("task")
+        for _ in range(3):
+            await manager.enqueue_events_for_sse("task", status_event("task", TaskState.WORKING))
+        waiting = asyncio.create_task(manager.wait_for_sse_consumers("task", max_queued=1))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+
+        stream = manager.dequeue_events_for_sse("request", "task", queue)
+        await stream.__anext__()
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        await stream.__anext__()
+        await asyncio.wait_for(waiting, 1.0)
+
+        # A consumer leaving also releases the producer
+        await manager.enqueue_events_for_sse("task", status_event("task", TaskState.WORKING))
+        await manager.enqueue_events_for_sse("task", status_event("task", TaskState.WORKING))
+        waiting = asyncio.create_task(manager.wait_for_sse_consumers("task", max_queued=1))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        await stream.aclose()
+        await asyncio.wait_for(waiting, 1.0)
+
+    asyncio.run(run())
+
+
+def test_sql_task_store_keeps_concurrent_updates(tmp_path):
+    url = f"sqlite:///{tmp_path / 'tasks.db'}"
+    SQLTaskStore(url)
+    workers = 4
+    updates = 10
+
+    def worker(index):
+        async def run():
+            manager = TaskManager(SQLTaskStore(url, create_tables=False))
+            for update in range(updates):
+                await manager.upsert_task(send_params(text=f"{index}-{update}"))
+
+        asyncio.run(run())
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    task = asyncio.run(SQLTaskStore(url, create_tables=False).get_task("task"))
+    assert len(task.history) == workers * updates
+
+
+def test_update_store_of_a_missing_task_raises():
+    manager = TaskManager()
+    with pytest.raises(ValueError):
+        asyncio.run(manager.update_store("missing", TaskStatus(state=TaskState.WORKING), None))
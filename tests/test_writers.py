@@ -0,0 +1,123 @@
+import os
+import tempfile
+from decimal import Decimal
+
+import pytest
+
+from excel_agent.agent import ExcelAgent, ExcelFormat
+from excel_agent.writers import MAX_DECIMALS, WIDTH_SAMPLE_ROWS, create_writer, profile_columns
+
+
+def test_number_formats_leave_room_for_more_decimals():
+    profiles = profile_columns(["decimal", "float", "int"], [[Decimal("100.00"), 1.5, 3]])
+
+    assert profiles[0].num_format == "0.0" + "#" * (MAX_DECIMALS - 1)
+    assert profiles[1].num_format == "0.0" + "#" * (MAX_DECIMALS - 1)
+    assert profiles[2].num_format == "0"
+
+
+def test_number_format_keeps_the_places_of_the_sample():
+    profiles = profile_columns(["amount"], [[1.25], [2.125]])
+
+    assert profiles[0].num_format == "0.000" + "#" * (MAX_DECIMALS - 3)
+
+
+def test_xlsx_rows_after_the_sample_keep_their_decimals(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    writer = create_writer(str(tmp_path / "result.xlsx"), ExcelFormat(include_metadata=False))
+    writer.write_batch(
+        [{"id": i, "amount": Decimal("100.00")} for i in range(WIDTH_SAMPLE_ROWS)]
+    )
+    writer.write_batch([{"id": WIDTH_SAMPLE_ROWS, "amount": Decimal("12.345")}])
+    writer.close()
+
+    sheet = openpyxl.load_workbook(writer.file_path, read_only=True)["Data"]
+    last_row = next(sheet.iter_rows(min_row=WIDTH_SAMPLE_ROWS + 2))
+    assert last_row[1].value == 12.345
+    assert last_row[1].number_format == "0.0#####"
+    assert last_row[0].number_format == "0"
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "arrow"])
+def test_arrow_writer_widens_decimal_columns(tmp_path, output_format):
+    pytest.importorskip("pyarrow")
+    writer = create_writer(
+        str(tmp_path / f"result.{output_format}"), ExcelFormat(output_format=output_format)
+    )
+    writer.write_batch([{"amount": Decimal("1.5")}])
+    writer.write_batch([{"amount": Decimal("1.12345")}])
+    writer.close()
+
+    assert [row["amount"] for row in _read_rows(writer.file_path, output_format)] == [
+        Decimal("1.5"), Decimal("1.12345")
+    ]
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "arrow"])
+def test_arrow_writer_rejects_values_that_do_not_fit(tmp_path, output_format):
+    pytest.importorskip("pyarrow")
+    writer = create_writer(
+        str(tmp_path / f"result.{output_format}"), ExcelFormat(output_format=output_format)
+    )
+    writer.write_batch([{"id": 1}])
+
+    with pytest.raises(ValueError, match="'id'"):
+        writer.write_batch([{"id": 1.5}])
+    writer.close()
+
+
+def test_arrow_writer_types_empty_columns_as_strings(tmp_path):
+    pytest.importorskip("pyarrow")
+    writer = create_writer(str(tmp_path / "result.parquet"), ExcelFormat(output_format="parquet"))
+    writer.write_batch([{"id": 1, "note": None}])
+    writer.write_batch([{"id": 2, "note": 3}])
+    writer.close()
+
+    assert _read_rows(writer.file_path, "parquet") == [
+        {"id": 1, "note": None}, {"id": 2, "note": "3"}
+    ]
+
+
+@pytest.mark.parametrize(
+    "format_options",
+    [
+        {"engine": "xlsxwriter"},
+        {"engine": "openpyxl"},
+        {"output_format": "csv.gz"},
+        {"output_format": "parquet"},
+        {"output_format": "csv", "max_rows_per_file": 2},
+    ],
+)
+def test_failed_export_leaves_no_files_behind(tmp_path, monkeypatch, format_options):
+    if format_options.get("output_format") == "parquet":
+        pytest.importorskip("pyarrow")
+    # xlsxwriter keeps the rows of constant_memory sheets in temporary files
+    temp_dir = tmp_path / "tmp"
+    temp_dir.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(temp_dir))
+    output_dir = tmp_path / "output"
+    agent = ExcelAgent(str(output_dir), cache_exports=False)
+
+    def batches():
+        yield [{"id": 1}, {"id": 2}, {"id": 3}]
+        raise RuntimeError("query failed")
+
+    extension = ".xlsx" if "engine" in format_options else "." + format_options["output_format"]
+    with pytest.raises(RuntimeError):
+        agent._generate_excel(
+            "query", "SELECT 1", batches(), ExcelFormat(**format_options),
+            str(output_dir / f"result{extension}"),
+        )
+    assert os.listdir(output_dir) == []
+    assert os.listdir(temp_dir) == []
+
+
+def _read_rows(file_path, output_format):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    assert os.path.exists(file_path)
+    if output_format == "parquet":
+        return pq.read_table(file_path).to_pylist()
+    with pa.ipc.open_file(file_path) as reader:
+        return reader.read_all().to_pylist()